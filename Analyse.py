@@ -1,12 +1,11 @@
 
 #Imports
-import sys
 import os
 
 from qgis.core import (
+    QgsApplication,
     QgsVectorLayer,
     QgsFeature,
-    QgsSpatialIndex,
     QgsFeatureRequest,
 )
 
@@ -16,14 +15,24 @@ from qgis.PyQt.QtCore import QVariant
 
 from typing import List, Tuple, Dict
 
-from .constantes import TYPE_PARC_LIBELLES
+from .couleurs_parcelles import libelle_type, parts_types
+from .contiguite import construire_graphe, grouper, tolerance_pour_couche
+from .graphe_adjacence import graphe_couche
+from .acces_parcelles import (
+    CHAMPS_OPERATIONS,
+    FILTRE_POSSEDEES,
+    TAILLE_BLOC,
+    lire_parcelles,
+)
+from .export_parcelles import ExportTask, champs_export, ecrivains_disponibles
+from .manifeste_export import chemin_manifeste, lire_manifeste
 
 # Statistiques et analyses des éléments forestiers
 
 def calcul_surface_forestiere(layer):
     total_surface_m2 = 0
 
-    for feature in layer.getFeatures():
+    for feature in lire_parcelles(layer, "surface_forestiere"):
         possession = feature["Possession"]
         type_parc = feature["typeParc"]
         surface = feature["SURFACE"]
@@ -48,7 +57,7 @@ def calcul_surface_forestiere(layer):
 def calcul_surface_friche(layer):
     total_surface_m2 = 0
 
-    for feature in layer.getFeatures():
+    for feature in lire_parcelles(layer, "surface_friche"):
         possession = feature["Possession"]
         type_parc = feature["typeParc"]
         surface = feature["SURFACE"]
@@ -75,7 +84,7 @@ def compter_parcelles_possedees(layer):
     """
     total = 0
 
-    for feature in layer.getFeatures():
+    for feature in lire_parcelles(layer, "parcelles_possedees"):
         possession = feature["Possession"]
 
         if possession:
@@ -93,7 +102,7 @@ def analyse_types_parcelles(layer, type_parc_min=2, type_parc_max=14, top_n=5):
     surfaces_par_type = {}
     total_surface_m2 = 0.0  # float
 
-    for feature in layer.getFeatures():
+    for feature in lire_parcelles(layer, "types_parcelles"):
         type_parc = feature["typeParc"]
 
         # Conversion explicite de surface en float
@@ -109,25 +118,23 @@ def analyse_types_parcelles(layer, type_parc_min=2, type_parc_max=14, top_n=5):
             else:
                 surfaces_par_type[type_parc] = surface
 
+    return formater_repartition_types(surfaces_par_type, total_surface_m2, top_n)
+
+
+def formater_repartition_types(surfaces_par_type, total_surface_m2, top_n=5):
+    """
+    Met en forme la répartition des surfaces par type de parcelle :
+    les `top_n` types les plus représentés + une catégorie "Autres".
+    """
     if total_surface_m2 == 0:
         return "Aucune donnée disponible"
 
-    # Calcul des pourcentages et tri
-    pourcentages = {
-        type_parc: (surface / total_surface_m2) * 100
-        for type_parc, surface in surfaces_par_type.items()
-    }
-    sorted_types = sorted(pourcentages.items(), key=lambda x: x[1], reverse=True)
-
-    top_types = sorted_types[:top_n]
-    autres = sorted_types[top_n:]
+    top_types, autres_pourcentage = parts_types(surfaces_par_type, total_surface_m2, top_n)
 
     result_lines = []
     for type_parc, pourcentage in top_types:
-        nom_type = TYPE_PARC_LIBELLES.get(type_parc, f"Type {type_parc}")
-        result_lines.append(f"{nom_type} : {pourcentage:.1f} %")
+        result_lines.append(f"{libelle_type(type_parc)} : {pourcentage:.1f} %")
 
-    autres_pourcentage = sum(p[1] for p in autres)
     if autres_pourcentage > 0:
         result_lines.append(f"Autres : {autres_pourcentage:.1f} %")
 
@@ -143,7 +150,7 @@ def analyse_types_essences(layer, top_n=5):
     surfaces_par_essence = {}
     total_surface_m2 = 0.0
 
-    for feature in layer.getFeatures():
+    for feature in lire_parcelles(layer, "types_essences"):
         try:
             surface = float(feature["SURFACE"])
         except (TypeError, ValueError):
@@ -164,6 +171,14 @@ def analyse_types_essences(layer, top_n=5):
             total_surface_m2 += poids
             surfaces_par_essence[nom_essence] = surfaces_par_essence.get(nom_essence, 0.0) + poids
 
+    return formater_repartition_essences(surfaces_par_essence, total_surface_m2, top_n)
+
+
+def formater_repartition_essences(surfaces_par_essence, total_surface_m2, top_n=5):
+    """
+    Met en forme la répartition des surfaces pondérées par essence :
+    les `top_n` essences les plus représentées + une catégorie "Autres".
+    """
     if total_surface_m2 == 0:
         return "Aucune donnée disponible"
 
@@ -203,87 +218,88 @@ def total_plantation (layer):
 
     total_plants = 0
 
-    for feature in layer. getFeatures():
+    for feature in lire_parcelles(layer, "total_plantation"):
         plants = feature["totalplants"]
         if plants is not None and plants != QVariant():
             total_plants += int(plants)
 
     return total_plants
 
-def calcul_regroupement(layer):
+def calcul_regroupement(layer, graphe=None, feedback=None):
     """
     Regroupe les entités contiguës dont 'possession' est True,
     retourne les 3 plus grands regroupements en surface totale (champ 'contenance'),
     et affiche pour chaque groupe le numéro de la plus grande parcelle (avec section)
     et la surface totale.
     """
+    request = QgsFeatureRequest().setFilterExpression(FILTRE_POSSEDEES)
+    return calcul_regroupement_parcelles(layer, request=request, graphe=graphe, feedback=feedback)
 
-    # Créer un index spatial
-    index = QgsSpatialIndex(layer.getFeatures())
 
-    # Mettre en cache toutes les entités ET leur géométrie
-    features_dict = {f.id(): (f, f.geometry()) for f in layer.getFeatures()}
-
-    visited = set()
-    regroupements = []
-
-    # Boucle principale sur chaque entité non encore visitée
-    for fid, (feat, geom) in features_dict.items():
-        if fid in visited or not feat['possession']:
+def calcul_regroupement_parcelles(layer, fids=None, nb_groupes=3, request=None, graphe=None, feedback=None):
+    """
+    Regroupement par contiguïté des parcelles possédées `fids` (déjà connues).
+    Le graphe d'adjacence est relu depuis le GeoPackage s'il y est enregistré ;
+    sinon seules les géométries de ces parcelles sont lues et le graphe est
+    construit par hachage des frontières. Les groupes sont formés par union-find.
+
+    layer : couche, ou source de lecture d'une tâche de fond (le graphe enregistré
+    est alors fourni par `graphe`, déjà chargé)
+    feedback : QgsFeedback optionnel ; la lecture occupe la première moitié de la
+    progression et la construction du graphe la seconde (toute la progression si
+    le graphe est fourni). Retourne "" si le traitement est annulé.
+    """
+    if request is None:
+        fids = list(fids or [])
+        if not fids:
+            return ""
+        request = QgsFeatureRequest().setFilterFids(fids)
+    request.setSubsetOfAttributes(["Possession"] + CHAMPS_OPERATIONS["regroupement"], layer.fields())
+
+    if graphe is None and isinstance(layer, QgsVectorLayer):
+        graphe = graphe_couche(layer)
+    if graphe is not None:
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+
+    if feedback is not None:
+        request.setFeedback(feedback)
+    total = max(len(fids) if fids is not None else layer.featureCount(), 1)
+    part_lecture = 100.0 if graphe is not None else 50.0
+
+    geometries = {}
+    attributs = {}
+    for n, feature in enumerate(layer.getFeatures(request), start=1):
+        if feedback is not None and n % TAILLE_BLOC == 0:
+            if feedback.isCanceled():
+                return ""
+            feedback.setProgress(min(part_lecture, part_lecture * n / total))
+        if not feature["Possession"]:
             continue
+        attributs[feature.id()] = (feature["contenance"], feature["section"], feature["numero"])
+        if graphe is None:
+            geometries[feature.id()] = feature.geometry()
 
-        groupe = []
-        to_visit = [fid]
-
-        while to_visit:
-            current_fid = to_visit.pop()
-            if current_fid in visited:
-                continue
-            visited.add(current_fid)
+    if graphe is None:
+        if feedback is not None:
+            feedback.setProgress(part_lecture)
+        graphe = construire_graphe(geometries.items(), tolerance_pour_couche(layer), feedback=feedback)
+    if feedback is not None and feedback.isCanceled():
+        return ""
+    groupes = grouper(graphe, attributs.keys(), {fid: attr[0] for fid, attr in attributs.items()})
+    return formater_regroupements(groupes, attributs, nb_groupes)
 
-            current_feat, current_geom = features_dict[current_fid]
-
-            if not current_feat['possession']:
-                continue
 
-            groupe.append(current_feat)
-
-            # Chercher les voisins candidats (bbox intersecte)
-            for neighbor_id in index.intersects(current_geom.boundingBox()):
-                if neighbor_id not in visited:
-                    neighbor_feat, neighbor_geom = features_dict.get(neighbor_id, (None, None))
-                    if neighbor_feat and neighbor_geom and neighbor_feat['possession']:
-                        # Test topologique touches()
-                        if current_geom.touches(neighbor_geom):
-                            to_visit.append(neighbor_id)
-
-        # Ajouter le groupe trouvé s'il est non vide
-        if groupe:
-            regroupements.append(groupe)
-
-    # Trier les groupes par contenance totale décroissante
-    regroupements.sort(
-        key=lambda grp: sum(f['contenance'] for f in grp if f['contenance'] is not None),
-        reverse=True
-    )
-
-    # Prendre les 3 plus gros groupes
-    top3 = regroupements[:3]
+def formater_regroupements(groupes, attributs, nb_groupes=3):
+    """
+    Texte des `nb_groupes` plus gros groupes (déjà triés, totaux précalculés) :
+    plus grande parcelle avec section + surface totale.
 
-    # Construire le texte de retour
+    attributs : dict fid -> (contenance, section, numero)
+    """
     result_lines = []
-    for i, groupe in enumerate(top3, start=1):
-        surface_totale = sum(f['contenance'] for f in groupe if f['contenance'] is not None)
-        surface_str = convertir_surface_ha(surface_totale)
-
-        # Trouver la parcelle avec la plus grande contenance
-        plus_grande_parcelle = max(
-            groupe,
-            key=lambda f: f['contenance'] if f['contenance'] is not None else 0
-        )
-        section = plus_grande_parcelle['section']
-        numero = plus_grande_parcelle['numero']
-
+    for i, groupe in enumerate(groupes[:nb_groupes], start=1):
+        surface_str = convertir_surface_ha(groupe.contenance_totale)
+        _, section, numero = attributs[groupe.plus_grande]
         result_lines.append(f"{i} - {section}{numero} = {surface_str}")
 
     return '\n'.join(result_lines)
@@ -291,150 +307,96 @@ def calcul_regroupement(layer):
 
 
 def export_to_excel(self):
-
-    # Ajouter le chemin vers dossier local xlsxwriter_lib
-    xlsxwriter_path = os.path.join(os.path.dirname(__file__), "xlsxwriter_lib")
-    if xlsxwriter_path not in sys.path:
-        sys.path.insert(0, xlsxwriter_path)
-    print("Début de export_to_excel - contrôle du module xlsxwriter")
-    try:
-        import xlsxwriter
-        print("xlsxwriter est disponible.")
-    except ImportError:
-        reply = QMessageBox.question(
-            None, "Module manquant",
-            "Le module 'xlsxwriter' est manquant.\n"
-            "Voulez-vous tenter d’installer 'xlsxwriter' depuis le dossier local ?",
-            QMessageBox.Yes | QMessageBox.No
-        )
-        if reply == QMessageBox.Yes:
-            try:
-                # Tentative de recharger le module après ajout du dossier
-                import importlib
-                importlib.invalidate_caches()
-                xlsxwriter = importlib.import_module("xlsxwriter")
-            except ImportError:
-                QMessageBox.critical(
-                    None, "Installation échouée",
-                    "L'installation locale de 'xlsxwriter' a échoué.\n"
-                    "L'export est annulé."
-                )
-                return
-        else:
-            QMessageBox.information(None, "Export annulé", "Export annulé car 'xlsxwriter' est manquant.")
-            return
-
+    """
+    Lance l'export des parcelles possédées dans une tâche de fond : champs selon
+    les cases cochées, format selon le filtre choisi dans la boîte d'enregistrement.
+    Avec « Depuis le dernier export », seules les parcelles ajoutées, modifiées ou
+    supprimées depuis le précédent export de la couche sont écrites.
+    """
     layer = self.iface.activeLayer()
     if not layer or not isinstance(layer, QgsVectorLayer):
         QMessageBox.warning(None, "Export", "Veuillez sélectionner une couche valide.")
         return
 
-    # Champs toujours exportés dans la sélection spécifique
-    champs_generaux = [
-        "section", "numero", "indice_parc","contenance", "SURFACE", "Nous",
-         "plant1", "plant2", "plant3", "plant4", "Tx1","Tx2","Tx3","Tx4",
-        "annee", "totalplants", "typeParc"
-    ]
-
-    # Champs exclus systématiquement (jamais exportés)
-    champs_exclus = {"fid", "commune", "prefixe", "arpente", "possession", "created", "updated","nom_Voisin",
-                     "adresse_Voisin","mail_Voisin","tel_Voisin"}
-
-    # Récupérer la liste des champs disponibles dans la couche
-    available_fields = [field.name() for field in layer.fields()]
-
-    if self.dlg.checkToutExport.isChecked():
-        # Exporter tous les champs sauf ceux exclus
-        export_fields = [f for f in available_fields if f.lower() not in champs_exclus]
-
-    else:
-        export_fields = champs_generaux.copy()
-
-        if self.dlg.checkTravExport.isChecked():
-            export_fields += [f"Tvx{i}" for i in range(1, 7)]
-            export_fields += [f"dateTvx{i}" for i in range(1, 7)]
-            export_fields += [f"remTvx{i}" for i in range(1, 7)]
-
-        if self.dlg.checkTraitExport.isChecked():
-            export_fields += [f"Trait{i}" for i in range(1, 7)]
-            export_fields += [f"dateTrait{i}" for i in range(1, 7)]
-            export_fields += [f"remTrait{i}" for i in range(1, 7)]
-
-        if self.dlg.checkPrevExport.isChecked():
-            export_fields += [f"Prev{i}" for i in range(1, 5)]
-            export_fields += [f"datePrev{i}" for i in range(1, 5)]
-            export_fields += [f"remPrev{i}" for i in range(1, 5)]
+    if getattr(self, "export_task", None) is not None:
+        QMessageBox.information(self.dlg, "Export", "Un export est déjà en cours.")
+        return
 
-    # Supprimer doublons, retirer Possession, vérifier existence
-    available_fields = [field.name() for field in layer.fields()]
-    export_fields = list(dict.fromkeys(export_fields))  # garde l'ordre, supprime doublons
-    export_fields = [f for f in export_fields if f in available_fields and f != "Possession"]
+    export_fields = champs_export(
+        layer,
+        tout=self.dlg.checkToutExport.isChecked(),
+        travaux=self.dlg.checkTravExport.isChecked(),
+        traitements=self.dlg.checkTraitExport.isChecked(),
+        previsions=self.dlg.checkPrevExport.isChecked(),
+    )
 
     if not export_fields:
         QMessageBox.warning(None, "Export", "Aucun champ valide sélectionné pour l'export.")
         return
 
-    # Choisir le dossier
-    folder = QFileDialog.getExistingDirectory(None, "Choisir un dossier d'export")
-    if not folder:
-        return
+    # Manifeste du dernier export de la couche (référence de l'export incrémental)
+    delta = self.dlg.checkDeltaExport.isChecked()
+    fichier_manifeste = chemin_manifeste(layer)
+    precedent = lire_manifeste(fichier_manifeste)
+    if delta and precedent is not None and precedent.get("champs") != export_fields:
+        reply = QMessageBox.question(
+            self.dlg, "Export",
+            "La sélection des champs a changé depuis le dernier export :\n"
+            "toutes les parcelles seront signalées comme modifiées.\n"
+            "Continuer ?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+
+    # Formats disponibles (xlsxwriter et pilotes GDAL selon l'installation)
+    formats = {classe.filtre(): classe for classe in ecrivains_disponibles()}
+    defaut = next(iter(formats.values()))
 
     # Nom du fichier avec date
     date_str = datetime.now().strftime("%Y%m%d")
-    filename = f"Export_{date_str}.xlsx"
-    output_file = os.path.join(folder, filename)
-
-    # Création du fichier Excel
-    workbook = xlsxwriter.Workbook(output_file)
-    worksheet = workbook.add_worksheet()
-
-    # Écrire les en-têtes
-    for col, field_name in enumerate(export_fields):
-        worksheet.write(0, col, field_name)
-    # Écrire les données : uniquement celles avec Possession = True
-    row = 1
-    for feature in layer.getFeatures():
-        if not feature["Possession"]:
-            continue
-        for col, field_name in enumerate(export_fields):
-            value = feature[field_name]
-            if field_name == "Nous":
-                try:
-                    key = int(value)
-                    libelle = TYPE_PARC_LIBELLES.get(key, str(value))
-                except (ValueError, TypeError):
-                    libelle = str(value)
-                libelle_str = str(libelle).strip()
-                clean_value = "" if libelle_str.upper() == "NULL" else libelle_str
-                worksheet.write(row, col, clean_value)
-            else:
-                value_str = str(value).strip() if value is not None else ""
-                clean_value = "" if value_str.upper() == "NULL" else value_str
-                worksheet.write(row, col, clean_value)
-        row += 1
-
-    # Ajustement la largeur des colonnes
-    for col, field_name in enumerate(export_fields):
-        # Calculer la largeur max entre l'en-tête et les valeurs de la colonne
-        max_len = len(field_name)
-        for feature in layer.getFeatures():
-            if not feature["Possession"]:
-                continue
-            value = feature[field_name]
-            value_str = str(value) if value is not None else ""
-            if len(value_str) > max_len:
-                max_len = len(value_str)
-        # On fixe la largeur avec une marge, par exemple 1.2x la taille max
-        worksheet.set_column(col, col, max_len * 1.2)
-
-    workbook.close()
-    QMessageBox.information(self.dlg, "Export", f"Export terminé :\n{output_file}")
-
-    # Ouvrir automatiquement le fichier Excel si demandé
-    if self.dlg.checkOpenExport.isChecked():
-        try:
-            os.startfile(output_file)
-        except Exception as e:
-            QMessageBox.warning(self.dlg, "Erreur",
-                                f"Impossible d’ouvrir le fichier automatiquement :\n{str(e)}")
+    output_file, filtre = QFileDialog.getSaveFileName(
+        None, "Exporter les parcelles", f"Export_{date_str}{'_delta' if delta else ''}{defaut.extension}",
+        ";;".join(formats)
+    )
+    if not output_file:
+        return
+
+    classe = formats.get(filtre, defaut)
+    if not output_file.lower().endswith(classe.extension):
+        output_file += classe.extension
+
+    try:
+        task = ExportTask(layer, export_fields, output_file, classe, fichier_manifeste, precedent, delta)
+    except Exception as e:
+        QMessageBox.critical(self.dlg, "Export", f"Impossible de créer le fichier :\n{str(e)}")
+        return
+
+    def on_termine(chemin, nombre):
+        if delta:
+            detail = f"{nombre} parcelles changées depuis le {precedent['date'][:10]}" if precedent else \
+                f"premier export, {nombre} parcelles"
+        else:
+            detail = f"{nombre} parcelles"
+        QMessageBox.information(self.dlg, "Export", f"Export terminé ({detail}) :\n{chemin}")
 
+        # Ouvrir automatiquement le fichier si demandé
+        if self.dlg.checkOpenExport.isChecked():
+            try:
+                os.startfile(chemin)
+            except Exception as e:
+                QMessageBox.warning(self.dlg, "Erreur",
+                                    f"Impossible d’ouvrir le fichier automatiquement :\n{str(e)}")
+
+    def on_echec(erreur):
+        QMessageBox.critical(self.dlg, "Export", f"L'export a échoué :\n{erreur}")
+
+    def on_fin():
+        self.export_task = None
+
+    task.termine.connect(on_termine)
+    task.echec.connect(on_echec)
+    task.taskCompleted.connect(on_fin)
+    task.taskTerminated.connect(on_fin)
+    self.export_task = task
+    QgsApplication.taskManager().addTask(task)
@@ -0,0 +1,143 @@
+# acces_parcelles.py
+# Accès centralisé aux attributs des parcelles : chaque opération déclare les champs
+# dont elle a besoin et les requêtes sont construites sans géométrie, limitées à ces
+# champs. Les ~80 colonnes de la couche ne sont décodées que lorsqu'elles sont lues.
+
+from qgis.core import QgsFeature, QgsFeatureRequest, QgsVectorLayerFeatureSource
+
+CHAMPS_ESSENCES = [f"plant{i}" for i in range(1, 5)] + [f"Tx{i}" for i in range(1, 5)]
+
+# Champs lus par chaque opération attributaire
+CHAMPS_OPERATIONS = {
+    "surface_forestiere": ["Possession", "typeParc", "SURFACE", "indice_parc"],
+    "surface_friche": ["Possession", "typeParc", "SURFACE", "indice_parc"],
+    "parcelles_possedees": ["Possession"],
+    "types_parcelles": ["typeParc", "SURFACE"],
+    "types_essences": ["SURFACE"] + CHAMPS_ESSENCES,
+    "total_plantation": ["totalplants"],
+    "regroupement": ["contenance", "section", "numero"],
+    "copie_contenance": ["contenance"],
+}
+
+# Champs du libellé d'une parcelle (section + numéro + indice)
+CHAMPS_LIBELLE = ["section", "numero", "indice_parc"]
+
+# Nombre d'entités lues entre deux points de progression / d'annulation
+TAILLE_BLOC = 1000
+
+# Filtre des parcelles possédées (évalué par le fournisseur quand c'est possible)
+FILTRE_POSSEDEES = '"Possession"'
+
+
+class SourceParcelles:
+    """
+    Vue en lecture seule de la couche, figée à sa création (thread principal) et
+    utilisable depuis une tâche de fond. Expose le sous-ensemble de l'API de
+    QgsVectorLayer employé par les analyses et les exports :
+    getFeatures, fields, crs, wkbType, featureCount.
+    """
+
+    def __init__(self, layer):
+        self.source = QgsVectorLayerFeatureSource(layer)
+        self._fields = layer.fields()
+        self._crs = layer.crs()
+        self._wkb_type = layer.wkbType()
+        self._nombre = layer.featureCount()
+
+    def getFeatures(self, request=None):
+        return self.source.getFeatures(request if request is not None else QgsFeatureRequest())
+
+    def fields(self):
+        return self._fields
+
+    def crs(self):
+        return self._crs
+
+    def wkbType(self):
+        return self._wkb_type
+
+    def featureCount(self):
+        return self._nombre
+
+
+def requete_attributs(layer, champs=None, fids=None, expression=None):
+    """
+    Requête sans géométrie sur la couche.
+
+    champs : noms des champs à lire (None = tous) ; les champs absents de la couche sont ignorés
+    fids : identifiants des entités à lire (None = toutes)
+    expression : filtre QGIS optionnel
+    """
+    request = QgsFeatureRequest()
+    if fids is not None:
+        request.setFilterFids(list(fids))
+    if expression:
+        request.setFilterExpression(expression)
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    if champs is not None:
+        fields = layer.fields()
+        request.setSubsetOfAttributes([nom for nom in champs if fields.indexFromName(nom) >= 0], fields)
+    return request
+
+
+def lire_parcelles(layer, operation, expression=None):
+    """Itère sur les entités avec les seuls champs déclarés pour `operation`, sans géométrie."""
+    return layer.getFeatures(requete_attributs(layer, CHAMPS_OPERATIONS[operation], expression=expression))
+
+
+def parcourir(layer, request, feedback=None):
+    """
+    layer.getFeatures(request) avec progression par blocs sur `feedback` (QgsFeedback)
+    et arrêt anticipé si le traitement est annulé.
+
+    layer : couche ou toute source exposant getFeatures() et featureCount()
+    """
+    if feedback is None:
+        yield from layer.getFeatures(request)
+        return
+
+    request.setFeedback(feedback)
+    total = max(layer.featureCount(), 1)
+    for n, feature in enumerate(layer.getFeatures(request), start=1):
+        if n % TAILLE_BLOC == 0:
+            if feedback.isCanceled():
+                return
+            feedback.setProgress(min(100.0, 100.0 * n / total))
+        yield feature
+
+
+def lire_parcelle(layer, fid, champs=None):
+    """
+    Entité `fid` sans géométrie (QgsFeature invalide si elle n'existe pas).
+    À ne pas repasser à updateFeature() : utiliser modifier_parcelle().
+    """
+    if fid is None:
+        return QgsFeature()
+    return next(layer.getFeatures(requete_attributs(layer, champs, fids=[fid])), QgsFeature())
+
+
+def modifier_parcelle(layer, fid, valeurs):
+    """
+    Écrit {nom de champ: valeur} sur l'entité `fid` (tampon d'édition, sans commit),
+    sans relire ni réécrire sa géométrie. Les champs absents de la couche sont ignorés.
+    """
+    fields = layer.fields()
+    modifications = {
+        fields.indexFromName(nom): valeur
+        for nom, valeur in valeurs.items()
+        if fields.indexFromName(nom) >= 0
+    }
+    if not modifications:
+        return True
+    return layer.changeAttributeValues(fid, modifications)
+
+
+def texte_attribut(valeur):
+    """Valeur d'attribut en texte, "" si elle est NULL."""
+    return "" if valeur is None or str(valeur).upper() == "NULL" else str(valeur)
+
+
+def libelle_parcelle(feature):
+    """Section + numéro + indice, comme dans la fenêtre principale."""
+    fields = feature.fields()
+    return "".join(texte_attribut(feature[nom]) for nom in CHAMPS_LIBELLE if fields.indexFromName(nom) >= 0)
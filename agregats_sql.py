@@ -0,0 +1,126 @@
+# agregats_sql.py
+# Calcul des agrégats de l'onglet Analyses directement dans SQLite pour les couches
+# GeoPackage : les analyses sont traduites en requêtes SUM / COUNT / GROUP BY et
+# aucune géométrie n'est lue. Les autres fournisseurs gardent le calcul Python.
+
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+from .graphe_adjacence import source_geopackage
+from .statistiques_incrementales import TYPES_FRICHE
+
+CHAMPS_SQL = (
+    ["Possession", "indice_parc", "typeParc", "SURFACE", "totalplants"]
+    + [f"plant{i}" for i in range(1, 5)]
+    + [f"Tx{i}" for i in range(1, 5)]
+)
+
+SURFACE = 'COALESCE(CAST("SURFACE" AS REAL), 0)'
+POSSEDEE = '"Possession" <> 0'
+# Comme `indice_parc in (None, "", 0)` dans Analyse.py
+PARCELLE_MERE = '("indice_parc" IS NULL OR "indice_parc" IN (\'\', 0))'
+
+
+def source_sql(layer):
+    """
+    Retourne (chemin, table, filtre) si les agrégats de la couche peuvent être
+    calculés en SQL, sinon None : couche non GeoPackage, modifications non
+    enregistrées (le fichier ne reflète pas la couche) ou champ manquant.
+    """
+    source = source_geopackage(layer)
+    if source is None:
+        return None
+
+    buffer = layer.editBuffer() if layer.isEditable() else None
+    if buffer is not None and buffer.isModified():
+        return None
+
+    chemin, table = source
+    filtre = layer.subsetString().strip()
+    return chemin, table, f"WHERE ({filtre})" if filtre else ""
+
+
+def _connexion_lecture(chemin):
+    return sqlite3.connect(f"{Path(chemin).as_uri()}?mode=ro", uri=True, timeout=10)
+
+
+def calculer_agregats(layer, type_parc_min=2, type_parc_max=14):
+    """
+    Agrégats bruts des analyses, calculés par SQLite, ou None si la couche ne s'y prête pas.
+
+    Les clés correspondent aux attributs de StockStatistiques.
+    """
+    return agregats_source(source_sql(layer), type_parc_min, type_parc_max)
+
+
+def agregats_source(source, type_parc_min=2, type_parc_max=14, feedback=None):
+    """
+    Agrégats calculés sur une source retournée par source_sql() (thread quelconque).
+    feedback : QgsFeedback optionnel, les requêtes sont interrompues en cas d'annulation.
+    """
+    if source is None:
+        return None
+    chemin, table, filtre = source
+    et = "AND" if filtre else "WHERE"
+
+    try:
+        with closing(_connexion_lecture(chemin)) as connexion:
+            if feedback is not None:
+                connexion.set_progress_handler(lambda: int(feedback.isCanceled()), 10000)
+            colonnes = {ligne[1] for ligne in connexion.execute(f'PRAGMA table_info("{table}")')}
+            if not set(CHAMPS_SQL).issubset(colonnes):
+                return None
+
+            # Une seule lecture de la table pour les totaux
+            forestiere, friche, nb_parcelles, plants = connexion.execute(
+                f"SELECT "
+                f"SUM(CASE WHEN {POSSEDEE} AND {PARCELLE_MERE} "
+                f"AND (\"typeParc\" IS NULL OR \"typeParc\" <> 1) THEN {SURFACE} ELSE 0 END), "
+                f"SUM(CASE WHEN {POSSEDEE} AND {PARCELLE_MERE} "
+                f"AND \"typeParc\" IN ({', '.join(str(t) for t in TYPES_FRICHE)}) THEN {SURFACE} ELSE 0 END), "
+                f"SUM(CASE WHEN {POSSEDEE} THEN 1 ELSE 0 END), "
+                f"SUM(CAST(\"totalplants\" AS INTEGER)) "
+                f'FROM "{table}" {filtre}'
+            ).fetchone()
+
+            surfaces_par_type = {}
+            nb_par_type = {}
+            for type_parc, surface, nombre in connexion.execute(
+                f'SELECT "typeParc", SUM({SURFACE}), COUNT(*) FROM "{table}" {filtre} '
+                f'{et} "typeParc" BETWEEN ? AND ? GROUP BY "typeParc" ORDER BY MIN(rowid)',
+                (type_parc_min, type_parc_max),
+            ):
+                surfaces_par_type[int(type_parc)] = surface or 0.0
+                nb_par_type[int(type_parc)] = nombre
+
+            # Les quatre couples plantX / TxX mis bout à bout puis regroupés par essence
+            union = " UNION ALL ".join(
+                f'SELECT "plant{i}" AS essence, '
+                f'COALESCE(CAST("Tx{i}" AS REAL), 0) / 100.0 * {SURFACE} AS poids, '
+                f"rowid * 4 + {i} AS ordre "
+                f'FROM "{table}" {filtre} {et} "plant{i}" IS NOT NULL AND "plant{i}" <> \'\''
+                for i in range(1, 5)
+            )
+            surfaces_par_essence = {}
+            nb_par_essence = {}
+            for essence, poids, nombre in connexion.execute(
+                f"SELECT essence, SUM(poids), COUNT(*) FROM ({union}) GROUP BY essence ORDER BY MIN(ordre)"
+            ):
+                surfaces_par_essence[essence] = poids or 0.0
+                nb_par_essence[essence] = nombre
+    except sqlite3.Error:
+        return None
+
+    return {
+        "surface_forestiere_m2": (forestiere or 0.0) * 100,
+        "surface_friche_m2": (friche or 0.0) * 100,
+        "nb_parcelles": nb_parcelles or 0,
+        "surfaces_par_type": surfaces_par_type,
+        "nb_par_type": nb_par_type,
+        "total_types": sum(surfaces_par_type.values()),
+        "surfaces_par_essence": surfaces_par_essence,
+        "nb_par_essence": nb_par_essence,
+        "total_essences": sum(surfaces_par_essence.values()),
+        "total_plants": plants or 0,
+    }
@@ -1,45 +1,97 @@
 
 # Code permettant un calcul en arrière-plan des différentes analyses sans bloquer
-# l'affichage de la fenêtre principale
+# l'affichage de la fenêtre principale : tâche du gestionnaire de tâches QGIS,
+# avec progression et annulation
 
 # analyse_worker.py
-from PyQt5.QtCore import QObject, pyqtSignal
-from .Analyse import (
-    calcul_surface_forestiere,
-    calcul_surface_friche,
-    compter_parcelles_possedees,
-    analyse_types_parcelles,
-    analyse_types_essences,
-    total_plantation,
-    calcul_regroupement
-)
-
-class AnalyseWorker(QObject):
-    finished = pyqtSignal(dict)
+from PyQt5.QtCore import pyqtSignal
+from qgis.core import QgsFeedback, QgsTask
+from .acces_parcelles import SourceParcelles
+from .moteur_analyse import executer_analyses, analyses_par_defaut
+from .snapshot_parcelles import SnapshotParcelles, analyser_snapshot, numpy_disponible
+from .statistiques_incrementales import StockStatistiques, lecteur_fournisseur
+from .contiguite import tolerance_pour_couche
+from .agregats_sql import agregats_source, source_sql
+from .graphe_adjacence import preparer_graphe, charger_graphe
+from .Analyse import calcul_regroupement
+
+
+class AnalyseTask(QgsTask):
+    """
+    Tâche de calcul des analyses. Tout ce qui touche la couche est préparé dans le
+    constructeur (thread principal) ; run() ne lit que des sources thread-safe.
+    """
+    termine = pyqtSignal(dict)
+
+    # Plage de progression (en %) de chaque étape
+    ETAPES = {"lecture": (0, 70), "regroupement": (70, 95), "stock": (95, 100)}
 
     def __init__(self, layer):
-        super().__init__()
-        self.layer = layer
+        super().__init__(f"Analyses forestières : {layer.name()}", QgsTask.CanCancel)
+        self.source = SourceParcelles(layer)
+        self.tolerance = tolerance_pour_couche(layer)
+        self.sql = source_sql(layer)
+        self.graphe_persistant = preparer_graphe(layer)
+        self.lecteur = lecteur_fournisseur(layer)
+        self.feedback = None
+        self.results = None
+        self.snapshot = None
+        self.stock = None
+
+    def _etape(self, nom):
+        """Nouveau QgsFeedback dont la progression (0-100) est ramenée à la plage de l'étape."""
+        debut, fin = self.ETAPES[nom]
+        self.setProgress(debut)
+        self.feedback = QgsFeedback()
+        self.feedback.progressChanged.connect(lambda p: self.setProgress(debut + (fin - debut) * p / 100.0))
+        if self.isCanceled():
+            self.feedback.cancel()
+        return self.feedback
+
+    def cancel(self):
+        if self.feedback is not None:
+            self.feedback.cancel()
+        super().cancel()
 
     def run(self):
-        # Exécute les calculs
-        surface_forestiere = calcul_surface_forestiere(self.layer)
-        surface_friche = calcul_surface_friche(self.layer)
-        nb_parcelles = compter_parcelles_possedees(self.layer)
-        types_parcelles = analyse_types_parcelles(self.layer)
-        types_essences = analyse_types_essences(self.layer)
-        total_plants = total_plantation(self.layer)
-        regroupement = calcul_regroupement(self.layer)
-
-        results = {
-            "surface_forestiere": surface_forestiere,
-            "surface_friche": surface_friche,
-            "nb_parcelles": nb_parcelles,
-            "types_parcelles": types_parcelles,
-            "types_essences": types_essences,
-            "total_plants": total_plants,
-            "regroupement": regroupement
-        }
-
-        # Émettre le signal avec les résultats
-        self.finished.emit(results)
+        agregats = agregats_source(self.sql, feedback=self._etape("lecture"))
+        if self.isCanceled():
+            return False
+
+        if agregats is not None:
+            # GeoPackage sans modification en cours : agrégats calculés par SQLite
+            self.stock = StockStatistiques.depuis_agregats(agregats, self.lecteur)
+            results = self.stock.resultats()
+            feedback = self._etape("regroupement")
+            results["regroupement"] = calcul_regroupement(
+                self.source, charger_graphe(self.graphe_persistant, feedback), feedback)
+        elif numpy_disponible():
+            # Photographie en colonnes des attributs, réutilisable pour d'autres analyses
+            self.snapshot = SnapshotParcelles.depuis_couche(self.source, self._etape("lecture"))
+            if self.isCanceled():
+                return False
+            feedback = self._etape("regroupement")
+            results = analyser_snapshot(self.source, self.snapshot,
+                                        graphe=charger_graphe(self.graphe_persistant, feedback), feedback=feedback)
+            if self.isCanceled():
+                return False
+            self._etape("stock")
+            self.stock = StockStatistiques.depuis_snapshot(self.snapshot)
+        else:
+            # Repli : tous les calculs en une seule lecture de la couche
+            results = executer_analyses(
+                self.source, analyses_par_defaut(tolerance=self.tolerance), self._etape("lecture"))
+            if self.isCanceled():
+                return False
+            self.stock = StockStatistiques.depuis_couche(self.source, self._etape("stock"))
+
+        if self.isCanceled():
+            return False
+        self.results = results
+        self.setProgress(100)
+        return True
+
+    def finished(self, result):
+        # Appelé dans le thread principal une fois run() terminé
+        if result and self.results is not None:
+            self.termine.emit(self.results)
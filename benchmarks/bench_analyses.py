@@ -0,0 +1,91 @@
+# bench_analyses.py
+# Banc d'essai : moteur d'analyse en une passe (moteur_analyse.executer_analyses)
+# comparé aux sept fonctions historiques de Analyse.py (un parcours de couche chacune).
+#
+# Usage, hors de QGIS (qgis.core suffit) :
+#     python benchmarks/bench_analyses.py chemin/couche.gpkg [nom_couche] [repetitions]
+
+import importlib
+import os
+import sys
+import time
+
+from qgis.core import QgsApplication, QgsVectorLayer
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def importer_plugin(module):
+    """Importe un module du plugin en tant que sous-module du paquet (imports relatifs)."""
+    parent = os.path.dirname(PLUGIN_DIR)
+    if parent not in sys.path:
+        sys.path.insert(0, parent)
+    # Comme au chargement du plugin (gestion_forestiere.py) : imports absolus des modules d'interface
+    if PLUGIN_DIR not in sys.path:
+        sys.path.append(PLUGIN_DIR)
+    return importlib.import_module(f"{os.path.basename(PLUGIN_DIR)}.{module}")
+
+
+def chronometrer(fonction, repetitions):
+    """Retourne (meilleur temps en secondes, dernier résultat)."""
+    meilleur = float("inf")
+    resultat = None
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        resultat = fonction()
+        meilleur = min(meilleur, time.perf_counter() - debut)
+    return meilleur, resultat
+
+
+def analyses_sept_parcours(analyse, layer):
+    """Chemin historique : une lecture complète de la couche par analyse."""
+    return {
+        "surface_forestiere": analyse.calcul_surface_forestiere(layer),
+        "surface_friche": analyse.calcul_surface_friche(layer),
+        "nb_parcelles": analyse.compter_parcelles_possedees(layer),
+        "types_parcelles": analyse.analyse_types_parcelles(layer),
+        "types_essences": analyse.analyse_types_essences(layer),
+        "total_plants": analyse.total_plantation(layer),
+        "regroupement": analyse.calcul_regroupement(layer),
+    }
+
+
+def main(argv):
+    if len(argv) < 2:
+        print("Usage : bench_analyses.py couche.gpkg [nom_couche] [repetitions]")
+        return 1
+
+    chemin = argv[1]
+    source = f"{chemin}|layername={argv[2]}" if len(argv) > 2 else chemin
+    repetitions = int(argv[3]) if len(argv) > 3 else 3
+
+    layer = QgsVectorLayer(source, "bench", "ogr")
+    if not layer.isValid():
+        print(f"Couche invalide : {source}")
+        return 1
+
+    analyse = importer_plugin("Analyse")
+    moteur = importer_plugin("moteur_analyse")
+
+    print(f"{layer.featureCount()} entités - meilleur temps sur {repetitions} répétition(s)")
+
+    t_sept, res_sept = chronometrer(lambda: analyses_sept_parcours(analyse, layer), repetitions)
+    print(f"Sept parcours         : {t_sept:.3f} s")
+
+    t_une, res_une = chronometrer(lambda: moteur.executer_analyses(layer), repetitions)
+    print(f"Moteur en une passe   : {t_une:.3f} s  (x{t_sept / t_une:.1f})")
+
+    differences = [cle for cle in res_sept if res_sept[cle] != res_une.get(cle)]
+    if differences:
+        print(f"❌ Résultats différents pour : {', '.join(differences)}")
+        return 2
+    print("✅ Résultats identiques")
+    return 0
+
+
+if __name__ == "__main__":
+    qgs = QgsApplication([], False)
+    qgs.initQgis()
+    code = main(sys.argv)
+    qgs.exitQgis()
+    sys.exit(code)
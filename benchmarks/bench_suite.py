@@ -0,0 +1,152 @@
+# bench_suite.py
+# Banc d'essai complet sur des cadastres synthétiques (generer_cadastre.py) :
+# chaque fonction de Analyse.py, l'export dans chaque format disponible et la création des champs
+# (ConfigDialog.create_fields_table), avec débit et pic mémoire.
+#
+# Usage, hors de QGIS (qgis.core suffit) :
+#     python benchmarks/bench_suite.py [--tailles 1000,10000,100000,1000000] [--dossier DIR] [--repetitions N]
+#
+# Les cadastres générés sont conservés dans le dossier (réutilisés au lancement suivant).
+# Le pic mémoire est mesuré par tracemalloc : allocations Python uniquement, pas celles de GDAL/GEOS.
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from qgis.core import QgsApplication, QgsVectorLayer
+
+from bench_analyses import importer_plugin
+from generer_cadastre import generer, source_couche
+
+TAILLES = [1000, 10000, 100000, 1000000]
+
+
+def mesurer(fonction, repetitions, preparer=None):
+    """
+    Retourne (meilleur temps en s, pic mémoire Python en octets).
+    Le temps est mesuré sans tracemalloc ; une exécution supplémentaire mesure le pic.
+    preparer : appelée avant chaque exécution, hors chronométrage
+    """
+    meilleur = float("inf")
+    for _ in range(repetitions):
+        if preparer:
+            preparer()
+        debut = time.perf_counter()
+        fonction()
+        meilleur = min(meilleur, time.perf_counter() - debut)
+
+    if preparer:
+        preparer()
+    tracemalloc.start()
+    fonction()
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return meilleur, pic
+
+
+def cadastre(dossier, taille, brut=False):
+    """Chemin du cadastre synthétique de `taille` parcelles, généré s'il n'existe pas."""
+    chemin = os.path.join(dossier, f"cadastre_{taille}{'_brut' if brut else ''}.gpkg")
+    if not os.path.exists(chemin):
+        debut = time.perf_counter()
+        ecrites = generer(chemin, taille, brut=brut)
+        print(f"  génération {os.path.basename(chemin)} : {ecrites} entités en {time.perf_counter() - debut:.1f} s")
+    return chemin
+
+
+def operations(layer, dossier):
+    """Opérations chronométrées sur la couche complète : (nom, fonction)."""
+    analyse = importer_plugin("Analyse")
+    export = importer_plugin("export_parcelles")
+    champs_export = export.champs_export(layer, tout=True)
+
+    ops = [
+        ("calcul_surface_forestiere", lambda: analyse.calcul_surface_forestiere(layer)),
+        ("calcul_surface_friche", lambda: analyse.calcul_surface_friche(layer)),
+        ("compter_parcelles_possedees", lambda: analyse.compter_parcelles_possedees(layer)),
+        ("analyse_types_parcelles", lambda: analyse.analyse_types_parcelles(layer)),
+        ("analyse_types_essences", lambda: analyse.analyse_types_essences(layer)),
+        ("total_plantation", lambda: analyse.total_plantation(layer)),
+        # Le premier appel enregistre le graphe d'adjacence : le meilleur temps
+        # correspond au graphe déjà enregistré
+        ("calcul_regroupement", lambda: analyse.calcul_regroupement(layer)),
+    ]
+
+    # Export dans chaque format disponible (xlsxwriter éventuellement fourni par le dossier local)
+    if export.XLSXWRITER_LIB not in sys.path:
+        sys.path.insert(0, export.XLSXWRITER_LIB)
+    classes = export.ecrivains_disponibles()
+    if not any(classe.format == "xlsx" for classe in classes):
+        print("  xlsxwriter absent : export Excel ignoré")
+    for classe in classes:
+        sortie = os.path.join(dossier, f"export_bench{classe.extension}")
+        ops.append((f"export {classe.format} (tous les champs)",
+                    lambda classe=classe, sortie=sortie: export.exporter(layer, champs_export, sortie, classe)))
+    return ops
+
+
+def afficher(nom, temps, pic, nb):
+    debit = nb / temps if temps > 0 else float("inf")
+    print(f"  {nom:<38} {temps:9.3f} s {debit:12,.0f} ent./s {pic / 1e6:9.1f} Mo")
+
+
+def bench_taille(dossier, taille, repetitions):
+    chemin = cadastre(dossier, taille)
+    layer = QgsVectorLayer(source_couche(chemin), "bench", "ogr")
+    if not layer.isValid():
+        print(f"Couche invalide : {chemin}")
+        return False
+    nb = layer.featureCount()
+
+    print(f"\n{nb} entités ({taille} parcelles) - meilleur temps sur {repetitions} répétition(s)")
+    print(f"  {'opération':<38} {'temps':>11} {'débit':>19} {'pic mém.':>12}")
+    for nom, fonction in operations(layer, dossier):
+        temps, pic = mesurer(fonction, repetitions)
+        afficher(nom, temps, pic, nb)
+
+    # Création des champs : sur une copie neuve du cadastre brut à chaque exécution
+    param = importer_plugin("param")
+    brut = cadastre(dossier, taille, brut=True)
+    copie = os.path.join(dossier, "champs_bench.gpkg")
+    etat = {}
+
+    def preparer():
+        etat.pop("layer", None)
+        shutil.copyfile(brut, copie)
+        etat["layer"] = QgsVectorLayer(source_couche(copie), "champs", "ogr")
+
+    def creer():
+        layer_brut = etat["layer"]
+        param.creer_champs_manquants(layer_brut, param.champs_manquants(layer_brut))
+
+    temps, pic = mesurer(creer, repetitions, preparer)
+    afficher("create_fields_table (champs + SURFACE)", temps, pic, nb)
+    etat.clear()
+    return True
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Banc d'essai des analyses sur cadastres synthétiques")
+    parser.add_argument("--tailles", default=",".join(str(t) for t in TAILLES),
+                        help="nombres de parcelles, séparés par des virgules")
+    parser.add_argument("--dossier", default=os.path.join(tempfile.gettempdir(), "gestion_forestiere_bench"))
+    parser.add_argument("--repetitions", type=int, default=3)
+    args = parser.parse_args(argv[1:])
+
+    os.makedirs(args.dossier, exist_ok=True)
+    for taille in (int(t) for t in args.tailles.split(",")):
+        if not bench_taille(args.dossier, taille, args.repetitions):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    qgs = QgsApplication([], False)
+    qgs.initQgis()
+    code = main(sys.argv)
+    qgs.exitQgis()
+    sys.exit(code)
@@ -0,0 +1,243 @@
+# generer_cadastre.py
+# Génère un cadastre synthétique (GeoPackage, EPSG:2154) pour les bancs d'essai :
+# parcelles d'une grille aux sommets décalés mais partagés (contiguïté réaliste),
+# possession regroupée en massifs, sous-parcelles indicées, essences, taux et dates.
+#
+# Usage, hors de QGIS (qgis.core suffit) :
+#     python benchmarks/generer_cadastre.py sortie.gpkg nb_parcelles [--brut] [--graine N]
+#
+# --brut : seuls les champs du cadastre d'origine (avant ConfigDialog.create_fields_table)
+
+import argparse
+import math
+import os
+import random
+import sys
+
+from qgis.PyQt.QtCore import QDate
+from qgis.core import (
+    QgsApplication,
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransformContext,
+    QgsFeature,
+    QgsField,
+    QgsFields,
+    QgsGeometry,
+    QgsPointXY,
+    QgsVectorFileWriter,
+    QgsWkbTypes,
+)
+
+from bench_analyses import importer_plugin
+
+NOM_COUCHE = "parcelles"
+COMMUNE = "88123"
+PREFIXE = "000"
+
+# Origine de la grille (Lambert-93, massif vosgien) et taille moyenne d'une parcelle (m)
+ORIGINE = (960000.0, 6780000.0)
+PAS = 60.0
+DECALAGE = 0.25 * PAS
+
+# Part des parcelles découpées en sous-parcelles indicées (a, b)
+PART_SUBDIVISEES = 0.02
+
+CHAMPS_BRUTS = [
+    ("id", "String"),
+    ("commune", "String"),
+    ("prefixe", "String"),
+    ("section", "String"),
+    ("numero", "String"),
+    ("contenance", "Integer64"),
+    ("arpente", "Integer"),
+    ("created", "Date"),
+    ("updated", "Date"),
+]
+
+ESSENCES = [
+    ("Sapin pectiné", 30), ("Epicéa commun", 25), ("Hêtre", 15), ("Douglas", 10),
+    ("Chêne sessile", 6), ("Pin sylvestre", 5), ("Mélèze", 4), ("Erable sycomore", 3), ("Bouleau", 2),
+]
+TRAVAUX = ["Dégagement", "Nettoiement", "Elagage", "Dépressage", "Cloisonnement", "Regarnis"]
+TRAITEMENTS = ["Protection gibier", "Répulsif", "Manchons", "Clôture"]
+PREVISIONS = ["Éclaircie", "Coupe rase", "Plantation", "Dégagement"]
+TERRAINS = ["Plat", "Pente faible", "Pente forte", "Humide", "Rocheux"]
+ACCES = ["Route", "Chemin forestier", "Piste", "Sans accès"]
+
+# typeParc des parcelles possédées (poids) : majoritairement boisées, quelques friches (8, 9, 14)
+TYPES_PARC = [(1, 5), (2, 20), (3, 15), (4, 12), (5, 10), (6, 8), (7, 6), (8, 5), (9, 4),
+              (10, 4), (11, 3), (12, 3), (13, 2), (14, 3)]
+
+
+def _choix(rng, ponderes):
+    valeurs, poids = zip(*ponderes)
+    return rng.choices(valeurs, weights=poids)[0]
+
+
+def _date(rng, annee_min=2000, annee_max=2024):
+    return QDate(rng.randint(annee_min, annee_max), rng.randint(1, 12), rng.randint(1, 28))
+
+
+def _possedee(rng, col, ligne):
+    """Possession en massifs : champ lissé + bruit, environ 30 % des parcelles."""
+    massif = math.sin(col / 9.0) + math.cos(ligne / 7.0) + 0.5 * math.sin((col + ligne) / 13.0) > 0.9
+    # 5 % d'exceptions : parcelles isolées achetées, enclaves vendues
+    return not massif if rng.random() < 0.05 else massif
+
+
+def _schema(brut):
+    param = importer_plugin("param")
+    champs = list(CHAMPS_BRUTS)
+    if not brut:
+        noms = {nom for nom, _ in champs}
+        champs += [(nom, typ) for nom, typ in param.CHAMPS_A_CREER if nom not in noms]
+    fields = QgsFields()
+    for nom, typ in champs:
+        fields.append(QgsField(nom, param.TYPE_MAPPING[typ]))
+    return fields
+
+
+def _attributs_gestion(rng, feature, possedee, surface):
+    """Champs ajoutés par le plugin : gestion forestière des parcelles possédées."""
+    feature["SURFACE"] = surface
+    feature["Possession"] = possedee
+    if not possedee:
+        return
+
+    feature["typeParc"] = _choix(rng, TYPES_PARC)
+    feature["Terrain"] = rng.choice(TERRAINS)
+    feature["Acces"] = rng.choice(ACCES)
+
+    nb_essences = rng.choices([1, 2, 3, 4], weights=[40, 35, 18, 7])[0]
+    essences = []
+    while len(essences) < nb_essences:
+        essence = _choix(rng, ESSENCES)
+        if essence not in essences:
+            essences.append(essence)
+    coupures = sorted(rng.sample(range(5, 100, 5), nb_essences - 1))
+    taux = [b - a for a, b in zip([0] + coupures, coupures + [100])]
+    for i, (essence, tx) in enumerate(zip(essences, taux), start=1):
+        feature[f"plant{i}"] = essence
+        feature[f"Tx{i}"] = tx
+
+    feature["annee"] = rng.randint(1980, 2024)
+    feature["totalplants"] = int(surface * rng.randint(10, 25))
+
+    for i in range(1, rng.randint(0, 6) + 1):
+        feature[f"Tvx{i}"] = rng.choice(TRAVAUX)
+        feature[f"dateTvx{i}"] = _date(rng)
+        feature[f"remTvx{i}"] = f"Intervention {i}"
+    for i in range(1, rng.randint(0, 3) + 1):
+        feature[f"Trait{i}"] = rng.choice(TRAITEMENTS)
+        feature[f"dateTrait{i}"] = _date(rng)
+    for i in range(1, rng.randint(0, 2) + 1):
+        feature[f"Prev{i}"] = rng.choice(PREVISIONS)
+        feature[f"datePrev{i}"] = str(rng.randint(2025, 2040))
+
+
+def generer(chemin, nb_parcelles, brut=False, graine=0):
+    """Écrit `nb_parcelles` parcelles dans `chemin` (écrasé) et retourne le nombre écrit."""
+    rng = random.Random(graine)
+    fields = _schema(brut)
+
+    colonnes = max(1, math.ceil(math.sqrt(nb_parcelles)))
+    lignes = math.ceil(nb_parcelles / colonnes)
+
+    # Sommets de la grille, décalés aléatoirement mais partagés par les parcelles voisines
+    sommets = [
+        [
+            QgsPointXY(
+                ORIGINE[0] + c * PAS + (rng.uniform(-DECALAGE, DECALAGE) if 0 < c < colonnes else 0),
+                ORIGINE[1] + l * PAS + (rng.uniform(-DECALAGE, DECALAGE) if 0 < l < lignes else 0),
+            )
+            for c in range(colonnes + 1)
+        ]
+        for l in range(lignes + 1)
+    ]
+
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = "GPKG"
+    options.layerName = NOM_COUCHE
+    writer = QgsVectorFileWriter.create(
+        chemin, fields, QgsWkbTypes.Polygon, QgsCoordinateReferenceSystem("EPSG:2154"),
+        QgsCoordinateTransformContext(), options,
+    )
+    if writer.hasError() != QgsVectorFileWriter.NoError:
+        raise RuntimeError(writer.errorMessage())
+
+    numeros = {}
+    lot = []
+    ecrites = 0
+    for k in range(nb_parcelles):
+        l, c = divmod(k, colonnes)
+        anneau = [sommets[l][c], sommets[l][c + 1], sommets[l + 1][c + 1], sommets[l + 1][c], sommets[l][c]]
+        geom = QgsGeometry.fromPolygonXY([anneau])
+
+        # Une section cadastrale par bloc de 40 x 40 parcelles
+        section = f"{chr(65 + (l // 40) % 26)}{chr(65 + (c // 40) % 26)}"
+        numero = numeros[section] = numeros.get(section, 0) + 1
+        numero = str(numero).zfill(4)
+        possedee = _possedee(rng, c, l)
+
+        pieces = [("", geom)]
+        if rng.random() < PART_SUBDIVISEES:
+            # Parcelle mère + deux sous-parcelles (moitiés) portant un indice
+            milieu_haut = QgsPointXY((anneau[0].x() + anneau[1].x()) / 2, (anneau[0].y() + anneau[1].y()) / 2)
+            milieu_bas = QgsPointXY((anneau[2].x() + anneau[3].x()) / 2, (anneau[2].y() + anneau[3].y()) / 2)
+            pieces.append(("a", QgsGeometry.fromPolygonXY([[anneau[0], milieu_haut, milieu_bas, anneau[3], anneau[0]]])))
+            pieces.append(("b", QgsGeometry.fromPolygonXY([[milieu_haut, anneau[1], anneau[2], milieu_bas, milieu_haut]])))
+
+        for indice, piece in pieces:
+            contenance = int(round(piece.area()))
+            feature = QgsFeature(fields)
+            feature.setGeometry(piece)
+            feature["id"] = f"{COMMUNE}{PREFIXE}{section}{numero}{indice}"
+            feature["commune"] = COMMUNE
+            feature["prefixe"] = PREFIXE
+            feature["section"] = section
+            feature["numero"] = numero
+            feature["contenance"] = contenance
+            feature["arpente"] = 0
+            feature["created"] = _date(rng, 2010, 2018)
+            feature["updated"] = _date(rng, 2019, 2024)
+            if not brut:
+                feature["indice_parc"] = indice
+                _attributs_gestion(rng, feature, possedee, contenance / 100.0)
+            lot.append(feature)
+
+        if len(lot) >= 10000:
+            writer.addFeatures(lot)
+            ecrites += len(lot)
+            lot = []
+
+    writer.addFeatures(lot)
+    ecrites += len(lot)
+    del writer  # fermeture du fichier
+    return ecrites
+
+
+def source_couche(chemin):
+    return f"{chemin}|layername={NOM_COUCHE}"
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Cadastre synthétique pour les bancs d'essai")
+    parser.add_argument("sortie", help="fichier .gpkg à créer (écrasé)")
+    parser.add_argument("nb_parcelles", type=int)
+    parser.add_argument("--brut", action="store_true", help="champs du cadastre d'origine uniquement")
+    parser.add_argument("--graine", type=int, default=0)
+    args = parser.parse_args(argv[1:])
+
+    if os.path.exists(args.sortie):
+        os.remove(args.sortie)
+    ecrites = generer(args.sortie, args.nb_parcelles, brut=args.brut, graine=args.graine)
+    print(f"{ecrites} entités écrites dans {args.sortie}")
+    return 0
+
+
+if __name__ == "__main__":
+    qgs = QgsApplication([], False)
+    qgs.initQgis()
+    code = main(sys.argv)
+    qgs.exitQgis()
+    sys.exit(code)
@@ -0,0 +1,171 @@
+# cache_analyses.py
+# Cache persistant des résultats de l'onglet Analyses, rangé dans le profil QGIS.
+# La clé est une empreinte de la source (fichier, taille, date, WAL, last_change du
+# GeoPackage, filtre) et des paramètres d'analyse : une forêt rouverte sans
+# modification affiche ses analyses sans relancer le calcul.
+
+import hashlib
+import json
+import os
+import sqlite3
+from collections import OrderedDict
+from contextlib import closing
+from pathlib import Path
+
+from qgis.core import QgsProviderRegistry
+
+from .statistiques_incrementales import StockStatistiques, lecteur_fournisseur
+from .utils import get_plugin_profile_dir, log_warning
+
+FICHIER_CACHE = "cache_analyses.json"
+VERSION_CACHE = 2
+
+# Nombre d'entrées conservées, tous projets confondus (les moins récemment utilisées sortent)
+TAILLE_MAX = 20
+
+# Agrégats dont les clés ne sont pas des chaînes : stockés en liste de paires
+AGREGATS_DICT = ("surfaces_par_type", "nb_par_type", "surfaces_par_essence", "nb_par_essence")
+
+
+def _etat_fichier(chemin):
+    try:
+        stat = os.stat(chemin)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _derniere_modification_gpkg(chemin, table):
+    """Colonne last_change de gpkg_contents, mise à jour par OGR à chaque écriture."""
+    try:
+        with closing(sqlite3.connect(f"{Path(chemin).as_uri()}?mode=ro", uri=True, timeout=5)) as connexion:
+            ligne = connexion.execute(
+                "SELECT last_change FROM gpkg_contents WHERE table_name = ?", (table,)
+            ).fetchone()
+    except sqlite3.Error:
+        return None
+    return ligne[0] if ligne else None
+
+
+def empreinte_analyses(layer, parametres):
+    """
+    Clé de cache des analyses de la couche, ou None si elle ne peut pas être
+    établie (source non fichier, modifications non enregistrées).
+    """
+    if layer is None or layer.isModified():
+        return None
+
+    uri = QgsProviderRegistry.instance().decodeUri(layer.providerType(), layer.source())
+    chemin = uri.get("path", "")
+    etat = _etat_fichier(chemin) if chemin else None
+    if etat is None:
+        return None
+
+    source = {
+        "source": layer.source(),
+        "fichier": etat,
+        "wal": _etat_fichier(f"{chemin}-wal"),
+        "filtre": layer.subsetString(),
+        "parametres": parametres,
+        "version": VERSION_CACHE,
+    }
+    table = uri.get("layerName")
+    if chemin.lower().endswith(".gpkg") and table:
+        source["last_change"] = _derniere_modification_gpkg(chemin, table)
+
+    return hashlib.sha1(json.dumps(source, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _serialiser_agregats(agregats):
+    donnees = dict(agregats)
+    for cle in AGREGATS_DICT:
+        donnees[cle] = list(agregats[cle].items())
+    return donnees
+
+
+def _deserialiser_agregats(donnees):
+    agregats = dict(donnees)
+    for cle in AGREGATS_DICT:
+        agregats[cle] = {k: v for k, v in donnees[cle]}
+    return agregats
+
+
+def _serialiser_resultats(resultats):
+    donnees = dict(resultats)
+    donnees["surfaces_par_type"] = list(resultats["surfaces_par_type"].items())
+    return donnees
+
+
+def _deserialiser_resultats(donnees):
+    resultats = dict(donnees)
+    resultats["surfaces_par_type"] = {k: v for k, v in donnees["surfaces_par_type"]}
+    return resultats
+
+
+class CacheAnalyses:
+    """
+    Fichier JSON du profil : empreinte -> {"resultats", "agregats"}, éviction LRU.
+    Les entrées sont lues une fois puis gardées en mémoire ; l'ordre d'utilisation
+    n'est écrit dans le fichier qu'avec la prochaine analyse enregistrée.
+    """
+
+    def __init__(self, chemin=None, taille_max=TAILLE_MAX):
+        self.chemin = chemin or os.path.join(get_plugin_profile_dir(), FICHIER_CACHE)
+        self.taille_max = taille_max
+        self.parametres = {"type_parc_min": 2, "type_parc_max": 14, "top_n": 5, "nb_groupes": 3}
+        self._entrees = None
+
+    def _charger(self):
+        if self._entrees is None:
+            try:
+                with open(self.chemin, "r", encoding="utf-8") as fichier:
+                    self._entrees = OrderedDict(json.load(fichier))
+            except (OSError, ValueError):
+                self._entrees = OrderedDict()
+        return self._entrees
+
+    def _enregistrer(self, entrees):
+        # Écriture dans un fichier temporaire puis remplacement : jamais de cache tronqué
+        temporaire = f"{self.chemin}.tmp"
+        try:
+            with open(temporaire, "w", encoding="utf-8") as fichier:
+                json.dump(entrees, fichier, ensure_ascii=False)
+            os.replace(temporaire, self.chemin)
+        except OSError as e:
+            log_warning(f"⚠️ Cache des analyses non enregistré : {e}")
+
+    def lire_analyses(self, layer):
+        """
+        Retourne (résultats, StockStatistiques) si les analyses de la couche sont en cache,
+        sinon None. Le stock est reconstruit à partir des agrégats enregistrés.
+        """
+        cle = empreinte_analyses(layer, self.parametres)
+        if cle is None:
+            return None
+        entrees = self._charger()
+        entree = entrees.get(cle)
+        if entree is None:
+            return None
+
+        entrees.move_to_end(cle)
+
+        stock = StockStatistiques.depuis_agregats(
+            _deserialiser_agregats(entree["agregats"]),
+            lecteur_fournisseur(layer),
+            type_parc_min=self.parametres["type_parc_min"],
+            type_parc_max=self.parametres["type_parc_max"],
+            top_n=self.parametres["top_n"],
+        )
+        return _deserialiser_resultats(entree["resultats"]), stock
+
+    def ecrire_analyses(self, layer, resultats, stock):
+        """Enregistre les résultats et les agrégats du stock (calculés sur la couche non modifiée)."""
+        cle = empreinte_analyses(layer, self.parametres)
+        if cle is None or stock is None:
+            return
+        entrees = self._charger()
+        entrees[cle] = {"resultats": _serialiser_resultats(resultats), "agregats": _serialiser_agregats(stock.agregats())}
+        entrees.move_to_end(cle)
+        while len(entrees) > self.taille_max:
+            entrees.popitem(last=False)
+        self._enregistrer(entrees)
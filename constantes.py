@@ -34,4 +34,10 @@ SAISIE_COMBO_SETTINGS = [
     ("Tvx", "comboTvx", 1),
     ("Trait", "comboTrait", 2),
     ("Prev", "comboPrev", 1),
+]
+
+# 🔧 Vocabulaires Accès / Terrain de l'onglet Infos (nom, nom du combo, index de colonne)
+VOCABULAIRES_TERRAIN_ACCES = [
+    ("Acces", "comboModifAcces", 3),
+    ("Terrain", "comboModifTerrain", 4),
 ]
\ No newline at end of file
@@ -0,0 +1,313 @@
+# contiguite.py
+# Moteur de contiguïté des parcelles : le graphe d'adjacence est construit une fois
+# en hachant les sommets et segments de frontière (les parcelles voisines d'un
+# cadastre partagent les mêmes sommets), puis les groupes sont formés par union-find.
+# Les tests GEOS (géométries préparées) ne servent qu'en repli, pour les géométries
+# que le hachage ne sait pas traiter (vides ou courbes).
+
+import math
+
+from qgis.core import QgsGeometry, QgsSpatialIndex, QgsWkbTypes
+
+# Tolérance d'accrochage des sommets, en unités de la couche
+TOLERANCE_METRIQUE = 1e-3
+TOLERANCE_GEOGRAPHIQUE = 1e-8
+
+# Entités (ou cellules de grille) traitées entre deux points de progression / d'annulation
+TAILLE_BLOC = 1000
+
+
+def tolerance_pour_couche(layer):
+    """Tolérance d'accrochage adaptée au SCR de la couche (degrés ou mètres)."""
+    return TOLERANCE_GEOGRAPHIQUE if layer.crs().isGeographic() else TOLERANCE_METRIQUE
+
+
+class UnionFind:
+    """Union-find avec compression de chemin et union par taille."""
+
+    def __init__(self, elements=()):
+        self.parent = {}
+        self.taille = {}
+        for element in elements:
+            self.ajouter(element)
+
+    def ajouter(self, element):
+        if element not in self.parent:
+            self.parent[element] = element
+            self.taille[element] = 1
+
+    def trouver(self, element):
+        racine = element
+        while self.parent[racine] != racine:
+            racine = self.parent[racine]
+        while self.parent[element] != racine:
+            self.parent[element], element = racine, self.parent[element]
+        return racine
+
+    def unir(self, a, b):
+        ra, rb = self.trouver(a), self.trouver(b)
+        if ra == rb:
+            return
+        if self.taille[ra] < self.taille[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.taille[ra] += self.taille[rb]
+
+    def composantes(self):
+        groupes = {}
+        for element in self.parent:
+            groupes.setdefault(self.trouver(element), []).append(element)
+        return list(groupes.values())
+
+
+class GrapheContiguite:
+    """Graphe non orienté fid -> {fid voisin: longueur de frontière commune}."""
+
+    def __init__(self):
+        self.voisins = {}
+
+    def ajouter_noeud(self, fid):
+        self.voisins.setdefault(fid, {})
+
+    def ajouter_arete(self, a, b, longueur=0.0):
+        if a == b:
+            return
+        self.voisins.setdefault(a, {})
+        self.voisins.setdefault(b, {})
+        longueur = max(longueur, self.voisins[a].get(b, 0.0))
+        self.voisins[a][b] = longueur
+        self.voisins[b][a] = longueur
+
+    def retirer_noeud(self, fid):
+        for voisin in self.voisins.pop(fid, {}):
+            self.voisins[voisin].pop(fid, None)
+
+    def voisins_de(self, fid):
+        return self.voisins.get(fid, {})
+
+    def aretes(self):
+        """Itère sur les arêtes (a, b, longueur) avec a < b."""
+        for a, voisins in self.voisins.items():
+            for b, longueur in voisins.items():
+                if a < b:
+                    yield a, b, longueur
+
+    def __len__(self):
+        return len(self.voisins)
+
+
+def anneaux(geom):
+    """Anneaux (listes de QgsPointXY) d'une géométrie polygonale simple ou multiple."""
+    polygones = geom.asMultiPolygon() if geom.isMultipart() else [geom.asPolygon()]
+    for polygone in polygones:
+        for anneau in polygone:
+            yield anneau
+
+
+def _hachable(geom):
+    return geom is not None and not geom.isEmpty() and not QgsWkbTypes.isCurvedType(geom.wkbType())
+
+
+def _chevauchement_colineaire(p1, p2, q1, q2, tolerance):
+    """
+    Longueur de recouvrement de deux segments colinéaires (0 si non colinéaires
+    ou disjoints). Les points sont des tuples de coordonnées.
+    """
+    dx, dy = p2[0] - p1[0], p2[1] - p1[1]
+    longueur = math.hypot(dx, dy)
+    if longueur <= tolerance:
+        return 0.0
+
+    # Distance des extrémités de q à la droite (p1, p2)
+    for q in (q1, q2):
+        if abs(dx * (q[1] - p1[1]) - dy * (q[0] - p1[0])) / longueur > tolerance:
+            return 0.0
+
+    # Projection de q sur p : recouvrement des intervalles
+    t1 = ((q1[0] - p1[0]) * dx + (q1[1] - p1[1]) * dy) / longueur
+    t2 = ((q2[0] - p1[0]) * dx + (q2[1] - p1[1]) * dy) / longueur
+    debut, fin = max(0.0, min(t1, t2)), min(longueur, max(t1, t2))
+    return fin - debut if fin - debut > tolerance else 0.0
+
+
+def _point_sur_segment(point, a, b, tolerance):
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    longueur2 = dx * dx + dy * dy
+    if longueur2 == 0:
+        return math.hypot(point[0] - a[0], point[1] - a[1]) <= tolerance
+    t = max(0.0, min(1.0, ((point[0] - a[0]) * dx + (point[1] - a[1]) * dy) / longueur2))
+    return math.hypot(point[0] - (a[0] + t * dx), point[1] - (a[1] + t * dy)) <= tolerance
+
+
+def construire_graphe(entites, tolerance=TOLERANCE_METRIQUE, graphe=None, feedback=None):
+    """
+    Construit (ou complète) le graphe de contiguïté des entités.
+
+    entites : itérable de (fid, QgsGeometry)
+    tolerance : taille de la grille d'accrochage des sommets, en unités de la couche
+    feedback : QgsFeedback optionnel ; la progression repart de sa valeur actuelle
+    jusqu'à 100 si le nombre d'entités est connu. Si le traitement est annulé, le
+    graphe retourné est incomplet.
+
+    1. Hachage des segments (sommets accrochés à la grille) : un segment présent
+       dans deux parcelles est une frontière commune.
+    2. Hachage des sommets : un sommet commun sans segment commun est un contact
+       ponctuel (comme touches() de GEOS).
+    3. Segments restés seuls (jonctions en T, découpages différents d'une même
+       limite) : comparaison locale dans une grille spatiale.
+    4. Géométries non hachables (vides ou courbes) : géométrie préparée GEOS
+       contre les candidats de l'index spatial.
+    """
+    if graphe is None:
+        graphe = GrapheContiguite()
+
+    nombre = len(entites) if feedback is not None and hasattr(entites, "__len__") else 0
+    depart = feedback.progress() if feedback is not None else 0.0
+
+    def interrompre(n):
+        """True si annulé ; tous les TAILLE_BLOC éléments, progression du hachage."""
+        if feedback is None or n % TAILLE_BLOC:
+            return False
+        if nombre:
+            feedback.setProgress(depart + (100.0 - depart) * min(n / nombre, 1.0))
+        return feedback.isCanceled()
+
+    segments = {}
+    sommets = {}
+    geometries = {}
+    repli = []
+
+    for n, (fid, geom) in enumerate(entites, start=1):
+        if interrompre(n):
+            return graphe
+        graphe.ajouter_noeud(fid)
+        geometries[fid] = geom
+        if not _hachable(geom):
+            repli.append(fid)
+            continue
+
+        for anneau in anneaux(geom):
+            precedent = None
+            for point in anneau:
+                cle = (round(point.x() / tolerance), round(point.y() / tolerance))
+                sommets.setdefault(cle, set()).add(fid)
+                if precedent is not None and precedent != cle:
+                    segment = (precedent, cle) if precedent < cle else (cle, precedent)
+                    segments.setdefault(segment, set()).add(fid)
+                precedent = cle
+
+    # 1. Segments partagés
+    seuls = []
+    for (a, b), fids in segments.items():
+        if len(fids) > 1:
+            longueur = math.hypot(b[0] - a[0], b[1] - a[1]) * tolerance
+            fids = sorted(fids)
+            for i, fa in enumerate(fids):
+                for fb in fids[i + 1:]:
+                    graphe.voisins[fa][fb] = graphe.voisins[fa].get(fb, 0.0) + longueur
+                    graphe.voisins[fb][fa] = graphe.voisins[fa][fb]
+        else:
+            seuls.append(((a[0] * tolerance, a[1] * tolerance), (b[0] * tolerance, b[1] * tolerance), next(iter(fids))))
+
+    # 2. Sommets partagés (contact ponctuel)
+    for fids in sommets.values():
+        if len(fids) > 1:
+            fids = sorted(fids)
+            for i, fa in enumerate(fids):
+                for fb in fids[i + 1:]:
+                    if fb not in graphe.voisins[fa]:
+                        graphe.ajouter_arete(fa, fb, 0.0)
+
+    # 3. Segments non appariés : grille spatiale locale
+    if seuls:
+        longueurs = sorted(math.hypot(q[0] - p[0], q[1] - p[1]) for p, q, _ in seuls)
+        cellule = max(longueurs[len(longueurs) // 2], tolerance * 10)
+        grille = {}
+        for numero, (p, q, fid) in enumerate(seuls):
+            for cx in range(math.floor(min(p[0], q[0]) / cellule), math.floor(max(p[0], q[0]) / cellule) + 1):
+                for cy in range(math.floor(min(p[1], q[1]) / cellule), math.floor(max(p[1], q[1]) / cellule) + 1):
+                    grille.setdefault((cx, cy), []).append(numero)
+
+        deja_vus = set()
+        for n, numeros in enumerate(grille.values(), start=1):
+            if feedback is not None and n % TAILLE_BLOC == 0 and feedback.isCanceled():
+                return graphe
+            for i, n1 in enumerate(numeros):
+                p1, p2, f1 = seuls[n1]
+                for n2 in numeros[i + 1:]:
+                    q1, q2, f2 = seuls[n2]
+                    if f1 == f2 or (n1, n2) in deja_vus:
+                        continue
+                    deja_vus.add((n1, n2))
+                    recouvrement = _chevauchement_colineaire(p1, p2, q1, q2, tolerance)
+                    if recouvrement > 0:
+                        longueur = graphe.voisins[f1].get(f2, 0.0) + recouvrement
+                        graphe.voisins[f1][f2] = longueur
+                        graphe.voisins[f2][f1] = longueur
+                    elif f2 not in graphe.voisins[f1] and (
+                        any(_point_sur_segment(x, q1, q2, tolerance) for x in (p1, p2))
+                        or any(_point_sur_segment(x, p1, p2, tolerance) for x in (q1, q2))
+                    ):
+                        graphe.ajouter_arete(f1, f2, 0.0)
+
+    # 4. Repli GEOS pour les géométries non hachables
+    if repli:
+        index = QgsSpatialIndex()
+        for fid, geom in geometries.items():
+            if geom is not None and not geom.isEmpty():
+                index.addFeature(fid, geom.boundingBox())
+        for fid in repli:
+            if feedback is not None and feedback.isCanceled():
+                return graphe
+            geom = geometries[fid]
+            if geom is None or geom.isEmpty():
+                continue
+            moteur = QgsGeometry.createGeometryEngine(geom.constGet())
+            moteur.prepareGeometry()
+            for voisin in index.intersects(geom.boundingBox()):
+                if voisin == fid:
+                    continue
+                autre = geometries[voisin]
+                if moteur.touches(autre.constGet()):
+                    graphe.ajouter_arete(fid, voisin, geom.intersection(autre).length())
+
+    return graphe
+
+
+class Groupe:
+    """Groupe de parcelles contiguës avec ses totaux précalculés."""
+
+    def __init__(self, fids, contenance_totale, plus_grande):
+        self.fids = fids
+        self.contenance_totale = contenance_totale
+        self.plus_grande = plus_grande
+
+
+def grouper(graphe, fids, contenances):
+    """
+    Groupes de parcelles contiguës parmi `fids` (union-find sur les arêtes du graphe
+    dont les deux extrémités sont dans `fids`), triés par contenance totale décroissante.
+
+    contenances : dict fid -> contenance (None accepté)
+    """
+    fids = set(fids)
+    union = UnionFind(fids)
+    for fid in fids:
+        for voisin in graphe.voisins_de(fid):
+            if voisin in fids:
+                union.unir(fid, voisin)
+
+    groupes = []
+    for membres in union.composantes():
+        total = 0
+        plus_grande, contenance_max = membres[0], -1
+        for fid in membres:
+            contenance = contenances.get(fid)
+            contenance = contenance if isinstance(contenance, (int, float)) else 0
+            total += contenance
+            if contenance > contenance_max:
+                plus_grande, contenance_max = fid, contenance
+        groupes.append(Groupe(membres, total, plus_grande))
+
+    groupes.sort(key=lambda groupe: groupe.contenance_totale, reverse=True)
+    return groupes
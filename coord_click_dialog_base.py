@@ -854,6 +854,9 @@ class Ui_CoordClickDialogBase(object):
         self.checkTravExport = QtWidgets.QCheckBox(self.gridLayoutWidget_11)
         self.checkTravExport.setObjectName("checkTravExport")
         self.gridLayout_5.addWidget(self.checkTravExport, 1, 0, 1, 1)
+        self.checkDeltaExport = QtWidgets.QCheckBox(self.gridLayoutWidget_11)
+        self.checkDeltaExport.setObjectName("checkDeltaExport")
+        self.gridLayout_5.addWidget(self.checkDeltaExport, 6, 0, 1, 1)
         self.gridLayoutWidget_12 = QtWidgets.QWidget(self.Tab_10)
         self.gridLayoutWidget_12.setGeometry(QtCore.QRect(10, 70, 281, 171))
         self.gridLayoutWidget_12.setObjectName("gridLayoutWidget_12")
@@ -944,6 +947,10 @@ class Ui_CoordClickDialogBase(object):
         self.checkBoxConfig.setGeometry(QtCore.QRect(30, 520, 111, 16))
         self.checkBoxConfig.setStyleSheet("font: bold 12pt \"Garamond\"; color : red")
         self.checkBoxConfig.setObjectName("checkBoxConfig")
+        self.checkSaisieSelection = QtWidgets.QCheckBox(CoordClickDialogBase)
+        self.checkSaisieSelection.setGeometry(QtCore.QRect(420, 125, 131, 20))
+        self.checkSaisieSelection.setStyleSheet("font: bold 10pt \"Garamond\"; color : red")
+        self.checkSaisieSelection.setObjectName("checkSaisieSelection")
         self.lineLayerAct = QtWidgets.QLineEdit(CoordClickDialogBase)
         self.lineLayerAct.setGeometry(QtCore.QRect(180, 550, 231, 31))
         self.lineLayerAct.setStyleSheet("font: 75 italic 12pt \"Adobe Garamond Pro Bold\";color : #0055ff")
@@ -1173,6 +1180,8 @@ class Ui_CoordClickDialogBase(object):
         self.label_27.setText(_translate("CoordClickDialogBase", "Parcelles par :"))
         self.checkOpenExport.setText(_translate("CoordClickDialogBase", "Ouvrir après Export"))
         self.btnExport.setText(_translate("CoordClickDialogBase", "Export Excel"))
+        self.checkDeltaExport.setToolTip(_translate("CoordClickDialogBase", "N\'exporter que les parcelles ajoutées, modifiées ou supprimées depuis le dernier export"))
+        self.checkDeltaExport.setText(_translate("CoordClickDialogBase", "Depuis le dernier export"))
         self.checkTraitExport.setText(_translate("CoordClickDialogBase", "Traitements"))
         self.checkPrevExport.setText(_translate("CoordClickDialogBase", "Prévisions Travaux"))
         self.checkToutExport.setWhatsThis(_translate("CoordClickDialogBase", "<html><head/><body><p>Exportation vers Excel</p></body></html>"))
@@ -1197,6 +1206,8 @@ class Ui_CoordClickDialogBase(object):
         self.checkBoxPossession.setText(_translate("CoordClickDialogBase", "Propriétaire"))
         self.checkBoxConfig.setToolTip(_translate("CoordClickDialogBase", "<html><head/><body><p><span style=\" font-weight:400; color:#0000ff;\">Cette case permet d\'accéder aux données modifiables et à l\'onglet Analyse</span></p></body></html>"))
         self.checkBoxConfig.setText(_translate("CoordClickDialogBase", "Données"))
+        self.checkSaisieSelection.setToolTip(_translate("CoordClickDialogBase", "<html><head/><body><p>Appliquer les valeurs saisies à toutes les parcelles sélectionnées sur la couche</p></body></html>"))
+        self.checkSaisieSelection.setText(_translate("CoordClickDialogBase", "Toute la sélection"))
         self.lineLayerAct.setToolTip(_translate("CoordClickDialogBase", "<html><head/><body><p>Couche sélectionnée</p></body></html>"))
         self.label_28.setText(_translate("CoordClickDialogBase", "Nom de la couche :"))
         self.btnHelp.setToolTip(_translate("CoordClickDialogBase", "<html><head/><body><p>Accès à l\'Aide du plugin</p></body></html>"))
@@ -0,0 +1,134 @@
+# couleurs_parcelles.py
+# Couleurs des types de parcellaire (typeParc) lues dans le style de la couche :
+# table valeur -> couleur construite une fois par renderer, invalidée quand le
+# style change. Sert au cadre de couleur de la fenêtre principale et à
+# l'histogramme des types de l'onglet Analyses.
+
+import html
+
+from qgis.PyQt.QtCore import QObject, pyqtSignal
+
+from .constantes import TYPE_PARC_LIBELLES
+
+# Longueur de la barre d'un type occupant 100 % de la surface (histogramme)
+LONGUEUR_BARRE = 10
+
+# Tables de couleurs partagées, par identifiant de couche (voir couleurs_de_couche)
+_couleurs_couches = {}
+
+
+def couleur_symbole(symbol):
+    """Couleur de remplissage principale d'un symbole (premier calque qui en a une)."""
+    for i in range(symbol.symbolLayerCount()):
+        sym_layer = symbol.symbolLayer(i)
+        if hasattr(sym_layer, "fillColor"):
+            return sym_layer.fillColor().name()
+        if hasattr(sym_layer, "color"):
+            return sym_layer.color().name()
+    return symbol.color().name()
+
+
+def table_couleurs(renderer):
+    """
+    {str(valeur de catégorie): '#rrggbb'} d'un renderer catégorisé ; vide pour
+    les autres renderers. En cas de doublon, la première catégorie l'emporte.
+    """
+    table = {}
+    if renderer is None or renderer.type() != "categorizedSymbol":
+        return table
+    for cat in renderer.categories():
+        symbol = cat.symbol()
+        if symbol is not None:
+            table.setdefault(str(cat.value()), couleur_symbole(symbol))
+    return table
+
+
+class CouleursCouche(QObject):
+    """
+    Table des couleurs du style de la couche, reconstruite à la première
+    demande qui suit rendererChanged / styleChanged. `changees` est émis à
+    chaque changement de style.
+    """
+    changees = pyqtSignal()
+
+    def __init__(self, layer, parent=None):
+        super().__init__(parent)
+        self.layer = layer
+        self.table = None
+
+        self.layer.rendererChanged.connect(self.invalider)
+        self.layer.styleChanged.connect(self.invalider)
+
+    def deconnecter(self):
+        """Déconnecte les signaux de la couche."""
+        for signal in (self.layer.rendererChanged, self.layer.styleChanged):
+            try:
+                signal.disconnect(self.invalider)
+            except (TypeError, RuntimeError):
+                pass
+
+    def invalider(self):
+        self.table = None
+        self.changees.emit()
+
+    def couleur(self, type_parc):
+        """Couleur '#rrggbb' du type `type_parc` dans le style de la couche, ou None."""
+        if self.table is None:
+            self.table = table_couleurs(self.layer.renderer())
+        return self.table.get(str(type_parc))
+
+
+def couleurs_de_couche(layer):
+    """
+    CouleursCouche partagé de la couche, créé au premier appel et oublié quand la
+    couche est supprimée : la table n'est reconstruite qu'après un changement de style.
+    """
+    couleurs = _couleurs_couches.get(layer.id())
+    if couleurs is None or couleurs.layer is not layer:
+        couleurs = CouleursCouche(layer)
+        _couleurs_couches[layer.id()] = couleurs
+        layer.willBeDeleted.connect(lambda cle=layer.id(): _couleurs_couches.pop(cle, None))
+    return couleurs
+
+
+def parts_types(surfaces_par_type, total_surface_m2, top_n=5):
+    """
+    Parts (%) des `top_n` types les plus représentés, [(typeParc, pourcentage)]
+    par part décroissante, et part cumulée des autres types.
+    """
+    # Calcul des pourcentages et tri
+    pourcentages = {
+        type_parc: (surface / total_surface_m2) * 100
+        for type_parc, surface in surfaces_par_type.items()
+    }
+    sorted_types = sorted(pourcentages.items(), key=lambda x: x[1], reverse=True)
+
+    return sorted_types[:top_n], sum(p[1] for p in sorted_types[top_n:])
+
+
+def libelle_type(type_parc):
+    return TYPE_PARC_LIBELLES.get(type_parc, f"Type {type_parc}")
+
+
+def _ligne_histogramme(libelle, part, couleur):
+    barre = "█" * max(1, round(part * LONGUEUR_BARRE / 100))
+    return f'<span style="color:{couleur or "#808080"}">{barre}</span> {html.escape(libelle)} : {part:.1f} %'
+
+
+def html_repartition_types(surfaces_par_type, total_surface_m2, couleur=None, top_n=5):
+    """
+    Histogramme HTML de la répartition des surfaces par type (mêmes `top_n` types
+    et catégorie « Autres » que formater_repartition_types) : barre proportionnelle
+    à la part du type, dans la couleur couleur(typeParc) du style de la couche
+    (gris pour « Autres » et les types sans couleur).
+    """
+    if not total_surface_m2:
+        return "Aucune donnée disponible"
+    top_types, autres = parts_types(surfaces_par_type, total_surface_m2, top_n)
+    lignes = [
+        _ligne_histogramme(libelle_type(type_parc), part, couleur(type_parc) if couleur is not None else None)
+        for type_parc, part in top_types
+    ]
+    if autres > 0:
+        lignes.append(_ligne_histogramme("Autres", autres, None))
+    return "<br>".join(lignes)
@@ -0,0 +1,86 @@
+# edition_groupee.py
+# Saisie groupée : les valeurs d'un onglet de saisie (Tvx, Trait, Prev, Infos) sont
+# appliquées à toutes les parcelles sélectionnées sur la couche. Lecture en une
+# requête des valeurs actuelles, contrôle des taux d'essences, résumé avant/après
+# soumis à confirmation ; l'écriture passe par la session d'édition (un seul commit).
+
+from .acces_parcelles import CHAMPS_LIBELLE, libelle_parcelle, requete_attributs, texte_attribut
+from .session_edition import valeurs_egales
+
+CHAMPS_TAUX = [f"Tx{i}" for i in range(1, 5)]
+
+# Nombre de parcelles détaillées dans le résumé
+NB_DETAILS = 200
+
+# Entrée des listes de la saisie groupée qui laisse le champ tel quel sur chaque parcelle
+INCHANGE = "(inchangé)"
+
+
+def _entier(valeur):
+    try:
+        return int(valeur)
+    except (TypeError, ValueError):
+        return 0
+
+
+def lire_selection(layer, fids, champs):
+    """Entités `fids` (attributs `champs` + libellé, sans géométrie), en une seule requête."""
+    return layer.getFeatures(requete_attributs(layer, list(champs) + CHAMPS_LIBELLE + CHAMPS_TAUX, fids=fids))
+
+
+def modifications_groupe(layer, fids, valeurs):
+    """
+    Compare `valeurs` ({champ: valeur}) aux valeurs actuelles des parcelles `fids`.
+
+    Retourne (modifications, avant_apres, taux_invalides) :
+    modifications : {fid: {champ: valeur}} limité aux champs qui changent
+    avant_apres : {fid: (libellé, [(champ, avant, après), ...])}
+    taux_invalides : [(libellé, somme)] des parcelles dont les Tx dépasseraient 100 %
+    """
+    noms = set(layer.fields().names())
+    valeurs = {nom: valeur for nom, valeur in valeurs.items() if nom in noms}
+    modifications = {}
+    avant_apres = {}
+    taux_invalides = []
+
+    for feature in lire_selection(layer, fids, valeurs):
+        libelle = libelle_parcelle(feature)
+
+        # Taux après modification : valeurs saisies, sinon valeurs actuelles
+        total = sum(_entier(valeurs[nom] if nom in valeurs else feature[nom])
+                    for nom in CHAMPS_TAUX if nom in noms)
+        if total > 100:
+            taux_invalides.append((libelle, total))
+
+        changements = {nom: valeur for nom, valeur in valeurs.items() if not valeurs_egales(feature[nom], valeur)}
+        if changements:
+            modifications[feature.id()] = changements
+            avant_apres[feature.id()] = (libelle, [(nom, feature[nom], valeur) for nom, valeur in changements.items()])
+
+    return modifications, avant_apres, taux_invalides
+
+
+def resume_modifications(avant_apres, nb_selection):
+    """
+    Texte du résumé (nombre de parcelles modifiées par champ) et détail
+    avant/après par parcelle, pour la boîte de confirmation.
+    """
+    par_champ = {}
+    for _, changements in avant_apres.values():
+        for nom, _, apres in changements:
+            par_champ.setdefault(nom, set()).add(texte_attribut(apres))
+
+    lignes = [f"{len(avant_apres)} parcelle(s) modifiée(s) sur {nb_selection} sélectionnée(s) :"]
+    for nom, apres in par_champ.items():
+        nb = sum(1 for _, changements in avant_apres.values() if any(c[0] == nom for c in changements))
+        valeur = f"« {next(iter(apres))} »" if len(apres) == 1 else f"{len(apres)} valeurs"
+        lignes.append(f"- {nom} → {valeur} ({nb} parcelle(s))")
+
+    details = []
+    for libelle, changements in list(avant_apres.values())[:NB_DETAILS]:
+        modifs = ", ".join(f"{nom} : « {texte_attribut(avant)} » → « {texte_attribut(apres)} »" for nom, avant, apres in changements)
+        details.append(f"{libelle} : {modifs}")
+    if len(avant_apres) > NB_DETAILS:
+        details.append(f"... et {len(avant_apres) - NB_DETAILS} autre(s) parcelle(s)")
+
+    return "\n".join(lignes), "\n".join(details)
@@ -0,0 +1,392 @@
+# export_parcelles.py
+# Export des parcelles possédées : sélection des champs, lecture en flux commune à
+# tous les formats et registre des formats d'écriture (Excel, CSV, GeoPackage,
+# GeoParquet / Arrow si GDAL les fournit). L'export tourne dans une tâche QGIS,
+# avec progression et annulation, et peut se limiter aux parcelles changées depuis
+# le précédent (manifeste_export.py).
+
+import csv
+import os
+import sys
+
+from PyQt5.QtCore import QVariant, pyqtSignal
+from qgis.core import (
+    QgsCoordinateTransformContext,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsFeedback,
+    QgsField,
+    QgsFields,
+    QgsTask,
+    QgsVectorFileWriter,
+)
+
+from .constantes import TYPE_PARC_LIBELLES
+from .acces_parcelles import FILTRE_POSSEDEES, SourceParcelles, parcourir, requete_attributs
+from .manifeste_export import COLONNE_CHANGEMENT, SUPPRIMEE, SuiviExport, ecrire_manifeste
+
+# Dossier local contenant xlsxwriter (si le module n'est pas installé)
+XLSXWRITER_LIB = os.path.join(os.path.dirname(__file__), "xlsxwriter_lib")
+
+# Champs toujours exportés dans la sélection spécifique
+CHAMPS_EXPORT_GENERAUX = [
+    "section", "numero", "indice_parc","contenance", "SURFACE", "Nous",
+     "plant1", "plant2", "plant3", "plant4", "Tx1","Tx2","Tx3","Tx4",
+    "annee", "totalplants", "typeParc"
+]
+
+# Champs exclus systématiquement (jamais exportés)
+CHAMPS_EXPORT_EXCLUS = {"fid", "commune", "prefixe", "arpente", "possession", "created", "updated","nom_Voisin",
+                        "adresse_Voisin","mail_Voisin","tel_Voisin"}
+
+
+def champs_export(layer, tout=False, travaux=False, traitements=False, previsions=False):
+    """
+    Liste ordonnée des champs à exporter selon les cases cochées,
+    limitée aux champs présents dans la couche (Possession exclu).
+    """
+    # Récupérer la liste des champs disponibles dans la couche
+    available_fields = [field.name() for field in layer.fields()]
+
+    if tout:
+        # Exporter tous les champs sauf ceux exclus
+        export_fields = [f for f in available_fields if f.lower() not in CHAMPS_EXPORT_EXCLUS]
+
+    else:
+        export_fields = CHAMPS_EXPORT_GENERAUX.copy()
+
+        if travaux:
+            export_fields += [f"Tvx{i}" for i in range(1, 7)]
+            export_fields += [f"dateTvx{i}" for i in range(1, 7)]
+            export_fields += [f"remTvx{i}" for i in range(1, 7)]
+
+        if traitements:
+            export_fields += [f"Trait{i}" for i in range(1, 7)]
+            export_fields += [f"dateTrait{i}" for i in range(1, 7)]
+            export_fields += [f"remTrait{i}" for i in range(1, 7)]
+
+        if previsions:
+            export_fields += [f"Prev{i}" for i in range(1, 5)]
+            export_fields += [f"datePrev{i}" for i in range(1, 5)]
+            export_fields += [f"remPrev{i}" for i in range(1, 5)]
+
+    # Supprimer doublons, retirer Possession, vérifier existence
+    export_fields = list(dict.fromkeys(export_fields))  # garde l'ordre, supprime doublons
+    return [f for f in export_fields if f in available_fields and f != "Possession"]
+
+
+def valeur_export(field_name, value):
+    """Valeur telle qu'écrite dans l'export (chaîne nettoyée, libellé pour 'Nous')."""
+    if field_name == "Nous":
+        try:
+            key = int(value)
+            libelle = TYPE_PARC_LIBELLES.get(key, str(value))
+        except (ValueError, TypeError):
+            libelle = str(value)
+        libelle_str = str(libelle).strip()
+        return "" if libelle_str.upper() == "NULL" else libelle_str
+
+    value_str = str(value).strip() if value is not None else ""
+    return "" if value_str.upper() == "NULL" else value_str
+
+
+def lire_export(layer, champs, geometrie=False, feedback=None):
+    """
+    Flux des parcelles possédées à exporter : une seule lecture des seuls champs
+    utiles (filtre transmis au fournisseur de données), géométrie comprise
+    uniquement si le format l'écrit.
+    """
+    request = requete_attributs(layer, champs, expression=FILTRE_POSSEDEES)
+    if geometrie:
+        request.setFlags(QgsFeatureRequest.NoFlags)
+    return parcourir(layer, request, feedback)
+
+
+# Formats d'export disponibles, par clé : {"xlsx": EcrivainExcel, ...}
+ECRIVAINS = {}
+
+
+def enregistrer_ecrivain(classe):
+    """Décorateur : ajoute un format d'export au registre."""
+    ECRIVAINS[classe.format] = classe
+    return classe
+
+
+def ecrivains_disponibles():
+    """Formats utilisables dans cette installation, dans l'ordre d'enregistrement."""
+    return [classe for classe in ECRIVAINS.values() if classe.disponible()]
+
+
+class Ecrivain:
+    """
+    Format d'export : reçoit les parcelles une à une (ecrire) puis finalise le
+    fichier (fermer). abandonner() supprime un fichier incomplet.
+    changement : ajoute en tête la colonne du type de changement (export incrémental)
+    """
+    format = ""
+    libelle = ""
+    extension = ""
+    geometrie = False
+
+    @classmethod
+    def disponible(cls):
+        return True
+
+    @classmethod
+    def filtre(cls):
+        """Filtre de QFileDialog, par ex. « Classeur Excel (*.xlsx) »."""
+        return f"{cls.libelle} (*{cls.extension})"
+
+    def __init__(self, chemin, export_fields, layer, changement=False):
+        self.chemin = chemin
+        self.export_fields = export_fields
+        self.changement = changement
+        self.entetes = ([COLONNE_CHANGEMENT] if changement else []) + list(export_fields)
+        fields = layer.fields()
+        self.indices = [fields.indexFromName(nom) for nom in export_fields]
+        self.nombre = 0
+
+    def valeurs(self, feature):
+        attributs = feature.attributes()
+        return [valeur_export(nom, attributs[idx]) for nom, idx in zip(self.export_fields, self.indices)]
+
+    def ecrire(self, feature, valeurs, changement=None):
+        """valeurs : valeurs(feature), calculées une seule fois par parcelle"""
+        raise NotImplementedError
+
+    def fermer(self):
+        pass
+
+    def abandonner(self):
+        try:
+            self.fermer()
+        except Exception:
+            pass
+        if os.path.exists(self.chemin):
+            os.remove(self.chemin)
+
+
+@enregistrer_ecrivain
+class EcrivainExcel(Ecrivain):
+    """
+    Classeur xlsxwriter écrit en flux (mode constant_memory) : chaque ligne est
+    écrite sur disque aussitôt complète, la largeur des colonnes est calculée au
+    fil de l'écriture.
+    """
+    format = "xlsx"
+    libelle = "Classeur Excel"
+    extension = ".xlsx"
+
+    @classmethod
+    def disponible(cls):
+        # Ajouter le chemin vers dossier local xlsxwriter_lib
+        if XLSXWRITER_LIB not in sys.path:
+            sys.path.insert(0, XLSXWRITER_LIB)
+        try:
+            import xlsxwriter  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def __init__(self, chemin, export_fields, layer, changement=False):
+        super().__init__(chemin, export_fields, layer, changement)
+        import xlsxwriter
+
+        self.workbook = xlsxwriter.Workbook(chemin, {"constant_memory": True})
+        self.worksheet = self.workbook.add_worksheet()
+
+        # Écrire les en-têtes
+        self.worksheet.write_row(0, 0, self.entetes)
+        self.largeurs = [len(nom) for nom in self.entetes]
+
+    def ecrire(self, feature, valeurs, changement=None):
+        if self.changement:
+            valeurs = [changement or ""] + valeurs
+        self.nombre += 1
+        self.worksheet.write_row(self.nombre, 0, valeurs)
+        for col, valeur in enumerate(valeurs):
+            if len(valeur) > self.largeurs[col]:
+                self.largeurs[col] = len(valeur)
+
+    def fermer(self):
+        if self.workbook is None:
+            return
+        # Ajustement la largeur des colonnes, avec une marge de 1.2x la taille max
+        for col, largeur in enumerate(self.largeurs):
+            self.worksheet.set_column(col, col, largeur * 1.2)
+        self.workbook.close()
+        self.workbook = None
+
+
+@enregistrer_ecrivain
+class EcrivainCsv(Ecrivain):
+    """CSV séparé par des points-virgules, en UTF-8 avec BOM (ouverture directe dans Excel)."""
+    format = "csv"
+    libelle = "Fichier CSV"
+    extension = ".csv"
+
+    def __init__(self, chemin, export_fields, layer, changement=False):
+        super().__init__(chemin, export_fields, layer, changement)
+        self.fichier = open(chemin, "w", newline="", encoding="utf-8-sig")
+        self.writer = csv.writer(self.fichier, delimiter=";")
+        self.writer.writerow(self.entetes)
+
+    def ecrire(self, feature, valeurs, changement=None):
+        self.writer.writerow([changement or ""] + valeurs if self.changement else valeurs)
+        self.nombre += 1
+
+    def fermer(self):
+        if not self.fichier.closed:
+            self.fichier.close()
+
+
+def driver_ogr_disponible(nom):
+    """True si GDAL/OGR fournit le pilote vectoriel `nom` en écriture."""
+    return any(driver.driverName == nom for driver in QgsVectorFileWriter.ogrDriverList())
+
+
+class EcrivainOgr(Ecrivain):
+    """
+    Couche géographique écrite par QgsVectorFileWriter : géométrie et valeurs
+    d'origine (types conservés) des champs exportés.
+    """
+    driver = ""
+    geometrie = True
+
+    @classmethod
+    def disponible(cls):
+        return driver_ogr_disponible(cls.driver)
+
+    def __init__(self, chemin, export_fields, layer, changement=False):
+        super().__init__(chemin, export_fields, layer, changement)
+        self.fields = QgsFields()
+        if changement:
+            self.fields.append(QgsField(COLONNE_CHANGEMENT, QVariant.String))
+        for idx in self.indices:
+            self.fields.append(layer.fields().at(idx))
+
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = self.driver
+        options.layerName = "parcelles"
+        options.fileEncoding = "UTF-8"
+        self.writer = QgsVectorFileWriter.create(
+            chemin, self.fields, layer.wkbType(), layer.crs(), QgsCoordinateTransformContext(), options
+        )
+        if self.writer.hasError() != QgsVectorFileWriter.NoError:
+            raise IOError(self.writer.errorMessage())
+
+    def ecrire(self, feature, valeurs, changement=None):
+        attributs = feature.attributes()
+        sortie = QgsFeature(self.fields)
+        sortie.setGeometry(feature.geometry())
+        sortie.setAttributes(([changement] if self.changement else []) + [attributs[idx] for idx in self.indices])
+        if not self.writer.addFeature(sortie):
+            raise IOError(self.writer.errorMessage())
+        self.nombre += 1
+
+    def fermer(self):
+        # Le fichier est finalisé à la destruction du writer
+        self.writer = None
+
+
+@enregistrer_ecrivain
+class EcrivainGeoPackage(EcrivainOgr):
+    format = "gpkg"
+    libelle = "GeoPackage"
+    extension = ".gpkg"
+    driver = "GPKG"
+
+
+@enregistrer_ecrivain
+class EcrivainParquet(EcrivainOgr):
+    format = "parquet"
+    libelle = "GeoParquet"
+    extension = ".parquet"
+    driver = "Parquet"
+
+
+@enregistrer_ecrivain
+class EcrivainArrow(EcrivainOgr):
+    format = "arrow"
+    libelle = "Arrow IPC"
+    extension = ".arrow"
+    driver = "Arrow"
+
+
+def exporter(layer, export_fields, chemin, classe=EcrivainExcel, feedback=None, suivi=None, delta=False):
+    """
+    Écrit les parcelles possédées de la couche dans `chemin` au format `classe`,
+    en un seul parcours. Retourne le nombre de lignes écrites, ou None si
+    l'export a été annulé (le fichier incomplet est supprimé).
+
+    suivi : SuiviExport comparant chaque parcelle au manifeste du dernier export
+    delta : n'écrire que les parcelles ajoutées, modifiées ou supprimées depuis
+            (nécessite `suivi`), avec la colonne du type de changement
+    """
+    champs = list(export_fields) + (suivi.champs_lus() if suivi is not None else [])
+    ecrivain = classe(chemin, export_fields, layer, changement=delta)
+    try:
+        for feature in lire_export(layer, champs, classe.geometrie, feedback):
+            valeurs = ecrivain.valeurs(feature)
+            changement = suivi.changement(feature, valeurs) if suivi is not None else None
+            if delta and changement is None:
+                continue
+            ecrivain.ecrire(feature, valeurs, changement)
+        if feedback is not None and feedback.isCanceled():
+            ecrivain.abandonner()
+            return None
+        if delta:
+            for feature in suivi.supprimees():
+                ecrivain.ecrire(feature, ecrivain.valeurs(feature), SUPPRIMEE)
+        ecrivain.fermer()
+    except Exception:
+        ecrivain.abandonner()
+        raise
+    return ecrivain.nombre
+
+
+class ExportTask(QgsTask):
+    """
+    Tâche d'export. La couche est figée dans le constructeur (thread principal) ;
+    run() ne lit que la source thread-safe. Chaque export réussi remplace le
+    manifeste de la couche (référence du prochain export incrémental).
+    """
+    termine = pyqtSignal(str, int)
+    echec = pyqtSignal(str)
+
+    def __init__(self, layer, export_fields, chemin, classe, fichier_manifeste, precedent=None, delta=False):
+        super().__init__(f"Export des parcelles : {os.path.basename(chemin)}", QgsTask.CanCancel)
+        self.source = SourceParcelles(layer)
+        self.export_fields = export_fields
+        self.chemin = chemin
+        self.classe = classe
+        self.fichier_manifeste = fichier_manifeste
+        self.suivi = SuiviExport(layer, export_fields, precedent)
+        self.delta = delta
+        self.feedback = QgsFeedback()
+        self.feedback.progressChanged.connect(self.setProgress)
+        self.nombre = None
+        self.erreur = None
+
+    def cancel(self):
+        self.feedback.cancel()
+        super().cancel()
+
+    def run(self):
+        try:
+            self.nombre = exporter(self.source, self.export_fields, self.chemin, self.classe,
+                                   self.feedback, self.suivi, self.delta)
+        except Exception as e:
+            self.erreur = str(e)
+            return False
+        if self.nombre is None or self.isCanceled():
+            return False
+        ecrire_manifeste(self.fichier_manifeste, self.suivi.manifeste())
+        return True
+
+    def finished(self, result):
+        # Appelé dans le thread principal une fois run() terminé
+        if result:
+            self.termine.emit(self.chemin, self.nombre)
+        elif self.erreur is not None:
+            self.echec.emit(self.erreur)
@@ -13,18 +13,22 @@ from qgis.PyQt.QtGui import QCursor,QPixmap
 import os
 
 from .infos_polygon import InfosPolygonManager
+from .utils import log_debug, log_warning
 from .create_polygon_dialog import Ui_createPolygonDialog
 from qgis.PyQt.QtWidgets import QDialog
 
 class FillRingTool(QgsMapToolEdit, QObject):
     ring_created = pyqtSignal(QgsGeometry)  # Signal émis à la fin du dessin, avec la géométrie du trou
 
-    def __init__(self, canvas, layer, callback=None):
+    def __init__(self, canvas, layer, localisation, callback=None):
         super().__init__(canvas)  # Appelle le constructeur de QgsMapToolEdit avec canvas
         self.canvas = canvas
         self.layer = layer
         self.callback = callback
 
+        # Fonction couche -> service de localisation (index spatial) partagé avec la fenêtre principale
+        self.localisation = localisation
+
         self.points = []
         self.rubber_band = QgsRubberBand(self.canvas, QgsWkbTypes.PolygonGeometry)
         self.rubber_band.setColor(Qt.red)
@@ -45,7 +49,7 @@ class FillRingTool(QgsMapToolEdit, QObject):
             cursor = QCursor(pixmap, 16, 16)  # (hotspot_x, hotspot_y)
             self.canvas.setCursor(cursor)
         else:
-            print("❌ Curseur personnalisé non trouvé :", cursor_path)
+            log_warning(f"❌ Curseur personnalisé non trouvé : {cursor_path}")
 
     def deactivate(self):
         super().deactivate()
@@ -91,29 +95,25 @@ class FillRingTool(QgsMapToolEdit, QObject):
         self.rubber_band.closePoints()
         ring_geom = QgsGeometry.fromPolygonXY([self.points])
 
-        # Trouver la parcelle mère
-        parent_feature = None
-        for f in self.layer.getFeatures():
-            if f.geometry().contains(ring_geom.centroid().asPoint()):
-                parent_feature = f
-                break
+        # Trouver la parcelle mère (index spatial + géométries préparées)
+        parent_fid = self.localisation(self.layer).parcelle_mere(ring_geom)
+        parent_feature = self.layer.getFeature(parent_fid) if parent_fid is not None else None
 
-        if not parent_feature:
+        if not parent_feature or not parent_feature.isValid():
 
             self.cancel()
             return
 
         parent_geom = parent_feature.geometry()
 
-        print("Type géométrie mère:", parent_geom.type())  # 2 = polygone
-        print("Type géométrie mère WKB:", parent_geom.wkbType())
-        print("Est multipolygone ? :", parent_geom.isMultipart())
+        log_debug(f"Géométrie mère : type {parent_geom.type()}, WKB {parent_geom.wkbType()}, "
+                  f"multipolygone {parent_geom.isMultipart()}")
 
         if parent_geom.isMultipart():
             # Cas multipolygone : on modifie le premier polygone trouvé contenant le point
             multi_poly = parent_geom.asMultiPolygon()
             if not multi_poly:
-                print("❌ Géométrie multipolygone invalide.")
+                log_warning("❌ Géométrie multipolygone invalide.")
                 self.cancel()
                 return
 
@@ -129,7 +129,7 @@ class FillRingTool(QgsMapToolEdit, QObject):
                     break
 
             if poly_index is None:
-                print("❌ Aucun polygone dans le multipolygone ne contient le trou.")
+                log_warning("❌ Aucun polygone dans le multipolygone ne contient le trou.")
                 self.cancel()
                 return
 
@@ -141,7 +141,7 @@ class FillRingTool(QgsMapToolEdit, QObject):
         else:
             # Cas polygone simple
             if not parent_geom.addRing(self.points):
-                print("❌ Échec de l'ajout du trou à la géométrie simple.")
+                log_warning("❌ Échec de l'ajout du trou à la géométrie simple.")
                 self.cancel()
                 return
             new_geom = parent_geom
@@ -149,13 +149,13 @@ class FillRingTool(QgsMapToolEdit, QObject):
         if not self.layer.isEditable():
             self.layer.startEditing()
 
-        print(f"ℹ️ Mise à jour géométrie mère, feature id {parent_feature.id()}")
+        log_debug(f"ℹ️ Mise à jour géométrie mère, feature id {parent_feature.id()}")
         res = self.layer.changeGeometry(parent_feature.id(), new_geom)
 
         if res:
-            print("✅ Géométrie mère mise à jour dans la couche (changeGeometry réussi)")
+            log_debug("✅ Géométrie mère mise à jour dans la couche (changeGeometry réussi)")
         else:
-            print("❌ Échec de la mise à jour géométrie mère dans la couche")
+            log_warning("❌ Échec de la mise à jour géométrie mère dans la couche")
             self.cancel()
             return
 
@@ -163,12 +163,12 @@ class FillRingTool(QgsMapToolEdit, QObject):
         self.layer.triggerRepaint()
 
         if self.layer.isEditable():
-            print("ℹ️ Commit des modifications")
+            log_debug("ℹ️ Commit des modifications")
             success_commit = self.layer.commitChanges()
             if success_commit:
-                print("✅ Commit réussi")
+                log_debug("✅ Commit réussi")
             else:
-                print("❌ Échec du commit")
+                log_warning("❌ Échec du commit")
 
         # Ajouter entité trou
         new_feat = QgsFeature(self.layer.fields())
@@ -176,14 +176,17 @@ class FillRingTool(QgsMapToolEdit, QObject):
         success, added_features = self.layer.dataProvider().addFeatures([new_feat])
 
         if not success or not added_features:
-            print("❌ Échec de l'ajout de l'entité trou.")
+            log_warning("❌ Échec de l'ajout de l'entité trou.")
             self.cancel()
             return
         else:
-            print("✅ Entité trou ajoutée à la couche")
+            log_debug("✅ Entité trou ajoutée à la couche")
 
         fid = added_features[0].id()
-        print(f"ℹ️ Fid de l'entité trou créée : {fid}")
+        log_debug(f"ℹ️ Fid de l'entité trou créée : {fid}")
+
+        # Ajout direct dans le fournisseur : l'index spatial est complété à la main
+        self.localisation(self.layer).ajouter_parcelle(fid, ring_geom)
 
         inserted_feature = next(self.layer.getFeatures(QgsFeatureRequest(fid)))
 
@@ -196,10 +199,11 @@ class FillRingTool(QgsMapToolEdit, QObject):
         ui = Ui_createPolygonDialog()
         ui.setupUi(dialog)
 
-        manager = InfosPolygonManager(ui,dialog)
-        manager.open_dialog_from_geometry(inserted_feature.geometry(), self.layer, fid)
+        manager = InfosPolygonManager(ui, dialog, localisation=self.localisation)
+        # La parcelle mère est déjà connue : la fenêtre ne la recherche pas à nouveau
+        manager.open_dialog_from_geometry(inserted_feature.geometry(), self.layer, fid, parent_feature)
 
-        print("💬 Ouverture du formulaire avec fid :", fid)
+        log_debug(f"💬 Ouverture du formulaire avec fid : {fid}")
         dialog.exec_()
 
         # Nettoyage
@@ -207,7 +211,7 @@ class FillRingTool(QgsMapToolEdit, QObject):
         self.rubber_band.reset(QgsWkbTypes.PolygonGeometry)
 
     def cancel(self):
-        print("⛔ Annulation du dessin (Esc)")
+        log_debug("⛔ Annulation du dessin (Esc)")
         self.points = []
         self.rubber_band.reset(QgsWkbTypes.PolygonGeometry)
         self.canvas.refresh()  # Facultatif mais utile pour forcer le rafraîchissement
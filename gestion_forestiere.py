@@ -38,18 +38,15 @@ from qgis.PyQt.QtCore import (
     QDate,
     QTimer,
     QUrl,
-    QThread,
 )
 from qgis.PyQt.QtGui import QIcon, QDesktopServices
 from qgis.PyQt.QtWidgets import QAction,QTableWidgetItem
 from qgis.gui import QgsMapToolEmitPoint
 from qgis.core import (
+    QgsApplication,
     QgsProject,
     QgsVectorLayer,
     QgsFeature,
-    QgsGeometry,
-    QgsPointXY,
-    QgsFeatureRequest,
     edit,
     QgsMessageLog,
     Qgis,
@@ -69,29 +66,26 @@ from PyQt5.QtWidgets import (
     QTableWidgetItem,
     QHeaderView,
     QDialog,
+    QInputDialog,
 )
 from PyQt5.QtGui import QFont, QColor
 from .coord_click_dialog import CoordClickDialog  # ta fenêtre principale (hérite de QDialog + setupUi)
 from .create_polygon_dialog_wrapper import CreatePolygonDialog
 from datetime import datetime
-from itertools import batched
 # Importations des données de la table des données depuis fichier utils
 from .utils import (
     safe_set_text,
-    extract_table_values,
-    unique_values_per_column,
     log_debug,
     log_warning,
     log_error,
     show_success_bar,
-    format_date,
     get_valid_active_layer,
     get_valid_active_layer_start,
     show_error_bar,
+    show_warning_bar,
     safe_str,
     load_table_from_csv,
     save_table_to_csv,
-    get_fill_color_from_layer,
 )
 
 # importations fichier analyses.py
@@ -112,9 +106,22 @@ from .constantes import (
     TYPE_PARC_LIBELLES,
     SAISIE_COMBO_COUNTS,
     SAISIE_COMBO_SETTINGS,
+    VOCABULAIRES_TERRAIN_ACCES,
 )
 
-from .analyse_worker import AnalyseWorker
+from .analyse_worker import AnalyseTask
+from .statistiques_incrementales import SuiviStatistiques
+from .cache_analyses import CacheAnalyses
+from .acces_parcelles import lire_parcelle
+from .session_edition import SessionEdition, valeur_vide
+from .localisation_parcelles import LocalisationParcelles
+from .vue_parcelle import CacheVues
+from .surfaces import COUCHE_EN_EDITION, SurfaceTask, SuiviSurfaces
+from .subdivision import subdiviser
+from .topologie import SURFACE_TOLEREE_M2, NavigationErreurs, TopologieTask
+from .couleurs_parcelles import CouleursCouche, html_repartition_types, table_couleurs
+from .vocabulaires import Vocabulaires
+from .edition_groupee import INCHANGE, modifications_groupe, resume_modifications
 
 # importations fichier config.py
 from .param import ConfigDialog
@@ -174,8 +181,10 @@ class CoordClick:
         # Définir le chemin vers le fichier CSV
         self.csv_path = os.path.join(os.path.dirname(__file__), "table_data.csv")
 
-        # Mise à jour des combos à chaque modification de la table
-        self.dlg.tableWidgetData.itemChanged.connect(self.refresh_combos_from_table)
+        # Vocabulaires partagés des combos, mis à jour à chaque modification de la table
+        self.vocabulaires = Vocabulaires()
+        self.lier_combos_vocabulaires()
+        self.dlg.tableWidgetData.itemChanged.connect(self.vocabulaires.on_item_changed)
 
         # Connexion des combos
         self.connect_saisie_combos()
@@ -191,10 +200,40 @@ class CoordClick:
         self.dlg.lineMail.setReadOnly(True)
         self.dlg.lineTel.setReadOnly(True)
 
-        # initialise les variables pour analyse_worker
+        # initialise les variables pour la tâche d'analyse
         self.analyse_results = None
-        self.analyse_thread = None
-        self.analyse_worker = None
+        self.analyse_task = None
+        self.analyse_a_relancer = False
+        self.suivi_statistiques = None
+        self.cache_analyses = CacheAnalyses()
+
+        # tâche d'export en cours (une seule à la fois)
+        self.export_task = None
+
+        # tâche de recalcul des surfaces en cours
+        self.surface_task = None
+
+        # surfaces des parcelles redessinées recalculées à chaque enregistrement
+        self.suivi_surfaces = None
+
+        # contrôle topologique en cours, et couche d'erreurs rendue cliquable
+        self.topologie_task = None
+        self.navigation_erreurs = None
+
+        # index spatial de la couche pour retrouver la parcelle cliquée
+        self.localisation = None
+
+        # vues des parcelles affichées (textes, libellé, couleur), en cache LRU
+        self.vues = None
+
+        # couleurs des types de parcellaire lues dans le style de la couche
+        self.couleurs = None
+
+        # modifications de saisie en tampon, enregistrées en une seule transaction
+        self.session_edition = SessionEdition()
+        self.session_edition.enregistree.connect(self.on_session_enregistree)
+        self.session_edition.echec.connect(self.on_session_echec)
+        self.session_edition.conflits.connect(self.on_session_conflits)
 
         # Mettre les titres de colonnes en gras
         header = self.dlg.tableWidgetData.horizontalHeader()
@@ -232,7 +271,8 @@ class CoordClick:
 
 
         # Connecte ma fenêtre pour saisie des infos
-        self.infos_polygon_manager = InfosPolygonManager(self.ui_create_polygon, self.create_polygon_dialog)
+        self.infos_polygon_manager = InfosPolygonManager(self.ui_create_polygon, self.create_polygon_dialog,
+                                                         self.localisation_couche)
 
 
         # Initialisation de la case à cocher et bouton enregistrer
@@ -361,8 +401,24 @@ class CoordClick:
         self.iface.addPluginToMenu(self.tr('Gestion parcelles forestières'), self.action_helpgen)
         self.iface.addToolBarIcon(self.action_helpgen)
 
+        # Action menu - Recalcul des surfaces depuis la géométrie
+        self.action_surfaces = QAction(self.tr('Recalculer les surfaces'), self.iface.mainWindow())
+        self.action_surfaces.triggered.connect(self.recalculer_surfaces)
+        self.iface.addPluginToMenu(self.tr('Gestion parcelles forestières'), self.action_surfaces)
+
+        # Action menu - Subdivision des parcelles par une couche de découpe
+        self.action_subdivision = QAction(self.tr('Subdiviser les parcelles'), self.iface.mainWindow())
+        self.action_subdivision.triggered.connect(self.subdiviser_parcelles)
+        self.iface.addPluginToMenu(self.tr('Gestion parcelles forestières'), self.action_subdivision)
+
+        # Action menu - Contrôle topologique (chevauchements, trous, géométries invalides)
+        self.action_topologie = QAction(self.tr('Vérifier la topologie'), self.iface.mainWindow())
+        self.action_topologie.triggered.connect(self.verifier_topologie)
+        self.iface.addPluginToMenu(self.tr('Gestion parcelles forestières'), self.action_topologie)
+
         # Liste des actions pour suppression dans unload()
-        self.actions = [self.action_main, self.action_config, self.action_helpgen]
+        self.actions = [self.action_main, self.action_config, self.action_helpgen, self.action_surfaces,
+                        self.action_subdivision, self.action_topologie]
 
         layer = self.iface.activeLayer()
         if isinstance(layer, QgsVectorLayer) and layer.geometryType() == QgsWkbTypes.PolygonGeometry:
@@ -383,6 +439,26 @@ class CoordClick:
 
     def unload(self):
         """Removes the plugin menu item and icon from QGIS GUI."""
+        # Enregistre les saisies encore en tampon
+        self.session_edition.enregistrer()
+
+        if self.localisation is not None:
+            self.localisation.deconnecter()
+            self.localisation = None
+        if self.vues is not None:
+            self.vues.deconnecter()
+            self.vues = None
+        if self.couleurs is not None:
+            self.couleurs.deconnecter()
+            self.couleurs = None
+        if self.suivi_surfaces is not None:
+            self.suivi_surfaces.deconnecter()
+            self.suivi_surfaces = None
+        if self.navigation_erreurs is not None:
+            self.navigation_erreurs.deconnecter()
+            self.navigation_erreurs = None
+        self.vocabulaires.deconnecter()
+
         for action in self.actions:
             self.iface.removePluginMenu(
                 self.tr(u'Gestion parcelles forestières'),
@@ -410,6 +486,18 @@ class CoordClick:
 
         self.layer = layer  # Enregistre la couche si valide
 
+        # Préparation de l'index spatial (tâche de fond) pour les clics sur la carte
+        self.localisation_couche(layer)
+
+        # Vocabulaires des combos complétés par les valeurs déjà saisies dans la couche
+        self.vocabulaires.charger_couche(layer)
+
+        # contenance / SURFACE suivent les modifications de géométrie de la couche
+        if self.suivi_surfaces is None or self.suivi_surfaces.layer is not layer:
+            if self.suivi_surfaces is not None:
+                self.suivi_surfaces.deconnecter()
+            self.suivi_surfaces = SuiviSurfaces(layer)
+
 
         # Met à jour le nom de la couche dans l'interface
         self.dlg.lineLayerAct.setText(self.layer.name())  #new
@@ -432,8 +520,11 @@ class CoordClick:
         # Connexion du bouton About
             self.dlg.toolButtonAbout.clicked.connect(self.show_about)
 
-            # Charger les données CSV dans la table au démarrage
+            # Charger les données CSV dans la table au démarrage (vocabulaires construits une fois à la fin)
+            self.dlg.tableWidgetData.blockSignals(True)
             load_table_from_csv(self.dlg.tableWidgetData, self.csv_path)
+            self.dlg.tableWidgetData.blockSignals(False)
+            self.vocabulaires.charger(self.dlg.tableWidgetData)
 
 
 
@@ -449,10 +540,6 @@ class CoordClick:
             #Bouton de sauvegarde des données
             self.dlg.btnSaveData.clicked.connect(self.save_table_data)
 
-            # Ensuite remplir tous les combos de saisie d'un coup
-            for prefix, combo_base_name, column_index in SAISIE_COMBO_SETTINGS:
-                self.populate_saisie_combos(prefix, combo_base_name, column_index)
-
 
             # Connecte la checkbox à la méthode de gestion des champs
             self.dlg.checkEditProp.stateChanged.connect(self.toggle_edit_mode)
@@ -464,6 +551,9 @@ class CoordClick:
             # Connexion du bouton d'enregistrement de l'onglet Saisie
             self.connect_enregistrement_boutons()
 
+            # Saisie groupée : widgets vidés à l'activation (seules les valeurs saisies sont appliquées)
+            self.dlg.checkSaisieSelection.toggled.connect(self.on_saisie_groupee_toggled)
+
             # Connecte le signal pour cliquer sur la carte
             self.point_tool.canvasClicked.connect(self.display_point)
 
@@ -510,22 +600,213 @@ class CoordClick:
         self.config_dialog.exec_()
 
     def start_analyse_worker(self):
+        # Une analyse est déjà en cours : elle sera relancée une seule fois à sa fin
+        if self.analyse_task is not None:
+            self.analyse_a_relancer = True
+            return
+
         self.analyse_results = None  # on remet à zéro les résultats
-        self.analyse_thread = QThread()
-        self.analyse_worker = AnalyseWorker(self.layer)
-        self.analyse_worker.moveToThread(self.analyse_thread)
 
-        self.analyse_thread.started.connect(self.analyse_worker.run)
-        self.analyse_worker.finished.connect(self.on_analyse_finished)
-        self.analyse_worker.finished.connect(self.analyse_thread.quit)
-        self.analyse_worker.finished.connect(self.analyse_worker.deleteLater)
-        self.analyse_thread.finished.connect(self.analyse_thread.deleteLater)
+        # Couche inchangée depuis le dernier calcul : résultats relus dans le cache
+        en_cache = self.cache_analyses.lire_analyses(self.layer)
+        if en_cache is not None:
+            results, stock = en_cache
+            self.analyse_results = results
+            self.data_analyse()
+            self.demarrer_suivi_statistiques(stock, results.get("regroupement", ""))
+            return
+
+        # La tâche lit une copie figée de la couche : une modification pendant le calcul
+        # déclenche un nouveau calcul à la fin de celui-ci
+        self.analyse_a_relancer = False
+        self.analyse_task = AnalyseTask(self.layer)
+        self.analyse_task.termine.connect(self.on_analyse_finished)
+        self.analyse_task.taskCompleted.connect(self.on_analyse_task_ended)
+        self.analyse_task.taskTerminated.connect(self.on_analyse_task_ended)
+        self.layer.layerModified.connect(self.on_layer_modified_during_analyse)
+        QgsApplication.taskManager().addTask(self.analyse_task)
 
-        self.analyse_thread.start()
+    def on_layer_modified_during_analyse(self):
+        self.analyse_a_relancer = True
 
     def on_analyse_finished(self, results):
+        if self.analyse_a_relancer:
+            return  # résultats déjà périmés, le calcul relancé les remplacera
+
+        stock = self.analyse_task.stock
         self.analyse_results = results
         self.data_analyse()  # mettre à jour l'interface avec les résultats
+        self.cache_analyses.ecrire_analyses(self.layer, results, stock)
+
+        # Les modifications suivantes de la couche mettent à jour les statistiques sans tout recalculer
+        self.demarrer_suivi_statistiques(stock, results.get("regroupement", ""))
+
+    def on_analyse_task_ended(self):
+        try:
+            self.layer.layerModified.disconnect(self.on_layer_modified_during_analyse)
+        except (TypeError, RuntimeError):
+            pass
+        self.analyse_task = None
+        if self.analyse_a_relancer:
+            self.start_analyse_worker()
+
+    def demarrer_suivi_statistiques(self, stock, regroupement):
+        if self.suivi_statistiques is not None:
+            self.suivi_statistiques.deconnecter()
+            self.suivi_statistiques = None
+        if stock is None:
+            return
+        self.suivi_statistiques = SuiviStatistiques(self.layer, stock, regroupement)
+        self.suivi_statistiques.modifie.connect(self.on_statistiques_modifiees)
+
+    def on_statistiques_modifiees(self, results):
+        self.analyse_results = results
+        self.data_analyse()
+
+    # Retours de la session d'édition (enregistrement différé des saisies)
+    def on_session_enregistree(self, nombre):
+        show_success_bar(self.iface, "✅ CoordClick", f"Saisies enregistrées ({nombre} parcelle(s))")
+
+    def on_session_echec(self, erreur):
+        QMessageBox.critical(self.dlg, "Erreur", f"Échec de l'enregistrement des modifications :\n{erreur}")
+
+    def on_session_conflits(self, conflits):
+        lignes = [f"- parcelle {fid}, {champ} : « {saisie} » non enregistré, valeur actuelle « {actuelle} »"
+                  for fid, champ, actuelle, saisie in conflits]
+        QMessageBox.warning(self.dlg, "Conflit de modification",
+                            "Ces champs ont été modifiés entre-temps par ailleurs :\n" + "\n".join(lignes))
+
+    # Recalcul de contenance / SURFACE depuis la géométrie (menu du plugin)
+    def recalculer_surfaces(self):
+        layer = self.iface.activeLayer()
+        if not isinstance(layer, QgsVectorLayer) or layer.geometryType() != QgsWkbTypes.PolygonGeometry:
+            QMessageBox.warning(self.iface.mainWindow(), "Couche non valide",
+                                "Sélectionnez la couche des parcelles (polygones).")
+            return
+
+        if self.surface_task is not None:
+            QMessageBox.information(self.iface.mainWindow(), "Surfaces",
+                                    "Un recalcul des surfaces est déjà en cours.")
+            return
+
+        reponse = QMessageBox.question(
+            self.iface.mainWindow(), "Recalculer les surfaces",
+            "Recalculer contenance (m²) et SURFACE (ares) de toutes les parcelles\n"
+            "à partir de leur géométrie ?",
+            QMessageBox.Yes | QMessageBox.No)
+        if reponse != QMessageBox.Yes:
+            return
+
+        # Les saisies en attente partent avant : l'écriture des surfaces fait un commit
+        self.session_edition.enregistrer()
+        if layer.isEditable():
+            QMessageBox.warning(self.iface.mainWindow(), "Surfaces", COUCHE_EN_EDITION)
+            return
+
+        self.surface_task = SurfaceTask(layer)
+        self.surface_task.termine.connect(
+            lambda nombre: show_success_bar(self.iface, "✅ Surfaces", f"Surfaces mises à jour ({nombre} parcelle(s))"))
+        self.surface_task.echec.connect(
+            lambda erreur: show_error_bar(self.iface, "Surfaces", f"Échec du recalcul des surfaces : {erreur}"))
+        self.surface_task.taskCompleted.connect(self.on_surface_task_fin)
+        self.surface_task.taskTerminated.connect(self.on_surface_task_fin)
+        QgsApplication.taskManager().addTask(self.surface_task)
+
+    def on_surface_task_fin(self):
+        self.surface_task = None
+
+    # Subdivision de la sélection (ou de la parcelle affichée) par une couche de lignes ou de polygones
+    def subdiviser_parcelles(self):
+        layer = self.iface.activeLayer()
+        if not isinstance(layer, QgsVectorLayer) or layer.geometryType() != QgsWkbTypes.PolygonGeometry:
+            QMessageBox.warning(self.iface.mainWindow(), "Couche non valide",
+                                "Sélectionnez la couche des parcelles (polygones).")
+            return
+
+        fids = layer.selectedFeatureIds()
+        if not fids and layer is self.layer and self.current_feature_id is not None:
+            fids = [self.current_feature_id]
+        if not fids:
+            QMessageBox.warning(self.iface.mainWindow(), "Subdivision",
+                                "Sélectionnez les parcelles à subdiviser.")
+            return
+
+        couches = [couche for couche in QgsProject.instance().mapLayers().values()
+                   if isinstance(couche, QgsVectorLayer) and couche is not layer
+                   and couche.geometryType() in (QgsWkbTypes.LineGeometry, QgsWkbTypes.PolygonGeometry)]
+        if not couches:
+            QMessageBox.warning(self.iface.mainWindow(), "Subdivision",
+                                "Aucune couche de lignes ou de polygones pour la découpe dans le projet.")
+            return
+
+        noms = [couche.name() for couche in couches]
+        nom, ok = QInputDialog.getItem(
+            self.iface.mainWindow(), "Subdiviser les parcelles",
+            f"Couche de découpe pour {len(fids)} parcelle(s) :", noms, 0, False)
+        if not ok:
+            return
+        couche_coupe = couches[noms.index(nom)]
+
+        # Les saisies en attente partent avant : la subdivision fait un commit
+        self.session_edition.enregistrer()
+        if layer.isEditable():
+            QMessageBox.warning(self.iface.mainWindow(), "Subdivision", COUCHE_EN_EDITION)
+            return
+
+        resultats, erreur = subdiviser(layer, fids, couche_coupe)
+        if erreur is not None:
+            show_error_bar(self.iface, "Subdivision", f"Échec de la subdivision : {erreur}")
+            return
+        if not resultats:
+            QMessageBox.information(self.iface.mainWindow(), "Subdivision",
+                                    "Aucune parcelle sélectionnée n'est traversée par la découpe.")
+            return
+        layer.triggerRepaint()
+        details = ", ".join(f"{libelle} → {' '.join(indices)}" for libelle, indices in resultats)
+        show_success_bar(self.iface, "✅ Subdivision", f"{len(resultats)} parcelle(s) subdivisée(s) : {details}")
+
+    # Contrôle topologique de la couche des parcelles (tâche de fond)
+    def verifier_topologie(self):
+        layer = self.iface.activeLayer()
+        if not isinstance(layer, QgsVectorLayer) or layer.geometryType() != QgsWkbTypes.PolygonGeometry:
+            QMessageBox.warning(self.iface.mainWindow(), "Couche non valide",
+                                "Sélectionnez la couche des parcelles (polygones).")
+            return
+
+        if self.topologie_task is not None:
+            QMessageBox.information(self.iface.mainWindow(), "Topologie",
+                                    "Un contrôle de la topologie est déjà en cours.")
+            return
+
+        surface, ok = QInputDialog.getDouble(
+            self.iface.mainWindow(), "Vérifier la topologie",
+            "Surface maximale des trous et éclats signalés (m²) :",
+            SURFACE_TOLEREE_M2, 0, 1000000, 2)
+        if not ok:
+            return
+
+        self.topologie_task = TopologieTask(layer, surface)
+        self.topologie_task.termine.connect(lambda couche: self.on_topologie_terminee(layer, couche))
+        self.topologie_task.echec.connect(
+            lambda erreur: show_error_bar(self.iface, "Topologie", f"Échec du contrôle de la topologie : {erreur}"))
+        self.topologie_task.taskCompleted.connect(self.on_topologie_task_fin)
+        self.topologie_task.taskTerminated.connect(self.on_topologie_task_fin)
+        QgsApplication.taskManager().addTask(self.topologie_task)
+
+    def on_topologie_terminee(self, layer, couche):
+        nombre = couche.featureCount()
+        if nombre == 0:
+            show_success_bar(self.iface, "✅ Topologie", f"Aucune erreur topologique dans {layer.name()}")
+            return
+        QgsProject.instance().addMapLayer(couche)
+        if self.navigation_erreurs is not None:
+            self.navigation_erreurs.deconnecter()
+        self.navigation_erreurs = NavigationErreurs(couche, layer, self.canvas)
+        show_warning_bar(self.iface, "Topologie",
+                         f"{nombre} erreur(s) topologique(s) : sélectionnez-en une dans « {couche.name()} » pour la localiser")
+
+    def on_topologie_task_fin(self):
+        self.topologie_task = None
 
     def init_ring_fill_button(self):
         button = self.dlg.btnRingFill
@@ -541,7 +822,7 @@ class CoordClick:
 
         # Récupère la couche active et instancie l'outil Fill Ring
         layer = self.iface.activeLayer()
-        self.fill_ring_tool = FillRingTool(self.canvas, layer, self.on_fill_ring_completed)
+        self.fill_ring_tool = FillRingTool(self.canvas, layer, self.localisation_couche, self.on_fill_ring_completed)
 
         # Connecter le bouton à l'activation de l'outil
         button.clicked.connect(self.activate_fill_ring_tool)
@@ -604,7 +885,7 @@ class CoordClick:
         if checked:
             self.dlg.checkToutExport.setChecked(False)
 
-    # Appel gestion export Excel
+    # Appel gestion export (tâche de fond, format choisi à l'enregistrement)
     def export_to_excel(self):
         export_to_excel(self)
 
@@ -681,13 +962,7 @@ class CoordClick:
             QMessageBox.warning(self.dlg, "Erreur", "Aucune entité sélectionnée.")
             return
 
-        if not layer.isEditable():
-            if not layer.startEditing():
-                QMessageBox.critical(self.dlg, "Erreur", "Impossible de démarrer l'édition sur la couche.")
-                return
-
         feature_id = self.current_feature_id
-        feature = layer.getFeature(feature_id)
 
         # Champs à modifier
         champ_valeurs = {
@@ -697,27 +972,19 @@ class CoordClick:
             "tel_Voisin": self.dlg.lineTel.text(),
         }
 
-        for nom_champ, valeur in champ_valeurs.items():
-            if nom_champ in layer.fields().names():
-                #print(f"✅ Modification du champ {nom_champ} → {valeur}")
-                feature.setAttribute(nom_champ, valeur)
-            else:
-                print(f"❌ Champ {nom_champ} introuvable dans la couche")
+        for nom_champ in champ_valeurs:
+            if nom_champ not in layer.fields().names():
+                log_warning(f"❌ Champ {nom_champ} introuvable dans la couche")
 
-        # Enregistrement
-        if layer.updateFeature(feature):
-            if layer.commitChanges():
-                QMessageBox.information(self.dlg, "Succès", "Les informations ont bien été enregistrées.")
-                self.iface.messageBar().pushSuccess("CoordClick", "✅ Modifications enregistrées avec succès !")
-            else:
-                layer.rollBack()
-                QMessageBox.critical(self.dlg, "Erreur", "Erreur lors de l'enregistrement des modifications.")
-        else:
-            QMessageBox.critical(self.dlg, "Erreur", "Impossible de mettre à jour l'entité.")
+        # Enregistrement avec les saisies en attente (attributs seuls, une transaction)
+        self.session_edition.modifier(layer, feature_id, champ_valeurs)
+        if self.session_edition.enregistrer():
+            QMessageBox.information(self.dlg, "Succès", "Les informations ont bien été enregistrées.")
 
             # 💡 Gérer l'affichage des onglets en fonction de 'possession' et de la case à cocher saisie
 
     def toggle_saisie_tabs(self, checked):
+        self.dlg.checkSaisieSelection.setVisible(self.is_proprietaire and checked)
         if self.is_proprietaire:
             onglets_saisie = ['Saisie Infos', 'Saisie Tvx', 'Saisie Trait.', 'Saisie Prév.']
             onglets_base = ['Informations', 'Travaux', 'Traitements', 'Prévisions']
@@ -744,9 +1011,6 @@ class CoordClick:
         QMessageBox.information(self.dlg, "Données sauvegardées",
                                 "Le contenu de la table a été sauvegardé avec succès.")
 
-        # Mettre à jour les combos après la sauvegarde
-        self.refresh_combos_from_table()  # Rafraîchit les combos
-
     def update_tab_visibility(self):
         config_mode = self.dlg.checkBoxConfig.isChecked()   # Ajout de la récupération de config_mode ici
         saisie_mode = self.dlg.checkBoxSaisie.isChecked()
@@ -777,6 +1041,7 @@ class CoordClick:
             self.dlg.tabWidget.setTabVisible(onglets['Analyses'], True)
             self.enable_table_editing()   # Appel de la méthode autorisant l'édition de la table
             self.dlg.checkBoxSaisie.setVisible(False)
+            self.dlg.checkSaisieSelection.setVisible(False)
             # Appel l'affichage des analyses
             self.data_analyse()
             return
@@ -799,6 +1064,9 @@ class CoordClick:
         for onglet in onglets_a_afficher:
             self.dlg.tabWidget.setTabVisible(onglets[onglet], True)
 
+        # Saisie groupée proposée uniquement en mode saisie
+        self.dlg.checkSaisieSelection.setVisible(self.is_proprietaire and saisie_mode)
+
         QApplication.processEvents()
 
     def handle_checkbox_toggle(self, checked):
@@ -835,12 +1103,16 @@ class CoordClick:
             return  # La couche est invalide ou incomplète
 
         if layer and self.current_feature_id is not None:
-            feature = layer.getFeature(self.current_feature_id)
+            # Les saisies en attente sont enregistrées avant relecture
+            self.session_edition.enregistrer()
+            vue = self.vues_couche(layer).vue(self.current_feature_id)
+            if vue is None:
+                return
+            feature = vue["feature"]
 
             # Mise à jour plantations / taux
-            plantations, taux = self.build_liste_arbres(feature)
-            self.dlg.plantation.setText(plantations)
-            self.dlg.taux.setText(taux)
+            self.dlg.plantation.setText(vue["plantation"])
+            self.dlg.taux.setText(vue["taux"])
 
             #Mise à jour année et total plants
             self.dlg.annee.setText(str(feature["annee"]) if feature["annee"] else "")
@@ -852,18 +1124,11 @@ class CoordClick:
             self.dlg.editRemTerrain.setText(str(feature["RemTerrain"]) if feature["RemTerrain"] else "")
 
             # Mise à jour du libellé + couleur du type de parcelle
-            type_parc_val = feature["typeParc"]
-            if type_parc_val:
-                libelle = TYPE_PARC_LIBELLES.get(type_parc_val, "Inconnu")
-                self.dlg.libelleTypeParc.setText(libelle)
-
-                layer = get_valid_active_layer(self.dlg)
-                if not layer:
-                    return
+            if vue["type_parc"]:
+                self.dlg.libelleTypeParc.setText(vue["libelle_type"])
 
-                couleur = get_fill_color_from_layer(layer, type_parc_val)
-                if couleur:
-                    self.dlg.colorFrame.setStyleSheet(f"background-color: {couleur}; border: 1px solid black;")
+                if vue["couleur"]:
+                    self.dlg.colorFrame.setStyleSheet(f"background-color: {vue['couleur']}; border: 1px solid black;")
                 else:
                     self.dlg.colorFrame.setStyleSheet("background-color: none; border: 1px solid black;")
             else:
@@ -871,29 +1136,11 @@ class CoordClick:
                 self.dlg.colorFrame.setStyleSheet("background-color: none; border: 1px solid black;")
 
             # Mise à jour dynamique des champs des onglets Tvx, Trait et Prev en visu
-            if hasattr(self.dlg, "travauxListe"):
-                texte = self.build_travaux_dates(feature)
-                self.dlg.travauxListe.setPlainText(texte)
-
-            if hasattr(self.dlg, "travauxRq"):
-                texte = self.build_travaux_remarques(feature)
-                self.dlg.travauxRq.setPlainText(texte)
-
-            if hasattr(self.dlg, "traitListe"):
-                texte = self.build_trait_dates(feature)
-                self.dlg.traitListe.setPlainText(texte)
-
-            if hasattr(self.dlg, "traitRq"):
-                texte = self.build_trait_remarques(feature)
-                self.dlg.traitRq.setPlainText(texte)
-
-            if hasattr(self.dlg, "prevListe"):
-                texte = self.build_prev_dates(feature)
-                self.dlg.prevListe.setPlainText(texte)
-
-            if hasattr(self.dlg, "prevRq"):
-                texte = self.build_prev_remarques(feature)
-                self.dlg.prevRq.setPlainText(texte)
+            for nom_widget, cle in (("travauxListe", "travaux_liste"), ("travauxRq", "travaux_rq"),
+                                    ("traitListe", "trait_liste"), ("traitRq", "trait_rq"),
+                                    ("prevListe", "prev_liste"), ("prevRq", "prev_rq")):
+                if hasattr(self.dlg, nom_widget):
+                    getattr(self.dlg, nom_widget).setPlainText(vue[cle])
 
             # Mise à jour des combos
             for prefix, combo_base in [("plant", "comboPlant"), ("Tvx", "comboTvx"),
@@ -913,95 +1160,27 @@ class CoordClick:
         if not layer:
             return  # Couche invalide ou non compatible
 
-        if not layer.isEditable():
-            layer.startEditing()
-
-        feature = layer.getFeature(self.current_feature_id)
-        if feature:
-            feature['Possession'] = state  # True ou False
-            layer.updateFeature(feature)
-
-    # Raffraichissement des combos par rapport à tablewidgetdata
-    def refresh_combos_from_table(self):
-        self.populate_saisie_combos("Tvx", "comboTvx", 1)
-        self.populate_saisie_combos("Trait", "comboTrait", 2)
-        self.populate_saisie_combos("Prev", "comboPrev", 1)
-        self.populate_saisie_combos("Plant", "comboPlant", 0)
-    #    self.populate_terrain_acces_combos()
-
-    def populate_saisie_combos(self, prefix, combo_base_name, column_index):
-        """
-        Remplit les comboBox d’un onglet Saisie (Tvx, Trait, Prev).
-
-        Args:
-            prefix (str): préfixe du champ attributaire, ex: 'Tvx', 'Trait', 'Prev'
-            combo_base_name (str): nom de base des combo ex: 'comboTvx', 'comtrait', 'comboPrev'
-            column_index (int): index de colonne dans tableWidgetData (0-based)
-        """
-        # Récupérer les valeurs uniques de la colonne
-        raw_data = extract_table_values(self.dlg.tableWidgetData, [column_index])
-        valeurs = unique_values_per_column(raw_data)[0]
-
-        nb_combos = SAISIE_COMBO_COUNTS.get(prefix, 6)  # défaut = 6 si inconnu
+        if self.current_feature_id is not None:
+            self.session_edition.modifier(layer, self.current_feature_id, {"Possession": state})  # True ou False
 
-        for i in range(1, nb_combos + 1):
-            combo = getattr(self.dlg, f"{combo_base_name}{i}", None)
-            if combo is not None:
-                combo.clear()
-                combo.addItem("")
-                combo.addItems(valeurs)
+    def lier_combos_vocabulaires(self):
+        """Lie chaque combo de saisie et les combos Terrain / Accès au modèle partagé de leur vocabulaire."""
+        for prefix, combo_base_name, _ in SAISIE_COMBO_SETTINGS:
+            for i in range(1, SAISIE_COMBO_COUNTS.get(prefix, 6) + 1):
+                combo = getattr(self.dlg, f"{combo_base_name}{i}", None)
+                if combo is not None:
+                    self.vocabulaires.lier(prefix, combo)
+        for nom, combo_name, _ in VOCABULAIRES_TERRAIN_ACCES:
+            self.vocabulaires.lier(nom, getattr(self.dlg, combo_name))
 
     def remplir_combobox_terrain_acces(self, valeur_terrain_actuelle='', valeur_acces_actuelle=''):
-        """Remplit les comboModifTerrain et comboModifAcces avec les valeurs uniques de tableWidgetData.
-        Sélectionne la valeur correspondante si elle existe.
+        """Sélectionne dans comboModifTerrain et comboModifAcces les valeurs de la parcelle.
+        Les listes sont les vocabulaires partagés : elles ne sont pas reconstruites ici.
         """
-
-        table = self.dlg.tableWidgetData
-
-        # Utiliser des ensembles pour éviter les doublons
-        valeurs_terrain = set()
-        valeurs_acces = set()
-
-
-        for row in range(table.rowCount()):
-            item_terrain = table.item(row, 4)  # Colonne Terrain
-            if item_terrain:
-                valeur = item_terrain.text().strip()
-                if valeur:
-                    valeurs_terrain.add(valeur)
-
-            item_acces = table.item(row, 3)  # Colonne Acces
-            if item_acces:
-                valeur = item_acces.text().strip()
-                if valeur:
-                    valeurs_acces.add(valeur)
-
-        # 🔍 AJOUT ICI : lecture directe de la couche active (table attributaire QGIS)
-        #layer = get_valid_active_layer(self.dlg)
-        # if layer:
-        #     for feature in layer.getFeatures():
-        #         terrain = feature['Terrain'] if 'Terrain' in feature.fields().names() else None
-        #         acces = feature['Acces'] if 'Acces' in feature.fields().names() else None
-
-        # Remplit les combobox avec données tableWidgetData
-        self.dlg.comboModifTerrain.clear()
-        self.dlg.comboModifTerrain.addItem("")
-        self.dlg.comboModifTerrain.addItems(sorted(valeurs_terrain))
-
-        self.dlg.comboModifAcces.clear()
-        self.dlg.comboModifAcces.addItem("")
-        self.dlg.comboModifAcces.addItems(sorted(valeurs_acces))
-
-        # Sélectionne les valeurs existantes si fournies
-        if valeur_terrain_actuelle:
-            index_terrain = self.dlg.comboModifTerrain.findText(valeur_terrain_actuelle)
-            if index_terrain != -1:
-                self.dlg.comboModifTerrain.setCurrentIndex(index_terrain)
-
-        if valeur_acces_actuelle:
-            index_acces = self.dlg.comboModifAcces.findText(valeur_acces_actuelle)
-            if index_acces != -1:
-                self.dlg.comboModifAcces.setCurrentIndex(index_acces)
+        for combo, valeur in ((self.dlg.comboModifTerrain, valeur_terrain_actuelle),
+                              (self.dlg.comboModifAcces, valeur_acces_actuelle)):
+            index = combo.findText(valeur) if valeur else -1
+            combo.setCurrentIndex(index if index != -1 else 0)
 
 
     def init_combo_modif_legend(self, feature):
@@ -1051,8 +1230,9 @@ class CoordClick:
 
     def on_saisie_combo_changed(self, prefix, combo_base_name, i):
         """
-        Gère la mise à jour du champ {prefix}{i} lorsque le combo change.
-        Commit, relance l'édition, et rafraîchit l'affichage des combos.
+        Gère la mise à jour du champ {prefix}{i} lorsque le combo change :
+        la valeur est mise en tampon dans la session d'édition (enregistrée au
+        bout du délai, au changement de parcelle ou par le bouton Enregistrer).
         """
         combo = getattr(self.dlg, f"{combo_base_name}{i}")
         new_val = combo.currentText()
@@ -1066,40 +1246,16 @@ class CoordClick:
         if layer is None or fid is None:
             return
 
-        # 1. Démarrer l'édition si besoin
-        if not layer.isEditable():
-            if not layer.startEditing():
-                QMessageBox.critical(self.dlg, "Erreur",
-                                     "Impossible de démarrer l'édition sur la couche.")
-                return
-
-        # 2. Modifier l'attribut
-        field_idx = layer.fields().indexOf(f"{prefix}{i}")
-        if field_idx < 0:
-            QMessageBox.critical(self.dlg, "Erreur",
-                                 f"Le champ {prefix}{i} est introuvable.")
+        # Saisie groupée : rien n'est écrit sur la parcelle affichée, les valeurs partent avec le bouton Enregistrer
+        if self.dlg.checkSaisieSelection.isChecked():
             return
 
-        if not layer.changeAttributeValue(fid, field_idx, new_val):
-            layer.rollBack()
+        if layer.fields().indexOf(f"{prefix}{i}") < 0:
             QMessageBox.critical(self.dlg, "Erreur",
-                                 "Échec de la modification de l'attribut.")
-            return
-
-        # 3. Commit et relancer l'édition
-        if not layer.commitChanges():
-            QMessageBox.critical(self.dlg, "Erreur",
-                                 "Échec de l'enregistrement des modifications commbo changed.")
-            layer.rollBack()
+                                 f"Le champ {prefix}{i} est introuvable.")
             return
-        else:
-            layer.startEditing()
-            self.iface.messageBar().pushMessage("Succès",
-                                                f"{prefix}{i} mis à jour → {new_val}", level=0)
 
-        # 4. Rafraîchir l'affichage des combos - A vérifier, semble inutile
-        feature = layer.getFeature(fid)
-        self.init_saisie_combos(prefix, combo_base_name, feature)
+        self.session_edition.modifier(layer, fid, {f"{prefix}{i}": new_val})
 
 
     def enregistrer_modifs_saisie(self, prefix, combo_prefix, date_prefix=None, rem_prefix=None):
@@ -1121,18 +1277,30 @@ class CoordClick:
             show_error_bar(self.iface, "Erreur", "Aucune couche sélectionnée.")
             return
 
+        # 👥 Saisie groupée : valeurs de l'onglet appliquées à toute la sélection
+        if self.dlg.checkSaisieSelection.isChecked():
+            if prefix == "plant":
+                return  # les essences sont appliquées avec l'onglet Saisie Infos (save_infos_saisie)
+            valeurs = self.valeurs_combos_saisie(layer, prefix, combo_prefix)
+            if date_prefix and rem_prefix:
+                # Date et remarque uniquement pour les lignes dont le combo est renseigné
+                champs = self.valeurs_champs_saisie(layer, prefix, date_prefix, rem_prefix)
+                for i in range(1, SAISIE_COMBO_COUNTS.get(prefix, 6) + 1):
+                    if valeur_vide(valeurs.get(f"{prefix}{i}")):
+                        continue
+                    for nom in (f"date{prefix}{i}", f"rem{prefix}{i}"):
+                        if nom in champs:
+                            valeurs[nom] = champs[nom]
+            self.appliquer_a_selection(layer, valeurs)
+            return
+
         # 🔒 Vérifie l'entité sélectionnée
         if self.current_feature_id is None:
             log_warning("Aucune entité sélectionnée.")
             return
 
-        # 🔧 Passe la couche en mode édition si nécessaire
-        if not layer.isEditable() and not layer.startEditing():
-            show_error_bar(self.iface, "Erreur", "Impossible de passer la couche en mode édition.")
-            return
-
-        # 🔄 Récupération de l'entité courante
-        feature = layer.getFeature(self.current_feature_id)
+        # 🔄 Récupération de l'entité courante (attributs seuls)
+        feature = lire_parcelle(layer, self.current_feature_id)
 
         # ✅ Sauvegarde des valeurs des combobox (obligatoire)
         self.save_saisie_values(layer, feature, prefix, combo_prefix)
@@ -1141,48 +1309,137 @@ class CoordClick:
         if date_prefix and rem_prefix:
             self.save_saisie_fields(prefix, date_prefix, rem_prefix)
 
-        # 💾 Validation des modifications
-        if layer.commitChanges():
-            current_tab_name = self.dlg.tabWidget.tabText(self.dlg.tabWidget.currentIndex())
-            show_success_bar(self.iface, "✅ CoordClick", f"Modifications enregistrées pour : {current_tab_name}")
-            layer.startEditing()  # Repassage en mode édition pour d'autres modifs
-        else:
-            layer.rollBack()
-            show_error_bar(self.iface, "❌ Erreur", "Échec de l'enregistrement des modifications Saisie.")
+        # 💾 Validation des modifications de l'onglet (et des combos en attente) en une transaction
+        self.session_edition.enregistrer()
 
-    def save_saisie_values(self, layer, feature, prefix, combo_base):
+    def valeurs_combos_saisie(self, layer, prefix, combo_base):
         """
-        Sauvegarde les valeurs des combobox de saisie dans les champs correspondants.
+        Valeurs des combobox de saisie : {champ: texte du combo}, limitées aux
+        champs présents dans la couche.
         """
-        updates = {}
-
+        valeurs = {}
+        noms_champs = layer.fields().names()
         nb_combos = SAISIE_COMBO_COUNTS.get(prefix, 6)  # 🔥 Ajouté ici aussi !
 
         for i in range(1, nb_combos + 1):
-            combo_name = f"{combo_base}{i}"
-            combo = getattr(self.dlg, combo_name, None)
+            combo = getattr(self.dlg, f"{combo_base}{i}", None)
             field_name = f"{prefix}{i}"
 
-            if combo is None or not field_name:
+            if combo is None:
                 continue
 
-            if field_name not in feature.fields().names():
+            if field_name not in noms_champs:
                 log_warning(f"Champ {field_name} absent de la couche.")
                 continue
 
-            new_value = combo.currentText()
-            if feature[field_name] != new_value:
-                updates[layer.fields().indexFromName(field_name)] = new_value
+            valeurs[field_name] = combo.currentText()
+        return valeurs
+
+    def save_saisie_values(self, layer, feature, prefix, combo_base):
+        """
+        Met en tampon (session d'édition) les valeurs des combobox de saisie
+        dans les champs correspondants.
+        """
+        updates = {
+            field_name: new_value
+            for field_name, new_value in self.valeurs_combos_saisie(layer, prefix, combo_base).items()
+            if feature[field_name] != new_value
+        }
 
         if updates:
-            res = layer.changeAttributeValues(feature.id(), updates)
-            if res:
-                log_debug(f"✅ Valeurs mises à jour pour {prefix}: {updates}")
-            else:
-                log_error("❌ Échec lors de l'application des modifications.")
+            self.session_edition.modifier(layer, feature.id(), updates)
+            log_debug(f"✅ Valeurs mises à jour pour {prefix}: {updates}")
         else:
             log_debug("ℹ️ Aucune modification détectée.")
 
+    def appliquer_a_selection(self, layer, valeurs):
+        """
+        Saisie groupée : applique {champ: valeur} à toutes les parcelles sélectionnées
+        sur la couche, après contrôle des taux et confirmation d'un résumé avant/après.
+        Les champs laissés vides ne sont pas modifiés. Un seul commit pour toute la sélection.
+        """
+        fids = layer.selectedFeatureIds()
+        if not fids:
+            QMessageBox.warning(self.dlg, "Saisie groupée", "Aucune parcelle sélectionnée sur la couche.")
+            return
+
+        valeurs = {nom: valeur for nom, valeur in valeurs.items() if not valeur_vide(valeur)}
+        if not valeurs:
+            QMessageBox.information(self.dlg, "Saisie groupée", "Aucune valeur renseignée à appliquer.")
+            return
+
+        # Les saisies en attente sont enregistrées avant de comparer
+        if not self.session_edition.enregistrer():
+            return
+
+        modifications, avant_apres, taux_invalides = modifications_groupe(layer, fids, valeurs)
+
+        if taux_invalides:
+            lignes = [f"- {libelle} : {total}%" for libelle, total in taux_invalides[:20]]
+            if len(taux_invalides) > 20:
+                lignes.append(f"... et {len(taux_invalides) - 20} autre(s)")
+            QMessageBox.warning(self.dlg, "Erreur",
+                                "La somme des taux dépasserait 100% pour ces parcelles :\n" + "\n".join(lignes))
+            return
+
+        if not modifications:
+            QMessageBox.information(self.dlg, "Saisie groupée",
+                                    "Les parcelles sélectionnées ont déjà ces valeurs.")
+            return
+
+        resume, details = resume_modifications(avant_apres, len(fids))
+        confirmation = QMessageBox(QMessageBox.Question, "Saisie groupée",
+                                   f"{resume}\n\nEnregistrer ces modifications ?",
+                                   QMessageBox.Yes | QMessageBox.No, self.dlg)
+        confirmation.setDetailedText(details)
+        if confirmation.exec_() != QMessageBox.Yes:
+            return
+
+        self.session_edition.modifier_groupe(layer, modifications)
+        if self.session_edition.enregistrer() and self.current_feature_id in modifications:
+            self.refresh_all_saisie_fields()
+
+    def on_saisie_groupee_toggled(self, checked):
+        """
+        Saisie groupée activée : les widgets des onglets de saisie repartent vides
+        et le type de parcellaire sur « (inchangé) », pour que seules les valeurs
+        choisies par l'utilisateur soient appliquées à la sélection. Désactivée :
+        retour aux valeurs de la parcelle affichée.
+        """
+        combo_type = self.dlg.comboModifLegend
+        if checked:
+            if combo_type.findText(INCHANGE) < 0:
+                combo_type.insertItem(0, INCHANGE, None)
+            combo_type.setCurrentIndex(0)
+            for prefix, combo_base_name, _ in SAISIE_COMBO_SETTINGS:
+                for i in range(1, SAISIE_COMBO_COUNTS.get(prefix, 6) + 1):
+                    combo = getattr(self.dlg, f"{combo_base_name}{i}", None)
+                    if combo is not None:
+                        combo.setCurrentIndex(0)
+            for _, combo_name, _ in VOCABULAIRES_TERRAIN_ACCES:
+                getattr(self.dlg, combo_name).setCurrentIndex(0)
+            widgets = [self.dlg.anneeModif, self.dlg.totalPlantsModif, self.dlg.remModifTerrain,
+                       self.dlg.txModif1, self.dlg.txModif2, self.dlg.txModif3, self.dlg.txModif4]
+            for prefix in ("Tvx", "Trait", "Prev"):
+                widgets += [getattr(self.dlg, f"rem{prefix}{i}", None)
+                            for i in range(1, SAISIE_COMBO_COUNTS.get(prefix, 6) + 1)]
+            for widget in widgets:
+                if widget is not None:
+                    widget.clear()
+            return
+
+        index = combo_type.findText(INCHANGE)
+        if index >= 0:
+            combo_type.removeItem(index)
+        if self.current_feature_id is None or self.layer is None:
+            return
+        feature = lire_parcelle(self.layer, self.current_feature_id)
+        if feature.isValid():
+            self.remplir_champs_modifiables(feature)
+            self.remplir_combobox_terrain_acces(feature['Terrain'], feature['Acces'])
+            self.init_combo_modif_legend(feature)
+            self.refresh_all_saisie_fields()
+
     def connect_enregistrement_boutons(self):
         """
         Connecte automatiquement tous les boutons d'enregistrement liés aux combos de saisie.
@@ -1315,174 +1572,13 @@ class CoordClick:
             if combo:
                 value = feature[field_name]
 
-
-                # 👉 Remettre les options standards (depuis ta table ou liste prédéfinie)
-                self.populate_saisie_combo(combo, prefix)
-
                 if value:
-                    # Cherche la valeur dans les options
-                    index = combo.findText(value)
-                    if index != -1:
-                        combo.setCurrentIndex(index)
-                    else:
-                        # Pas trouvée ? Ajoute-la et sélectionne
-                        combo.addItem(value)
-                        combo.setCurrentIndex(combo.count() - 1)
+                    # Pas dans le vocabulaire ? Elle y est ajoutée (pour tous les combos) puis sélectionnée
+                    self.vocabulaires.ajouter(prefix, value)
+                    combo.setCurrentIndex(combo.findText(str(value)))
                 else:
                     combo.setCurrentIndex(0)
 
-    def populate_saisie_combo(self, combo, prefix):
-        """
-        Remplit une comboBox spécifique avec les valeurs possibles pour le prefix donné.
-        """
-        # Mapping des préfixes à leur colonne
-        column_mapping = {
-            "Tvx": 1,
-            "Trait": 2,
-            "Prev": 2,  # Prev utilise la même colonne que Trait
-        }
-
-        column_index = column_mapping.get(prefix)
-
-        if column_index is None:
-            log_warning(f"Préfixe inconnu pour populate_saisie_combo : {prefix}")
-            return
-
-        raw_data = extract_table_values(self.dlg.tableWidgetData, [column_index])
-        valeurs = unique_values_per_column(raw_data)[0]
-
-        combo.clear()
-        combo.addItem("")  # Valeur vide en premier
-        combo.addItems(valeurs)
-
-        QTimer.singleShot(100, self.populate_saisie_combo)
-
-    @staticmethod
-    def build_liste_arbres(feature):
-        """
-        Récupère les champs plant1..plant4 et Tx1..Tx4 de feature
-        et renvoie deux chaînes à afficher dans plantation et taux.
-        """
-        fields_plants = ['plant1', 'plant2', 'plant3', 'plant4']
-        fields_tx = ['Tx1', 'Tx2', 'Tx3', 'Tx4']
-
-        valeurs_plants = [str(feature[f]) for f in fields_plants if feature[f]]
-        valeurs_tx = [str(feature[f]) for f in fields_tx if feature[f]]
-
-        to_str_plants = "\n".join(valeurs_plants) if valeurs_plants else "Aucune essence définie ici..."
-        to_str_tx = "\n".join(valeurs_tx) if valeurs_tx else "Aucun"
-
-        return to_str_plants, to_str_tx
-
-    @staticmethod
-    def build_travaux_dates(feature):
-        mon_tab = []
-
-        for i in range(1, SAISIE_COMBO_COUNTS["Tvx"] + 1):  # création liste des dates et remarques
-            dat = f"dateTvx{i}"
-            rq = f"Tvx{i}"
-            mon_tab.append([dat, rq])
-
-        fields = sum(mon_tab, [])
-        str2 = '\n'.join(
-            f'{format_date(feature[a])} : {feature[b]}'
-            for a, b in batched(fields, 2) if feature[b]
-        )
-        if not str2:
-            return 'Aucun travaux effectués ici...'
-        return str2
-
-    @staticmethod
-    def build_travaux_remarques(feature):
-
-        mon_tab = []
-
-        for i in range(1, SAISIE_COMBO_COUNTS["Tvx"] + 1):           #création liste des dates et remarques du display_point
-            dat = "dateTvx" + str(i)
-            rq = "remTvx" + str(i)
-            mon_tab.append([dat, rq])
-
-        fields = sum(mon_tab,[])
-        str3 = '\n'.join(
-            f'{format_date(feature[a])} : {feature[b]}'
-            for a, b in batched(fields, 2) if feature[b]
-        )
-        return str3 if str3 else "..."
-
-    @staticmethod
-    def build_trait_dates(feature):
-
-        mon_tab = []
-
-        for i in range(1, SAISIE_COMBO_COUNTS["Trait"] + 1):  # création liste des dates et remarques du display_point
-            dat = "dateTrait" + str(i)
-            rq = "Trait" + str(i)
-            mon_tab.append([dat, rq])
-
-        fields = sum(mon_tab, [])
-        str4 =  '\n'.join(
-            f'{format_date(feature[a])} : {feature[b]}'
-            for a, b in batched(fields, 2) if feature[b]
-        )  # contrôle présence champ remarque si date existe et concatenation champ date et travaux
-        if not str4:
-            return 'Aucun traitement effectués ici...'
-        return str4
-
-    @staticmethod
-    def build_trait_remarques(feature):
-
-        mon_tab = []
-
-        for i in range(1, SAISIE_COMBO_COUNTS["Trait"] + 1):  # création liste des dates et remarques du display_point
-            dat = "dateTrait" + str(i)
-            rq = "remTrait" + str(i)
-            mon_tab.append([dat, rq])
-
-        fields = sum(mon_tab, [])
-        str5 = '\n'.join(
-            f'{format_date(feature[a])} : {feature[b]}'
-            for a, b in batched(fields, 2) if feature[b]
-        )  # contrôle présence champ remarque si date existe
-        return str5 if str5 else "..."  # si aucune remarque des traitements dans la parcelle
-
-    @staticmethod
-    def build_prev_dates(feature):
-
-        mon_tab = []
-
-        for i in range(1, SAISIE_COMBO_COUNTS["Prev"] + 1):
-            dat = "datePrev" + str(i)
-            rq = "Prev" + str(i)
-            mon_tab.append([dat, rq])
-
-        fields = sum(mon_tab, [])
-        str6 =  '\n'.join(
-            f'{feature[a]} : {feature[b]}'
-            for a, b in batched(fields, 2) if feature[b]
-        )  # contrôle présence champ remarque si date existe et concatenation champ date et prévisions
-        if not str6:
-            return 'Aucun travaux prévus ici...'
-        return str6
-
-    # Affichage de la liste des remarques et controle des champs nuls
-
-    @staticmethod
-    def build_prev_remarques(feature):
-
-        mon_tab = []
-
-        for i in range(1, SAISIE_COMBO_COUNTS["Prev"] + 1):  # création liste des dates et remarques du display_point
-            dat = "datePrev" + str(i)
-            rq = "remPrev" + str(i)
-            mon_tab.append([dat, rq])
-
-        fields = sum(mon_tab, [])
-        str7 = '\n'.join(
-            f'{feature[a]} : {feature[b]}'
-            for a, b in batched(fields, 2) if feature[b]
-        )  # contrôle présence champ remarque si date existe
-        return str7 if str7 else "..."  # si aucune remarque sur les prévisions dans la parcelle
-
     #Gestion du combobox ModifLegend pour le remplir avec la liste
     def remplir_combo_modif_legend(self):
         self.dlg.comboModifLegend.clear()
@@ -1584,12 +1680,19 @@ class CoordClick:
             QMessageBox.warning(self.dlg, "Erreur", "Aucune entité sélectionnée.")
             return
 
-        if not layer.isEditable():
-            if not layer.startEditing():
-                QMessageBox.critical(self.dlg, "Erreur", "Impossible de démarrer l'édition sur la couche.")
-                return
+        valeurs = self.valeurs_champs_saisie(layer, prefix, date_prefix, rem_prefix)
+
+        # Mise en tampon dans la session d'édition (pas de commit ici)
+        self.session_edition.modifier(layer, self.current_feature_id, valeurs)
 
-        feature = layer.getFeature(self.current_feature_id)
+
+    def valeurs_champs_saisie(self, layer, prefix, date_prefix, rem_prefix):
+        """
+        Valeurs des widgets de date et de remarque d'un onglet générique (Tvx, Trait, Prev) :
+        {champ: valeur}, limitées aux champs présents dans la couche.
+        """
+        noms_champs = layer.fields().names()
+        valeurs = {}
         nb_champs = SAISIE_COMBO_COUNTS.get(prefix, 6)
 
         for i in range(1, nb_champs + 1):
@@ -1598,31 +1701,26 @@ class CoordClick:
 
             # --- DATE ---
             date_widget = getattr(self.dlg, f"{date_prefix}{i}", None)
-            if date_widget and date_field in feature.fields().names():
+            if date_widget and date_field in noms_champs:
                 if hasattr(date_widget, 'date'):  # QDateEdit
                     value = date_widget.date().toString("yyyy-MM-dd")
                 else:  # QLineEdit
                     value = date_widget.text()
-                feature.setAttribute(date_field, value)
+                valeurs[date_field] = value
             else:
                 print(f"⚠️ Champ ou widget date manquant : {date_field}")
 
             # --- REMARQUE ---
             rem_widget = getattr(self.dlg, f"{rem_prefix}{i}", None)
-            if rem_widget and rem_field in feature.fields().names():
+            if rem_widget and rem_field in noms_champs:
                 if hasattr(rem_widget, 'toPlainText'):  # QTextEdit
                     value = rem_widget.toPlainText()
                 else:  # QLineEdit
                     value = rem_widget.text()
-                feature.setAttribute(rem_field, value)
+                valeurs[rem_field] = value
             else:
                 print(f"⚠️ Champ ou widget remarque manquant : {rem_field}")
-
-        # Mise à jour de l'entité dans la couche (pas de commit ici)
-        if not layer.updateFeature(feature):
-            QMessageBox.critical(self.dlg, "Erreur", "Échec de la mise à jour de l'entité.")
-            return
-
+        return valeurs
 
     def connect_save_buttons(self):
         """Connecte les boutons de sauvegarde aux méthodes de sauvegarde pour chaque onglet."""
@@ -1643,17 +1741,13 @@ class CoordClick:
             QMessageBox.warning(self.dlg, "Erreur", "Aucune couche sélectionnée.")
             return
 
-        if self.current_feature_id is None:
+        saisie_groupee = self.dlg.checkSaisieSelection.isChecked()
+        if self.current_feature_id is None and not saisie_groupee:
             QMessageBox.warning(self.dlg, "Erreur", "Aucune entité sélectionnée.")
             return
 
-        if not layer.isEditable():
-            if not layer.startEditing():
-                QMessageBox.critical(self.dlg, "Erreur", "Impossible de démarrer l'édition sur la couche.")
-                return
-
         feature_id = self.current_feature_id
-        feature = layer.getFeature(feature_id)
+        valeurs = {}
 
         # ✅ Vérifie que la somme des taux ne dépasse pas 100
         tx_fields = [self.dlg.txModif1, self.dlg.txModif2, self.dlg.txModif3, self.dlg.txModif4]
@@ -1696,43 +1790,42 @@ class CoordClick:
                 champ_type = layer.fields().field(nom_champ).type()
                 # Vérification propre des "valeurs vides"
                 if valeur.strip().upper() in ("", "NULL", "NONE"):
-                    feature.setAttribute(nom_champ, None)
+                    valeurs[nom_champ] = None
                 elif champ_type in (QVariant.Int, QVariant.LongLong):
-                    feature.setAttribute(nom_champ, int(valeur))
+                    valeurs[nom_champ] = int(valeur)
                 elif champ_type == QVariant.Double:
-                    feature.setAttribute(nom_champ, float(valeur))
+                    valeurs[nom_champ] = float(valeur)
                 else:
-                    feature.setAttribute(nom_champ, valeur)
+                    valeurs[nom_champ] = valeur
             else:
-                print(f"❌ Champ {nom_champ} introuvable dans la couche")
+                log_warning(f"❌ Champ {nom_champ} introuvable dans la couche")
 
-        # ➕ Sauvegarde du champ typeParc (depuis comboModifLegend)
+        # ➕ Sauvegarde du champ typeParc (depuis comboModifLegend), sauf « (inchangé) » en saisie groupée
         libelle = self.dlg.comboModifLegend.currentText()
-        inverse_dict = {v: k for k, v in TYPE_PARC_LIBELLES.items()}
-        type_parc_val = inverse_dict.get(libelle, None)
-
-        if type_parc_val is None:
-            QMessageBox.warning(self.dlg, "Erreur", f"Le libellé '{libelle}' n'est pas reconnu.")
-            return
+        if not (saisie_groupee and libelle == INCHANGE):
+            inverse_dict = {v: k for k, v in TYPE_PARC_LIBELLES.items()}
+            type_parc_val = inverse_dict.get(libelle, None)
 
-        if 'typeParc' not in layer.fields().names():
-            QMessageBox.critical(self.dlg, "Erreur", "Le champ 'typeParc' est introuvable dans la couche.")
-            return
+            if type_parc_val is None:
+                QMessageBox.warning(self.dlg, "Erreur", f"Le libellé '{libelle}' n'est pas reconnu.")
+                return
 
-        feature.setAttribute('typeParc', type_parc_val)
+            if 'typeParc' not in layer.fields().names():
+                QMessageBox.critical(self.dlg, "Erreur", "Le champ 'typeParc' est introuvable dans la couche.")
+                return
 
+            valeurs['typeParc'] = type_parc_val
 
-        # Appliquer les modifications
-        if not layer.updateFeature(feature):
-            QMessageBox.critical(self.dlg, "Erreur", "Échec de la mise à jour de l'entité.")
+        # 👥 Saisie groupée : valeurs de l'onglet et essences appliquées à toute la sélection
+        if saisie_groupee:
+            valeurs.update(self.valeurs_combos_saisie(layer, "plant", "comboPlant"))
+            self.appliquer_a_selection(layer, valeurs)
             return
 
-        if not layer.commitChanges():
-            QMessageBox.critical(self.dlg, "Erreur", "Échec lors de la sauvegarde des modifications.")
+        # Appliquer les modifications avec les saisies en attente, en une transaction
+        self.session_edition.modifier(layer, feature_id, valeurs)
+        if not self.session_edition.enregistrer():
             return
-        # 🔥 Repasser en mode édition
-        if not layer.startEditing():
-            QMessageBox.critical(self.dlg, "Erreur", "Impossible de repasser en mode édition après sauvegarde.")
 
         QMessageBox.information(self.dlg, "Succès", "Les informations ont été enregistrées avec succès.")
 
@@ -1836,119 +1929,150 @@ class CoordClick:
         layer.setLabelsEnabled(True)
         layer.triggerRepaint()
 
+    def localisation_couche(self, layer):
+        """Service de localisation de la couche, recréé si la couche a changé."""
+        if self.localisation is None or self.localisation.layer is not layer:
+            if self.localisation is not None:
+                self.localisation.deconnecter()
+            self.localisation = LocalisationParcelles(layer)
+        return self.localisation
+
+    def vues_couche(self, layer):
+        """Cache des vues de parcelles de la couche, recréé si la couche a changé."""
+        if self.vues is None or self.vues.layer is not layer:
+            if self.vues is not None:
+                self.vues.deconnecter()
+            self.vues = CacheVues(layer, self.couleurs_couche(layer))
+        return self.vues
+
+    def couleurs_couche(self, layer):
+        """Table des couleurs du style de la couche, recréée si la couche a changé."""
+        if self.couleurs is None or self.couleurs.layer is not layer:
+            if self.couleurs is not None:
+                self.couleurs.deconnecter()
+            self.couleurs = CouleursCouche(layer)
+            # Changement de style : l'histogramme des types reprend les nouvelles couleurs
+            self.couleurs.changees.connect(self.data_analyse)
+        return self.couleurs
+
     def display_point(self, point, button):
         self.last_position = self.dlg.pos()
         self.dlg.hide()
 
+        # Changement de parcelle : les saisies en attente sont enregistrées
+        self.session_edition.enregistrer()
+
+        # Fin de la saisie groupée : les widgets reprennent les valeurs de la parcelle cliquée
+        self.dlg.checkSaisieSelection.blockSignals(True)
+        self.dlg.checkSaisieSelection.setChecked(False)
+        self.dlg.checkSaisieSelection.blockSignals(False)
+        index = self.dlg.comboModifLegend.findText(INCHANGE)
+        if index >= 0:
+            self.dlg.comboModifLegend.removeItem(index)
+
         # Vérifie que la couche active est valide
         layer = get_valid_active_layer(self.dlg)
         if not layer:
             return
 
-        # Recherche de la géométrie cliquée
-        req = QgsFeatureRequest().setFilterRect(QgsGeometry.fromPointXY(QgsPointXY(point.x(), point.y())).boundingBox())
-        entites = layer.getFeatures(req)
+        # Recherche de la parcelle cliquée : une seule, par test exact sur l'index spatial
+        point_couche = self.canvas.mapSettings().mapToLayerCoordinates(layer, point)
+        fid = self.localisation_couche(layer).parcelle_au_point(point_couche)
+        vue = self.vues_couche(layer).vue(fid) if fid is not None else None
+        if vue is None:
+            # Clic hors parcelle : la fenêtre réapparaît inchangée
+            self.dlg.show()
+            return
 
-        for e in entites:
-            # Stocke l'ID de l'entité cliquée
-            self.current_feature_id = e.id()
+        e = vue["feature"]
 
-            # Affiche les coordonnées
-            self.dlg.coordClick.setText(f"{point.x()}, {point.y()}")
+        # Stocke l'ID de l'entité cliquée
+        self.current_feature_id = e.id()
 
-            # Affiche la section, numéro, indice
-            indice = e['indice_parc'] if 'indice_parc' in e.fields().names() and e['indice_parc'] else ''
-            self.dlg.coord2.setText(e['section'] + e['numero'] + indice)
+        # Affiche les coordonnées
+        self.dlg.coordClick.setText(f"{point.x()}, {point.y()}")
 
-            # Affiche la surface
-            self.dlg.surface.setText(str(e['SURFACE']) + ' ares')
+        # Affiche la section, numéro, indice
+        self.dlg.coord2.setText(vue["libelle"])
 
-            # Remplit les champs texte simples
-            safe_set_text(self.dlg.annee, e['annee'])
-            safe_set_text(self.dlg.totalPlants, e['totalplants'])
-            safe_set_text(self.dlg.editTerrain, e['Terrain'])
-            safe_set_text(self.dlg.editAcces, e['Acces'])
-            safe_set_text(self.dlg.editRemTerrain, e['RemTerrain'])
+        # Affiche la surface
+        self.dlg.surface.setText(vue["surface"])
 
-            # Mémorisation des valeurs Terrain et Accès
-            terrain = e['Terrain']
-            acces = e['Acces']
+        # Remplit les champs texte simples
+        safe_set_text(self.dlg.annee, e['annee'])
+        safe_set_text(self.dlg.totalPlants, e['totalplants'])
+        safe_set_text(self.dlg.editTerrain, e['Terrain'])
+        safe_set_text(self.dlg.editAcces, e['Acces'])
+        safe_set_text(self.dlg.editRemTerrain, e['RemTerrain'])
 
-            start = time.time()
-            self.remplir_combobox_terrain_acces(terrain, acces)
-            self.remplir_combobox_terrain_acces()
-            end = time.time()
-            print(f"remplir_combobox_terrain_acces took {end - start:.3f} seconds")
+        # Mémorisation des valeurs Terrain et Accès
+        terrain = e['Terrain']
+        acces = e['Acces']
 
-            # Affiche la possession
-            self.dlg.checkBoxPossession.setChecked(bool(e['Possession']))
+        self.remplir_combobox_terrain_acces(terrain, acces)
 
-            # Affiche le libellé du type de parcellaire
-            type_parc_val = e['typeParc']
-            libelle = TYPE_PARC_LIBELLES.get(type_parc_val, "Inconnu")
-            self.dlg.libelleTypeParc.setText(libelle)
+        # Affiche la possession
+        self.dlg.checkBoxPossession.setChecked(bool(e['Possession']))
 
-            # Couleur de fond en fonction du type
-            layer = get_valid_active_layer(self.dlg)
-            if not layer:
-                return
-            couleur = get_fill_color_from_layer(layer, type_parc_val)
-            self.dlg.colorFrame.setStyleSheet(f"background-color: {couleur}; border: 1px solid black;")
+        # Affiche le libellé du type de parcellaire
+        self.dlg.libelleTypeParc.setText(vue["libelle_type"])
 
-            # Coordonnées du voisin
-            safe_set_text(self.dlg.nomProp, e['nom_Voisin'])
-            safe_set_text(self.dlg.lineAdress, e['adresse_Voisin'])
-            safe_set_text(self.dlg.lineMail, e['mail_Voisin'])
-            safe_set_text(self.dlg.lineTel, e['tel_Voisin'])
+        # Couleur de fond en fonction du type
+        self.dlg.colorFrame.setStyleSheet(f"background-color: {vue['couleur']}; border: 1px solid black;")
 
-            # Champs modifiables
-            self.remplir_champs_modifiables(e)
+        # Coordonnées du voisin
+        safe_set_text(self.dlg.nomProp, e['nom_Voisin'])
+        safe_set_text(self.dlg.lineAdress, e['adresse_Voisin'])
+        safe_set_text(self.dlg.lineMail, e['mail_Voisin'])
+        safe_set_text(self.dlg.lineTel, e['tel_Voisin'])
 
-            # Possession : influe sur les onglets visibles
-            self.is_proprietaire = bool(e['possession'])
-            self.dlg.checkBoxSaisie.setChecked(False)
-            self.update_tab_visibility()
+        # Champs modifiables
+        self.remplir_champs_modifiables(e)
 
-            # Infos plantations
-            txt_plants, txt_taux = self.build_liste_arbres(e)
-            self.dlg.plantation.setText(txt_plants)
-            self.dlg.taux.setText(txt_taux)
+        # Possession : influe sur les onglets visibles
+        self.is_proprietaire = bool(e['possession'])
+        self.dlg.checkBoxSaisie.setChecked(False)
+        self.update_tab_visibility()
 
-            # Connexions pour la checkbox de possession
-            try:
-                self.dlg.checkBoxPossession.toggled.disconnect()
-            except TypeError:
-                pass
-            self.dlg.checkBoxPossession.toggled.connect(self.handle_possession_toggle)
+        # Infos plantations
+        self.dlg.plantation.setText(vue["plantation"])
+        self.dlg.taux.setText(vue["taux"])
 
-            # Connexion pour la case à cocher de saisie
-            try:
-                self.dlg.checkBoxSaisie.toggled.disconnect(self.handle_checkbox_toggle)
-            except TypeError:
-                pass
-            self.dlg.checkBoxSaisie.toggled.connect(self.handle_checkbox_toggle)
-
-            # Initialisation des combos de saisie
-            fid = self.current_feature_id
-            if not layer or fid is None:
-                return
-            feature = layer.getFeature(fid)
+        # Connexions pour la checkbox de possession
+        try:
+            self.dlg.checkBoxPossession.toggled.disconnect()
+        except TypeError:
+            pass
+        self.dlg.checkBoxPossession.toggled.connect(self.handle_possession_toggle)
 
-            for prefix, combo_base in [("plant", "comboPlant"), ("Tvx", "comboTvx"), ("Trait", "comboTrait"),
-                                       ("Prev", "comboPrev")]:
-                self.init_saisie_combos(prefix, combo_base, feature)
+        # Connexion pour la case à cocher de saisie
+        try:
+            self.dlg.checkBoxSaisie.toggled.disconnect(self.handle_checkbox_toggle)
+        except TypeError:
+            pass
+        self.dlg.checkBoxSaisie.toggled.connect(self.handle_checkbox_toggle)
 
+        # Initialisation des combos de saisie
+        fid = self.current_feature_id
+        if not layer or fid is None:
+            return
+        feature = e  # déjà lue avec tous ses attributs
 
-            # Initialisation des combos de légendes modifiables
-            self.init_combo_modif_legend(feature)
+        for prefix, combo_base in [("plant", "comboPlant"), ("Tvx", "comboTvx"), ("Trait", "comboTrait"),
+                                   ("Prev", "comboPrev")]:
+            self.init_saisie_combos(prefix, combo_base, feature)
 
-            # Infos complémentaires
-            self.dlg.travauxListe.setText(self.build_travaux_dates(e))
-            self.dlg.travauxRq.setText(self.build_travaux_remarques(e))
-            self.dlg.traitListe.setText(self.build_trait_dates(e))
-            self.dlg.traitRq.setText(self.build_trait_remarques(e))
-            self.dlg.prevListe.setText(self.build_prev_dates(e))
-            self.dlg.prevRq.setText(self.build_prev_remarques(e))
+
+        # Initialisation des combos de légendes modifiables
+        self.init_combo_modif_legend(feature)
+
+        # Infos complémentaires
+        self.dlg.travauxListe.setText(vue["travaux_liste"])
+        self.dlg.travauxRq.setText(vue["travaux_rq"])
+        self.dlg.traitListe.setText(vue["trait_liste"])
+        self.dlg.traitRq.setText(vue["trait_rq"])
+        self.dlg.prevListe.setText(vue["prev_liste"])
+        self.dlg.prevRq.setText(vue["prev_rq"])
 
         # Positionnement de la fenêtre
         if self.first_show:
@@ -2001,7 +2125,15 @@ class CoordClick:
         self.dlg.lineTotalSurface.setText(str(results.get("surface_forestiere", "")))
         self.dlg.lineTotalSurfaceF.setText(str(results.get("surface_friche", "")))
         self.dlg.lineTotalRepiq.setText(str(results.get("total_plants", "")))
-        self.dlg.textEditAnalyse.setPlainText(results.get("types_parcelles", ""))
+        # Histogramme des types dans les couleurs du style de la couche : la table des couleurs
+        # de la fenêtre principale sert si elle porte sur cette couche, sans être remplacée
+        if self.couleurs is not None and self.couleurs.layer is self.layer:
+            couleur = self.couleurs.couleur
+        else:
+            table = table_couleurs(self.layer.renderer())
+            couleur = lambda type_parc: table.get(str(type_parc))
+        self.dlg.textEditAnalyse.setHtml(html_repartition_types(
+            results.get("surfaces_par_type", {}), results.get("total_types", 0.0), couleur))
         self.dlg.textEditEssences.setPlainText(results.get("types_essences", ""))
         self.dlg.textEditRegroup.setPlainText(results.get("regroupement", ""))
         self.dlg.lineTotalParcelles.setText(str(results.get("nb_parcelles", "")))
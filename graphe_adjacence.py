@@ -0,0 +1,258 @@
+# graphe_adjacence.py
+# Graphe d'adjacence des parcelles conservé dans le profil QGIS (un fichier annexe
+# par source de données). Le fichier annexe est valable tant que la date du fichier
+# de la couche et son nombre d'entités n'ont pas changé ; sinon chaque parcelle est
+# comparée à l'empreinte de sa géométrie et seules celles qui ont changé sont
+# recalculées, le reste du graphe est repris tel quel. Le dernier graphe chargé de
+# chaque source reste en mémoire tant que son empreinte ne change pas.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+from qgis.core import QgsFeatureRequest, QgsProviderRegistry
+
+from .contiguite import GrapheContiguite, construire_graphe, tolerance_pour_couche
+from .utils import get_plugin_profile_dir, log_warning
+
+DOSSIER_ADJACENCE = "adjacence"
+VERSION_ADJACENCE = 1
+
+# Au-delà de cette proportion de parcelles modifiées, le graphe est reconstruit en entier
+PROPORTION_RECONSTRUCTION = 0.2
+
+# Graphes chargés, par fichier annexe : (empreinte, tolérance, GrapheContiguite), en lecture seule
+_graphes = {}
+_verrou = threading.Lock()
+
+
+def source_geopackage(layer):
+    """
+    Retourne (chemin du .gpkg, nom de table) pour une couche GeoPackage, sinon None.
+    """
+    if layer is None or layer.providerType() != "ogr":
+        return None
+    uri = QgsProviderRegistry.instance().decodeUri("ogr", layer.source())
+    chemin = uri.get("path", "")
+    if os.path.splitext(chemin)[1].lower() != ".gpkg" or not os.path.exists(chemin):
+        return None
+
+    table = uri.get("layerName")
+    if not table:
+        with closing(sqlite3.connect(chemin)) as connexion:
+            tables = connexion.execute(
+                "SELECT table_name FROM gpkg_contents WHERE data_type = 'features'"
+            ).fetchall()
+        if len(tables) != 1:
+            return None
+        table = tables[0][0]
+    return chemin, table
+
+
+def chemin_annexe(layer):
+    """Fichier annexe du graphe de la couche (un par source de données)."""
+    dossier = os.path.join(get_plugin_profile_dir(), DOSSIER_ADJACENCE)
+    os.makedirs(dossier, exist_ok=True)
+    cle = hashlib.sha1(layer.source().encode("utf-8")).hexdigest()
+    return os.path.join(dossier, f"adjacence_{cle}.json")
+
+
+def _date_fichier(chemin):
+    try:
+        return os.stat(chemin).st_mtime_ns
+    except OSError:
+        return None
+
+
+def empreinte_source(layer):
+    """
+    Date du fichier de la couche (et de son journal WAL) et nombre d'entités ;
+    None si la couche n'est pas stockée dans un fichier.
+    """
+    uri = QgsProviderRegistry.instance().decodeUri(layer.providerType(), layer.source())
+    chemin = uri.get("path", "")
+    date = _date_fichier(chemin) if chemin else None
+    if date is None:
+        return None
+    return [date, _date_fichier(f"{chemin}-wal"), layer.dataProvider().featureCount()]
+
+
+def empreinte_geometrie(geometry):
+    """Empreinte courte d'une géométrie (WKB)."""
+    if geometry is None or geometry.isNull():
+        return ""
+    return hashlib.md5(bytes(geometry.asWkb())).hexdigest()[:16]
+
+
+def lire_annexe(chemin):
+    """Contenu du fichier annexe, ou None s'il est absent ou d'une autre version."""
+    try:
+        with open(chemin, "r", encoding="utf-8") as fichier:
+            annexe = json.load(fichier)
+    except (OSError, ValueError):
+        return None
+    return annexe if annexe.get("version") == VERSION_ADJACENCE else None
+
+
+def ecrire_annexe(chemin, annexe):
+    # Écriture dans un fichier temporaire puis remplacement : jamais d'annexe tronquée
+    temporaire = f"{chemin}.tmp"
+    try:
+        with open(temporaire, "w", encoding="utf-8") as fichier:
+            json.dump(annexe, fichier)
+        os.replace(temporaire, chemin)
+    except OSError as e:
+        log_warning(f"⚠️ Graphe d'adjacence non enregistré : {e}")
+
+
+class GrapheAdjacencePersistant:
+    """
+    Graphe de contiguïté d'une couche stockée dans un fichier, mis à jour de
+    façon incrémentale et enregistré dans le profil QGIS.
+
+    Seules les géométries enregistrées (fournisseur de données) sont prises en
+    compte : les modifications en cours d'édition non validées n'y figurent pas.
+    Construit dans le thread principal, charger() peut ensuite être appelé depuis
+    une tâche de fond (lecture via une source du fournisseur, pas via la couche).
+    """
+
+    def __init__(self, layer):
+        self.empreinte = empreinte_source(layer)
+        self.tolerance = tolerance_pour_couche(layer)
+        self.chemin = chemin_annexe(layer) if self.empreinte is not None else None
+        self.source_fournisseur = layer.dataProvider().featureSource() if self.empreinte is not None else None
+
+    def est_disponible(self):
+        return self.empreinte is not None
+
+    def charger(self, feedback=None):
+        """
+        Retourne le graphe à jour (GrapheContiguite), après mise à jour de l'annexe si
+        besoin ; None si `feedback` (QgsFeedback optionnel) est annulé entre-temps.
+        Le graphe retourné est partagé : il ne doit pas être modifié.
+        """
+        with _verrou:
+            en_memoire = _graphes.get(self.chemin)
+        if en_memoire is not None and en_memoire[:2] == (self.empreinte, self.tolerance):
+            return en_memoire[2]
+
+        graphe = self._lire_ou_mettre_a_jour(feedback)
+        if graphe is not None:
+            with _verrou:
+                _graphes[self.chemin] = (self.empreinte, self.tolerance, graphe)
+        return graphe
+
+    def _lire_ou_mettre_a_jour(self, feedback):
+        annexe = lire_annexe(self.chemin)
+        if annexe is not None and annexe.get("tolerance") != self.tolerance:
+            annexe = None
+
+        graphe = GrapheContiguite()
+        if annexe is not None and annexe.get("empreinte") == self.empreinte:
+            # Fichier inchangé : graphe relu sans lire les géométries
+            for fid in annexe["geometries"]:
+                graphe.ajouter_noeud(int(fid))
+            self._lire_aretes(annexe["aretes"], graphe)
+            return graphe
+
+        connues = {int(fid): empreinte for fid, empreinte in annexe["geometries"].items()} if annexe else {}
+        actuelles = {}
+        modifies = set()
+        for fid, geometry in self._geometries(QgsFeatureRequest(), feedback):
+            actuelles[fid] = empreinte_geometrie(geometry)
+            if connues.get(fid) != actuelles[fid]:
+                modifies.add(fid)
+        if feedback is not None and feedback.isCanceled():
+            return None
+        supprimes = set(connues) - set(actuelles)
+
+        for fid in actuelles:
+            graphe.ajouter_noeud(fid)
+        if not connues or len(modifies) > PROPORTION_RECONSTRUCTION * max(len(actuelles), 1):
+            construire_graphe(self._geometries(QgsFeatureRequest()), self.tolerance, graphe, feedback)
+        else:
+            self._lire_aretes(annexe["aretes"], graphe)
+            self._mettre_a_jour(graphe, modifies, supprimes)
+        if feedback is not None and feedback.isCanceled():
+            return None
+
+        ecrire_annexe(self.chemin, {
+            "version": VERSION_ADJACENCE,
+            "empreinte": self.empreinte,
+            "tolerance": self.tolerance,
+            "geometries": actuelles,
+            "aretes": [[a, b, longueur] for a, b, longueur in graphe.aretes()],
+        })
+        return graphe
+
+    @staticmethod
+    def _lire_aretes(aretes, graphe):
+        for a, b, longueur in aretes:
+            if a in graphe.voisins and b in graphe.voisins:
+                graphe.ajouter_arete(a, b, longueur or 0.0)
+
+    def _geometries(self, request, feedback=None):
+        # Le feedback n'interrompt que la lecture : la progression est celle du regroupement
+        request.setNoAttributes()
+        if feedback is not None:
+            request.setFeedback(feedback)
+        return ((f.id(), f.geometry()) for f in self.source_fournisseur.getFeatures(request))
+
+    def _mettre_a_jour(self, graphe, modifies, supprimes):
+        """
+        Recalcule les arêtes des parcelles modifiées avec leurs voisines candidates
+        (emprise commune).
+        """
+        for fid in modifies | supprimes:
+            graphe.retirer_noeud(fid)
+        for fid in modifies:
+            graphe.ajouter_noeud(fid)
+        if not modifies:
+            return
+
+        geometries = dict(self._geometries(QgsFeatureRequest().setFilterFids(list(modifies))))
+        for geom in list(geometries.values()):
+            if geom is None or geom.isEmpty():
+                continue
+            request = QgsFeatureRequest().setFilterRect(geom.boundingBox())
+            for fid, voisine in self._geometries(request):
+                geometries.setdefault(fid, voisine)
+
+        local = construire_graphe(geometries.items(), self.tolerance)
+        for a, b, longueur in local.aretes():
+            if a in modifies or b in modifies:
+                graphe.ajouter_arete(a, b, longueur)
+
+
+def preparer_graphe(layer):
+    """
+    GrapheAdjacencePersistant de la couche (thread principal), ou None si la couche
+    n'est pas stockée dans un fichier ou si des géométries sont en cours de modification.
+    """
+    buffer = layer.editBuffer() if layer.isEditable() else None
+    if buffer is not None and (buffer.changedGeometries() or buffer.addedFeatures() or buffer.deletedFeatureIds()):
+        return None
+    persistant = GrapheAdjacencePersistant(layer)
+    return persistant if persistant.est_disponible() else None
+
+
+def charger_graphe(persistant, feedback=None):
+    """Charge le graphe préparé (thread quelconque), None si indisponible ou annulé."""
+    if persistant is None:
+        return None
+    try:
+        return persistant.charger(feedback)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        log_warning(f"⚠️ Graphe d'adjacence non disponible ({e}), calcul direct.")
+        return None
+
+
+def graphe_couche(layer):
+    """
+    Graphe de contiguïté persistant de la couche, ou None si la couche n'est pas
+    stockée dans un fichier ou si des géométries sont en cours de modification (non validées).
+    """
+    return charger_graphe(preparer_graphe(layer))
@@ -2,25 +2,28 @@ from qgis.PyQt.QtWidgets import QDialog, QMessageBox
 from .create_polygon_dialog import Ui_createPolygonDialog
 
 from qgis.core import (
-    QgsProject,
     QgsFeatureRequest,
-    QgsGeometry,
     Qgis,
     QgsVectorLayer,
     QgsMessageLog,
     QgsWkbTypes,
-    QgsCoordinateReferenceSystem,
-    QgsCoordinateTransform,
 )
 from qgis.utils import iface
 
+from .acces_parcelles import lire_parcelle, modifier_parcelle
+from .subdivision import identifiant_parcelle
+from .surfaces import MesureSurface, valeurs_surface
+
 
 class InfosPolygonManager:
-    def __init__(self, ui, dialog):
+    def __init__(self, ui, dialog, localisation):
         self.ui = ui
         self.dialog = dialog  # Ce sera maintenant un CreatePolygonDialog
         self.layer = None
 
+        # Fonction couche -> service de localisation (LocalisationParcelles) partagé avec la fenêtre principale
+        self.localisation = localisation
+
         # Connexions pour activer/désactiver le bouton en fonction des champs obligatoires
         self.ui.lineSection.textChanged.connect(self.update_validate_button_state)
         self.ui.lineNumero.textChanged.connect(self.update_validate_button_state)
@@ -104,7 +107,7 @@ class InfosPolygonManager:
         # Ouvrir la fenêtre avec la géométrie de la feature ajoutée
         self.open_dialog_from_geometry(feat.geometry(), self.layer, fid)
 
-    def open_dialog_from_geometry(self, geom, layer, fid_enfant):
+    def open_dialog_from_geometry(self, geom, layer, fid_enfant, parent_feature=None):
         self.layer = layer
 
         if not layer or not isinstance(layer, QgsVectorLayer):
@@ -113,20 +116,14 @@ class InfosPolygonManager:
         if layer.geometryType() != QgsWkbTypes.PolygonGeometry:
             return
 
-        # Trouver la géométrie contenant le nouveau polygone (i.e. la parcelle mère)
-        parent_feature = None
-        min_distance = float('inf')
-
-        for f in layer.getFeatures():
-            if f.id() == fid_enfant:
-                continue
-            if f.geometry().intersects(geom):
-                dist = f.geometry().distance(geom.centroid())
-                if dist < min_distance:
-                    min_distance = dist
-                    parent_feature = f
+        # Trouver la géométrie contenant le nouveau polygone (i.e. la parcelle mère),
+        # sauf si l'appelant l'a déjà résolue
+        if parent_feature is None:
+            parent_fid = self.localisation(layer).parcelle_mere(geom, exclure=fid_enfant)
+            if parent_fid is not None:
+                parent_feature = lire_parcelle(layer, parent_fid)
 
-        if not parent_feature:
+        if not parent_feature or not parent_feature.isValid():
             QgsMessageLog.logMessage("❌ Aucun parent trouvé pour le trou", "gestion_forestiere", Qgis.Warning)
             return
 
@@ -146,26 +143,17 @@ class InfosPolygonManager:
         self.indice_parc = parent_feature['indice_parc'] if 'indice_parc' in parent_feature.fields().names() and \
                                                             parent_feature['indice_parc'] else ''
 
-        # Formatage uniquement pour l’ID
-        numero_id = str(self.numero).zfill(4)  # Ajoute des zéros à gauche uniquement pour l’ID
+        # Construction de l’ID unique (même format que la subdivision par lot)
+        parc_id = identifiant_parcelle(self.commune, self.prefixe, self.section, self.numero, self.indice_parc)
 
-        # Construction de l’ID unique avec "0" si section a une seule lettre
-        section_str = str(self.section)
-        zero = "0" if len(section_str) == 1 else ""
-        parc_id = f"{self.commune}{self.prefixe}{zero}{self.section}{numero_id}{self.indice_parc}"
-
-        # Calcul de surface en ares avec reprojection vers un CRS métrique
+        # Calcul de surface en ares dans le CRS métrique (transformation en cache par CRS)
         surface_ares = 0.0
-        try:
-            crs_metre = QgsCoordinateReferenceSystem("EPSG:2154")
-            transformer = QgsCoordinateTransform(layer.crs(), crs_metre, QgsProject.instance())
-            geom_proj = QgsGeometry(geom)
-            geom_proj.transform(transformer)
-            surface_m2 = geom_proj.area()
-            surface_ares = round(surface_m2 / 100, 2)
+        surface_m2 = MesureSurface(layer.crs()).surface_m2(geom)
+        if surface_m2 is not None:
+            surface_ares = valeurs_surface(surface_m2)["SURFACE"]
             self.surface_m2 = surface_m2  # On mémorise la valeur en m² pour la réutiliser
-        except Exception as e:
-            QgsMessageLog.logMessage(f"⚠️ Erreur lors du calcul de surface : {e}", "gestion_forestiere", Qgis.Warning)
+        else:
+            QgsMessageLog.logMessage("⚠️ Erreur lors du calcul de surface", "gestion_forestiere", Qgis.Warning)
 
         # Remplissage du formulaire
         self.ui.lineSection.setText(str(self.section))
@@ -206,11 +194,8 @@ class InfosPolygonManager:
             QMessageBox.warning(self.dialog, "Erreur", "Le champ 'Indice' est obligatoire.")
             return
 
-        # Reconstruire parc_id ici avec la valeur actuelle de indice (et numéro formaté si besoin)
-        numero_id = str(self.numero).zfill(4)  # ou adapte selon ta logique de padding
-        # Construire l'ID complet
-        zero = "0" if len(self.section) == 1 else ""
-        parc_id = f"{self.commune}{self.prefixe}{zero}{self.section}{numero_id}{indice}"
+        # Reconstruire parc_id ici avec la valeur actuelle de indice
+        parc_id = identifiant_parcelle(self.commune, self.prefixe, self.section, self.numero, indice)
 
         # Enregistrement
         self.update_feature_attributes(self.section, self.numero, indice, parc_id, possession)
@@ -229,25 +214,22 @@ class InfosPolygonManager:
         if not self.layer or not self.layer.isEditable():
             self.layer.startEditing()
 
-        feature_request = QgsFeatureRequest(fid)
-        feature = next(self.layer.getFeatures(feature_request), None)
+        feature = lire_parcelle(self.layer, fid, [])
 
-        if feature is None:
+        if not feature.isValid():
             QMessageBox.warning(self.dialog, "Erreur", f"Entité {fid} introuvable.")
             return
 
-        # Mise à jour des champs
-        feature['section'] = section
-        feature['numero'] = numero
-        feature['indice_parc'] = indice
-        feature['id'] = parc_id
-        feature['Possession'] = possession
-        if 'contenance' in self.layer.fields().names():
-            feature['contenance'] = round(self.surface_m2, 0)
-        if 'SURFACE' in self.layer.fields().names():
-            surface_ares = round(self.surface_m2 / 100, 2)
-            feature['SURFACE'] = surface_ares
+        # Mise à jour des champs (contenance et SURFACE ignorés s'ils sont absents)
+        valeurs = {
+            'section': section,
+            'numero': numero,
+            'indice_parc': indice,
+            'id': parc_id,
+            'Possession': possession,
+            **valeurs_surface(self.surface_m2),
+        }
 
         # Appliquer les modifications
-        self.layer.updateFeature(feature)
+        modifier_parcelle(self.layer, fid, valeurs)
         self.layer.triggerRepaint()
@@ -0,0 +1,272 @@
+# localisation_parcelles.py
+# Recherche de la parcelle sous un clic : index spatial de la couche (avec ses
+# géométries) construit en tâche de fond, géométries préparées gardées en cache,
+# test exact point dans polygone. L'index suit les modifications de géométrie de
+# la couche sans être reconstruit. Sert aussi à retrouver la parcelle mère d'un
+# polygone dessiné (trou, sous-parcelle).
+
+from collections import OrderedDict
+
+from qgis.PyQt.QtCore import QObject
+from qgis.core import (
+    QgsApplication,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsFeedback,
+    QgsGeometry,
+    QgsPointXY,
+    QgsRectangle,
+    QgsSpatialIndex,
+    QgsTask,
+)
+
+from .acces_parcelles import SourceParcelles
+
+# Nombre de géométries préparées conservées (les moins récemment testées sortent)
+TAILLE_CACHE_PREPAREES = 5000
+
+
+class IndexTask(QgsTask):
+    """Construction de l'index spatial (géométries conservées) en tâche de fond."""
+
+    def __init__(self, layer):
+        super().__init__(f"Index spatial : {layer.name()}", QgsTask.CanCancel)
+        self.source = SourceParcelles(layer)
+        self.feedback = QgsFeedback()
+        self.feedback.progressChanged.connect(self.setProgress)
+        self.index = None
+
+    def cancel(self):
+        self.feedback.cancel()
+        super().cancel()
+
+    def run(self):
+        request = QgsFeatureRequest().setSubsetOfAttributes([])
+        index = QgsSpatialIndex(self.source.getFeatures(request), self.feedback,
+                                QgsSpatialIndex.FlagStoreFeatureGeometries)
+        if self.isCanceled():
+            return False
+        self.index = index
+        return True
+
+
+class LocalisationParcelles(QObject):
+    """
+    Service de localisation des parcelles d'une couche.
+
+    parcelle_au_point() résout un point (coordonnées de la couche) en au plus une
+    parcelle : celle qui contient le point ou dont le contour le touche ; si
+    plusieurs conviennent (sommet partagé, sous-parcelle), la plus petite, puis
+    le plus petit fid. parcelle_mere() résout de même un polygone en sa parcelle
+    mère. Tant que l'index n'est pas prêt, la recherche passe par la couche
+    (filtre rectangle + test exact).
+    """
+
+    def __init__(self, layer, parent=None):
+        super().__init__(parent)
+        self.layer = layer
+        self.index = None
+        self.task = None
+        self.a_reconstruire = False
+        self.fids_provisoires = set()
+        self.preparees = OrderedDict()
+
+        self.layer.geometryChanged.connect(self.on_geometry_changed)
+        self.layer.featureAdded.connect(self.on_feature_added)
+        self.layer.featureDeleted.connect(self.on_feature_deleted)
+        self.layer.committedFeaturesAdded.connect(self.on_committed_features_added)
+        self.layer.afterRollBack.connect(self.reconstruire)
+        self.layer.subsetStringChanged.connect(self.reconstruire)
+
+        self.reconstruire()
+
+    def deconnecter(self):
+        """Déconnecte les signaux de la couche et abandonne la construction en cours."""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        for signal, slot in (
+            (self.layer.geometryChanged, self.on_geometry_changed),
+            (self.layer.featureAdded, self.on_feature_added),
+            (self.layer.featureDeleted, self.on_feature_deleted),
+            (self.layer.committedFeaturesAdded, self.on_committed_features_added),
+            (self.layer.afterRollBack, self.reconstruire),
+            (self.layer.subsetStringChanged, self.reconstruire),
+        ):
+            try:
+                signal.disconnect(slot)
+            except (TypeError, RuntimeError):
+                pass
+
+    # --- Construction de l'index ---
+
+    def reconstruire(self):
+        """(Re)construit l'index en tâche de fond ; les recherches passent par la couche en attendant."""
+        self.preparees.clear()
+        self.fids_provisoires.clear()
+        if self.task is not None:
+            # Construction déjà en cours : relancée à sa fin
+            self.a_reconstruire = True
+            return
+        self.index = None
+        self.a_reconstruire = False
+        self.task = IndexTask(self.layer)
+        self.task.taskCompleted.connect(self.on_index_construit)
+        self.task.taskTerminated.connect(self.on_index_abandonne)
+        QgsApplication.taskManager().addTask(self.task)
+
+    def on_index_construit(self):
+        task, self.task = self.task, None
+        if self.a_reconstruire:
+            self.reconstruire()
+        elif task is not None:
+            self.index = task.index
+
+    def on_index_abandonne(self):
+        self.task = None
+        if self.a_reconstruire:
+            self.reconstruire()
+
+    def pret(self):
+        return self.index is not None
+
+    # --- Mises à jour incrémentales ---
+
+    def _retirer(self, fid):
+        self.preparees.pop(fid, None)
+        geometry = self.index.geometry(fid)
+        if geometry is None or geometry.isNull():
+            return
+        ancienne = QgsFeature(fid)
+        ancienne.setGeometry(geometry)
+        self.index.deleteFeature(ancienne)
+
+    def _ajouter(self, fid, geometry):
+        if geometry is None or geometry.isNull():
+            return
+        feature = QgsFeature(fid)
+        feature.setGeometry(geometry)
+        self.index.addFeature(feature)
+
+    def _en_construction(self):
+        """Pendant la construction, une modification impose de reconstruire à la fin."""
+        if self.task is not None:
+            self.a_reconstruire = True
+            return True
+        return self.index is None
+
+    def on_geometry_changed(self, fid, geometry):
+        self.preparees.pop(fid, None)
+        if self._en_construction():
+            return
+        self._retirer(fid)
+        self._ajouter(fid, geometry)
+
+    def on_feature_added(self, fid):
+        if self._en_construction():
+            return
+        feature = self.layer.getFeature(fid)
+        self._ajouter(fid, feature.geometry())
+        if fid < 0:
+            self.fids_provisoires.add(fid)
+
+    def on_feature_deleted(self, fid):
+        self.preparees.pop(fid, None)
+        if self._en_construction():
+            return
+        self._retirer(fid)
+        self.fids_provisoires.discard(fid)
+
+    def ajouter_parcelle(self, fid, geometry):
+        """Entité écrite directement dans le fournisseur (sans signal de la couche)."""
+        if self._en_construction():
+            return
+        self._ajouter(fid, geometry)
+
+    def on_committed_features_added(self, layer_id, features):
+        # Après enregistrement, les entités ajoutées (fid provisoires négatifs) reçoivent leur fid définitif
+        for feature in features:
+            self.preparees.pop(feature.id(), None)
+        if self._en_construction():
+            return
+        for fid in self.fids_provisoires:
+            self._retirer(fid)
+        self.fids_provisoires.clear()
+        for feature in features:
+            self._ajouter(feature.id(), feature.geometry())
+
+    # --- Recherche ---
+
+    def _preparee(self, fid, geometry):
+        """(moteur GEOS préparé, surface) de la parcelle, gardés en cache."""
+        preparee = self.preparees.get(fid)
+        if preparee is not None:
+            self.preparees.move_to_end(fid)
+            return preparee
+        moteur = QgsGeometry.createGeometryEngine(geometry.constGet())
+        moteur.prepareGeometry()
+        # La géométrie est conservée avec le moteur qui la référence
+        preparee = (moteur, geometry.area(), geometry)
+        self.preparees[fid] = preparee
+        if len(self.preparees) > TAILLE_CACHE_PREPAREES:
+            self.preparees.popitem(last=False)
+        return preparee
+
+    def _candidats(self, rectangle):
+        """(fid, géométrie) dont l'emprise intersecte `rectangle`."""
+        if self.index is not None:
+            for fid in self.index.intersects(rectangle):
+                yield fid, self.index.geometry(fid)
+            return
+        request = QgsFeatureRequest().setFilterRect(rectangle).setSubsetOfAttributes([])
+        for feature in self.layer.getFeatures(request):
+            yield feature.id(), feature.geometry()
+
+    def parcelle_au_point(self, point):
+        """fid de la parcelle sous `point` (QgsPointXY, CRS de la couche), ou None."""
+        point = QgsPointXY(point)
+        rectangle = QgsRectangle(point.x(), point.y(), point.x(), point.y())
+        point_geom = QgsGeometry.fromPointXY(point)
+
+        meilleur = None
+        for fid, geometry in self._candidats(rectangle):
+            if geometry is None or geometry.isNull():
+                continue
+            moteur, surface, _ = self._preparee(fid, geometry)
+            if not moteur.intersects(point_geom.constGet()):
+                continue
+            if meilleur is None or (surface, fid) < meilleur:
+                meilleur = (surface, fid)
+
+        return meilleur[1] if meilleur is not None else None
+
+    def parcelle_mere(self, geometry, exclure=None):
+        """
+        fid de la parcelle mère du polygone `geometry` (CRS de la couche), ou None.
+
+        La mère est la plus petite parcelle qui contient un point intérieur du
+        polygone ; à défaut, parmi celles qui le touchent, la plus proche de son
+        centroïde. `exclure` : fid du polygone lui-même s'il est déjà dans la couche.
+        """
+        if geometry is None or geometry.isNull():
+            return None
+        interieur = geometry.pointOnSurface()
+        centroide = geometry.centroid()
+
+        contenant = None
+        proche = None
+        for fid, candidate in self._candidats(geometry.boundingBox()):
+            if fid == exclure or candidate is None or candidate.isNull():
+                continue
+            moteur, surface, candidate = self._preparee(fid, candidate)
+            if moteur.contains(interieur.constGet()):
+                if contenant is None or (surface, fid) < contenant:
+                    contenant = (surface, fid)
+            elif contenant is None and moteur.intersects(geometry.constGet()):
+                distance = candidate.distance(centroide)
+                if proche is None or (distance, fid) < proche:
+                    proche = (distance, fid)
+
+        if contenant is not None:
+            return contenant[1]
+        return proche[1] if proche is not None else None
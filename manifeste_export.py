@@ -0,0 +1,164 @@
+# manifeste_export.py
+# Manifeste du dernier export d'une couche, rangé dans le profil QGIS : date
+# `updated` la plus récente exportée (filigrane) et empreinte du contenu exporté
+# de chaque parcelle. L'export incrémental compare la couche à ce manifeste, sans
+# jamais relire le fichier précédent, et n'écrit que les parcelles ajoutées,
+# modifiées ou supprimées depuis.
+
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from PyQt5.QtCore import QDate
+from qgis.core import QgsFeature
+
+from .utils import get_plugin_profile_dir, log_warning
+
+DOSSIER_MANIFESTES = "exports"
+
+# Colonne ajoutée en tête de l'export incrémental et ses valeurs
+COLONNE_CHANGEMENT = "Changement"
+AJOUTEE = "ajoutée"
+MODIFIEE = "modifiée"
+SUPPRIMEE = "supprimée"
+
+# Date de mise à jour cadastrale (CHAMPS_A_CREER) servant de filigrane
+CHAMP_DATE = "updated"
+
+# Champs conservés dans le manifeste pour identifier une parcelle supprimée
+CHAMPS_IDENTIFIANTS = ["section", "numero", "indice_parc"]
+
+
+def chemin_manifeste(layer):
+    """Fichier du manifeste de la couche (un par source de données)."""
+    dossier = os.path.join(get_plugin_profile_dir(), DOSSIER_MANIFESTES)
+    os.makedirs(dossier, exist_ok=True)
+    cle = hashlib.sha1(layer.source().encode("utf-8")).hexdigest()
+    return os.path.join(dossier, f"manifeste_{cle}.json")
+
+
+def lire_manifeste(chemin):
+    """Manifeste enregistré, ou None s'il n'y a pas encore eu d'export."""
+    try:
+        with open(chemin, "r", encoding="utf-8") as fichier:
+            return json.load(fichier)
+    except (OSError, ValueError):
+        return None
+
+
+def ecrire_manifeste(chemin, manifeste):
+    # Écriture dans un fichier temporaire puis remplacement : jamais de manifeste tronqué
+    temporaire = f"{chemin}.tmp"
+    try:
+        with open(temporaire, "w", encoding="utf-8") as fichier:
+            json.dump(manifeste, fichier, ensure_ascii=False)
+        os.replace(temporaire, chemin)
+    except OSError as e:
+        log_warning(f"⚠️ Manifeste d'export non enregistré : {e}")
+
+
+def date_iso(valeur):
+    """Date `updated` en texte AAAA-MM-JJ (comparable), None si vide."""
+    if isinstance(valeur, QDate):
+        return valeur.toString("yyyy-MM-dd") if valeur.isValid() else None
+    if valeur is None:
+        return None
+    texte = str(valeur).strip()
+    return None if not texte or texte.upper() == "NULL" else texte[:10]
+
+
+def valeur_identifiant(valeur):
+    """Identifiant en type JSON natif (entier, réel, texte) ; None si NULL."""
+    if valeur is None or str(valeur).upper() == "NULL":
+        return None
+    if isinstance(valeur, (bool, int, float, str)):
+        return valeur
+    if isinstance(valeur, QDate):
+        return valeur.toString("yyyy-MM-dd")
+    return str(valeur)
+
+
+def empreinte_parcelle(valeurs):
+    """Empreinte courte des valeurs exportées d'une parcelle."""
+    return hashlib.sha1("\x1f".join(valeurs).encode("utf-8")).hexdigest()[:16]
+
+
+class SuiviExport:
+    """
+    Compare chaque parcelle exportée au manifeste précédent et construit le
+    nouveau manifeste au fil de la lecture.
+
+    Une parcelle est modifiée si l'empreinte de ses valeurs exportées a changé
+    ou si sa date `updated` est postérieure au filigrane du dernier export.
+    Les empreintes ne sont comparables qu'à sélection de champs identique.
+    """
+
+    def __init__(self, layer, export_fields, precedent=None):
+        self.export_fields = export_fields
+        fields = layer.fields()
+        self.fields = fields
+        self.idx_date = fields.indexFromName(CHAMP_DATE)
+        self.identifiants = [(nom, fields.indexFromName(nom)) for nom in CHAMPS_IDENTIFIANTS
+                             if fields.indexFromName(nom) >= 0]
+        precedent = precedent or {}
+        self.parcelles_precedentes = precedent.get("parcelles", {})
+        self.filigrane_precedent = precedent.get("filigrane")
+        self.parcelles = {}
+        self.filigrane = None
+
+    def champs_lus(self):
+        """Champs à lire en plus des champs exportés."""
+        return [CHAMP_DATE] + [nom for nom, _ in self.identifiants]
+
+    def changement(self, feature, valeurs):
+        """
+        Enregistre la parcelle (valeurs exportées) et retourne AJOUTEE, MODIFIEE
+        ou None si elle est inchangée depuis le dernier export.
+        """
+        attributs = feature.attributes()
+        cle = str(feature.id())
+        empreinte = empreinte_parcelle(valeurs)
+        self.parcelles[cle] = [empreinte, [valeur_identifiant(attributs[idx]) for _, idx in self.identifiants]]
+
+        date = date_iso(attributs[self.idx_date]) if self.idx_date >= 0 else None
+        if date is not None and (self.filigrane is None or date > self.filigrane):
+            self.filigrane = date
+
+        precedente = self.parcelles_precedentes.get(cle)
+        if precedente is None:
+            return AJOUTEE
+        if precedente[0] != empreinte:
+            return MODIFIEE
+        if date is not None and self.filigrane_precedent is not None and date > self.filigrane_precedent:
+            return MODIFIEE
+        return None
+
+    def supprimees(self):
+        """
+        Parcelles du dernier export absentes de celui-ci (supprimées ou plus
+        possédées) : entités sans géométrie portant leurs seuls identifiants,
+        convertis au type de leur champ (NULL s'ils ne sont pas convertibles).
+        """
+        for cle, (_, identifiants) in self.parcelles_precedentes.items():
+            if cle in self.parcelles:
+                continue
+            feature = QgsFeature(self.fields)
+            for (nom, idx), valeur in zip(self.identifiants, identifiants):
+                # Manifestes antérieurs : identifiants en texte, "NULL" compris
+                valeur = valeur_identifiant(valeur)
+                if valeur is None:
+                    continue
+                try:
+                    feature[nom] = self.fields.at(idx).convertCompatible(valeur)
+                except ValueError:
+                    pass
+            yield feature
+
+    def manifeste(self):
+        return {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "champs": self.export_fields,
+            "filigrane": self.filigrane,
+            "parcelles": self.parcelles,
+        }
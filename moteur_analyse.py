@@ -0,0 +1,254 @@
+# moteur_analyse.py
+# Moteur d'analyse en une seule passe : chaque entité de la couche est lue une fois
+# et transmise à une liste d'accumulateurs (un par résultat de l'onglet Analyses).
+
+from qgis.core import QgsFeatureRequest
+
+from .Analyse import (
+    convertir_surface_ha,
+    formater_repartition_types,
+    formater_repartition_essences,
+    formater_regroupements,
+)
+from .acces_parcelles import parcourir
+from .contiguite import construire_graphe, grouper, tolerance_pour_couche, TOLERANCE_METRIQUE
+
+
+def _surface(feature):
+    """Lecture de SURFACE en float (0 si vide ou invalide)."""
+    try:
+        return float(feature["SURFACE"])
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _est_parcelle_mere(feature):
+    """True si indice_parc n'est pas défini (parcelle cadastrale, pas une subdivision)."""
+    return feature["indice_parc"] in (None, "", 0)
+
+
+class Accumulateur:
+    """
+    Classe de base d'un accumulateur branché sur le moteur d'analyse.
+
+    cle : clé du résultat dans le dictionnaire `results`
+    champs : champs attributaires nécessaires à l'accumulateur
+    geometrie : True si l'accumulateur a besoin des géométries
+    """
+    cle = None
+    champs = ()
+    geometrie = False
+
+    def ajouter(self, feature):
+        raise NotImplementedError
+
+    def resultat(self):
+        raise NotImplementedError
+
+    def agregats(self):
+        """Valeurs brutes ajoutées à `results` à côté du résultat (aucune par défaut)."""
+        return {}
+
+
+class AccumulateurSurfaceForestiere(Accumulateur):
+    """Équivalent de calcul_surface_forestiere."""
+    cle = "surface_forestiere"
+    champs = ("Possession", "typeParc", "SURFACE", "indice_parc")
+
+    def __init__(self):
+        self.total_surface_m2 = 0
+
+    def ajouter(self, feature):
+        if not _est_parcelle_mere(feature):
+            return
+        if feature["Possession"] and feature["typeParc"] != 1:
+            self.total_surface_m2 += _surface(feature) * 100
+
+    def resultat(self):
+        return convertir_surface_ha(self.total_surface_m2)
+
+
+class AccumulateurSurfaceFriche(Accumulateur):
+    """Équivalent de calcul_surface_friche."""
+    cle = "surface_friche"
+    champs = ("Possession", "typeParc", "SURFACE", "indice_parc")
+
+    def __init__(self, types_friche=(8, 9, 14)):
+        self.types_friche = types_friche
+        self.total_surface_m2 = 0
+
+    def ajouter(self, feature):
+        if not _est_parcelle_mere(feature):
+            return
+        if feature["Possession"] and feature["typeParc"] in self.types_friche:
+            self.total_surface_m2 += _surface(feature) * 100
+
+    def resultat(self):
+        return convertir_surface_ha(self.total_surface_m2)
+
+
+class AccumulateurParcellesPossedees(Accumulateur):
+    """Équivalent de compter_parcelles_possedees."""
+    cle = "nb_parcelles"
+    champs = ("Possession",)
+
+    def __init__(self):
+        self.total = 0
+
+    def ajouter(self, feature):
+        if feature["Possession"]:
+            self.total += 1
+
+    def resultat(self):
+        return self.total
+
+
+class AccumulateurTypesParcelles(Accumulateur):
+    """Équivalent de analyse_types_parcelles (histogramme des surfaces par typeParc)."""
+    cle = "types_parcelles"
+    champs = ("typeParc", "SURFACE")
+
+    def __init__(self, type_parc_min=2, type_parc_max=14, top_n=5):
+        self.type_parc_min = type_parc_min
+        self.type_parc_max = type_parc_max
+        self.top_n = top_n
+        self.surfaces_par_type = {}
+        self.total_surface_m2 = 0.0
+
+    def ajouter(self, feature):
+        type_parc = feature["typeParc"]
+        if self.type_parc_min <= type_parc <= self.type_parc_max:
+            surface = _surface(feature)
+            self.total_surface_m2 += surface
+            self.surfaces_par_type[type_parc] = self.surfaces_par_type.get(type_parc, 0.0) + surface
+
+    def resultat(self):
+        return formater_repartition_types(self.surfaces_par_type, self.total_surface_m2, self.top_n)
+
+    def agregats(self):
+        return {"surfaces_par_type": dict(self.surfaces_par_type), "total_types": self.total_surface_m2}
+
+
+class AccumulateurEssences(Accumulateur):
+    """Équivalent de analyse_types_essences (surfaces pondérées par Tx1..Tx4)."""
+    cle = "types_essences"
+    champs = ("SURFACE",) + tuple(f"plant{i}" for i in range(1, 5)) + tuple(f"Tx{i}" for i in range(1, 5))
+
+    def __init__(self, top_n=5):
+        self.top_n = top_n
+        self.surfaces_par_essence = {}
+        self.total_surface_m2 = 0.0
+
+    def ajouter(self, feature):
+        surface = _surface(feature)
+        for i in range(1, 5):
+            nom_essence = feature[f"plant{i}"]
+            if nom_essence is None or nom_essence == "":
+                continue
+
+            try:
+                poids = (float(feature[f"Tx{i}"]) / 100.0) * surface
+            except (TypeError, ValueError, ZeroDivisionError):
+                poids = 0.0
+
+            self.total_surface_m2 += poids
+            self.surfaces_par_essence[nom_essence] = self.surfaces_par_essence.get(nom_essence, 0.0) + poids
+
+    def resultat(self):
+        return formater_repartition_essences(self.surfaces_par_essence, self.total_surface_m2, self.top_n)
+
+
+class AccumulateurPlantation(Accumulateur):
+    """Équivalent de total_plantation."""
+    cle = "total_plants"
+    champs = ("totalplants",)
+
+    def __init__(self):
+        self.total_plants = 0
+
+    def ajouter(self, feature):
+        plants = feature["totalplants"]
+        if plants is not None and plants != "":
+            try:
+                self.total_plants += int(plants)
+            except (TypeError, ValueError):
+                pass
+
+    def resultat(self):
+        return self.total_plants
+
+
+class AccumulateurRegroupement(Accumulateur):
+    """
+    Équivalent de calcul_regroupement : seules les parcelles possédées sont
+    conservées (avec leur géométrie) pendant la passe, le graphe de contiguïté
+    et les groupes (union-find) sont construits à la fin sur ce sous-ensemble.
+    """
+    cle = "regroupement"
+    champs = ("Possession", "contenance", "section", "numero")
+    geometrie = True
+
+    def __init__(self, nb_groupes=3, tolerance=TOLERANCE_METRIQUE):
+        self.nb_groupes = nb_groupes
+        self.tolerance = tolerance
+        self.geometries = {}
+        self.attributs = {}
+
+    def ajouter(self, feature):
+        if not feature["Possession"]:
+            return
+        self.geometries[feature.id()] = feature.geometry()
+        self.attributs[feature.id()] = (feature["contenance"], feature["section"], feature["numero"])
+
+    def resultat(self):
+        graphe = construire_graphe(self.geometries.items(), self.tolerance)
+        contenances = {fid: attr[0] for fid, attr in self.attributs.items()}
+        groupes = grouper(graphe, self.geometries.keys(), contenances)
+        return formater_regroupements(groupes, self.attributs, self.nb_groupes)
+
+
+def analyses_par_defaut(type_parc_min=2, type_parc_max=14, top_n=5, tolerance=TOLERANCE_METRIQUE):
+    """Accumulateurs correspondant aux sept analyses de l'onglet Analyses."""
+    return [
+        AccumulateurSurfaceForestiere(),
+        AccumulateurSurfaceFriche(),
+        AccumulateurParcellesPossedees(),
+        AccumulateurTypesParcelles(type_parc_min, type_parc_max, top_n),
+        AccumulateurEssences(top_n),
+        AccumulateurPlantation(),
+        AccumulateurRegroupement(tolerance=tolerance),
+    ]
+
+
+def executer_analyses(layer, accumulateurs=None, feedback=None):
+    """
+    Lit chaque entité de la couche une seule fois et alimente tous les accumulateurs.
+    Seuls les champs demandés sont lus, et la géométrie n'est chargée que si
+    un accumulateur en a besoin.
+
+    Retourne le dictionnaire {cle: resultat} attendu par l'onglet Analyses.
+    feedback : QgsFeedback optionnel (progression, annulation)
+    """
+    if accumulateurs is None:
+        accumulateurs = analyses_par_defaut(tolerance=tolerance_pour_couche(layer))
+
+    champs = []
+    for acc in accumulateurs:
+        for nom in acc.champs:
+            if nom not in champs:
+                champs.append(nom)
+
+    request = QgsFeatureRequest()
+    request.setSubsetOfAttributes(champs, layer.fields())
+    if not any(acc.geometrie for acc in accumulateurs):
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+
+    for feature in parcourir(layer, request, feedback):
+        for acc in accumulateurs:
+            acc.ajouter(feature)
+
+    results = {}
+    for acc in accumulateurs:
+        results[acc.cle] = acc.resultat()
+        results.update(acc.agregats())
+    return results
@@ -6,6 +6,8 @@ from qgis.core import QgsProject, QgsVectorLayer, QgsField
 from PyQt5.QtCore import QVariant, Qt, QCoreApplication
 import os
 
+from .acces_parcelles import lire_parcelles
+
 CHAMPS_A_CREER = [
             ("section", "String"),
             ("numero", "String"),
@@ -95,6 +97,53 @@ TYPE_MAPPING = {
 }
 
 
+def champs_manquants(layer):
+    """
+    Champs de CHAMPS_A_CREER absents de la couche (liste de QgsField).
+    Lève KeyError si un type n'est pas reconnu dans TYPE_MAPPING.
+    """
+    noms_existants = {f.name() for f in layer.fields()}
+    return [
+        QgsField(nom, TYPE_MAPPING[typ])
+        for nom, typ in CHAMPS_A_CREER
+        if nom not in noms_existants
+    ]
+
+
+def creer_champs_manquants(layer, champs):
+    """
+    Ajoute les champs à la couche puis recopie contenance / 100 dans SURFACE
+    si la contenance existait déjà. Retourne True si tout est enregistré.
+    """
+    noms_existants = {f.name() for f in layer.fields()}
+
+    # Démarre la modification de la couche
+    layer.startEditing()
+    success = layer.dataProvider().addAttributes(champs)
+    if not success:
+        layer.rollBack()
+        return False
+
+    layer.updateFields()
+
+    # Copier les valeurs du champ 'contenance' vers le champ 'SURFACE'
+    if "contenance" in noms_existants and "SURFACE" in {f.name() for f in layer.fields()}:
+        idx_contenance = layer.fields().indexFromName("contenance")
+        idx_surface = layer.fields().indexFromName("SURFACE")
+
+        for feat in lire_parcelles(layer, "copie_contenance"):
+            val_contenance = feat[idx_contenance]
+            if val_contenance is not None and val_contenance != '':
+                try:
+                    val_contenance_float = float(val_contenance)
+                    val_surface = val_contenance_float / 100.0
+                    layer.changeAttributeValue(feat.id(), idx_surface, val_surface)
+                except Exception as e:
+                    print(f"Erreur conversion contenance: {e}")
+
+    return layer.commitChanges()
+
+
 class ConfigDialog(QDialog):
 
     def __init__(self, parent=None, iface=None):
@@ -235,19 +284,14 @@ class ConfigDialog(QDialog):
         # Met à jour le champ lineLayer avec le nom de la couche
         self.ui.lineLayer.setText(layer.name())
 
-        noms_existants = {f.name() for f in layer.fields()}
         try:
             # Prépare la liste des nouveaux champs à ajouter
-            champs_manquants = [
-                QgsField(nom, TYPE_MAPPING[typ])
-                for nom, typ in CHAMPS_A_CREER
-                if nom not in noms_existants
-            ]
+            champs = champs_manquants(layer)
         except KeyError as e:
             QMessageBox.critical(self, "Erreur", f"Type de champ non reconnu : {e}")
             return
 
-        if not champs_manquants:
+        if not champs:
             QMessageBox.information(self, "Information", "Tous les champs sont déjà présents.")
             return
 
@@ -258,31 +302,9 @@ class ConfigDialog(QDialog):
         progress.show()
         QApplication.processEvents()  # Forcer l'affichage immédiat
 
-        # Démarre la modification de la couche
-        layer.startEditing()
-        success = layer.dataProvider().addAttributes(champs_manquants)
-        if success:
-            layer.updateFields()
-
-            # Copier les valeurs du champ 'contenance' vers le champ 'SURFACE'
-            if "contenance" in noms_existants and "SURFACE" in {f.name() for f in layer.fields()}:
-                idx_contenance = layer.fields().indexFromName("contenance")
-                idx_surface = layer.fields().indexFromName("SURFACE")
-
-                for feat in layer.getFeatures():
-                    val_contenance = feat[idx_contenance]
-                    if val_contenance is not None and val_contenance != '':
-                        try:
-                            val_contenance_float = float(val_contenance)
-                            val_surface = val_contenance_float / 100.0
-                            layer.changeAttributeValue(feat.id(), idx_surface, val_surface)
-                        except Exception as e:
-                            print(f"Erreur conversion contenance: {e}")
-
-            layer.commitChanges()
+        if creer_champs_manquants(layer, champs):
             QMessageBox.information(self, "Succès", "Champs créés avec succès.")
         else:
-            layer.rollBack()
             QMessageBox.warning(self, "Erreur", "Échec lors de la création des champs.")
 
         progress.close()
@@ -0,0 +1,214 @@
+# session_edition.py
+# Session d'édition des attributs des parcelles : les modifications de la fenêtre de
+# saisie sont mises en tampon par entité puis enregistrées ensemble, en une seule
+# transaction (un seul commit GeoPackage), après un délai sans nouvelle saisie, au
+# changement de parcelle ou sur demande (boutons Enregistrer).
+
+from qgis.PyQt.QtCore import QDate, QDateTime, QObject, Qt, QTimer, pyqtSignal
+
+from .acces_parcelles import modifier_parcelle, requete_attributs
+
+
+def valeur_vide(valeur):
+    return valeur is None or str(valeur).strip().upper() in ("", "NULL")
+
+
+# Formats de date saisis dans la fenêtre (QDateEdit, QLineEdit)
+FORMATS_DATE = ("yyyy-MM-dd", "dd/MM/yyyy")
+
+
+def _comparable(valeur):
+    """Dates (QDate, QDateTime, date Python ou texte saisi) ramenées au texte ISO, le reste inchangé."""
+    if isinstance(valeur, QDateTime):
+        # Minuit : comparée comme une date
+        if valeur.time().msecsSinceStartOfDay():
+            return valeur.toString(Qt.ISODate)
+        valeur = valeur.date()
+    if isinstance(valeur, QDate):
+        return valeur.toString(Qt.ISODate)
+    if hasattr(valeur, "isoformat"):
+        return valeur.isoformat()
+    if isinstance(valeur, str):
+        for format_date in FORMATS_DATE:
+            date = QDate.fromString(valeur.strip(), format_date)
+            if date.isValid():
+                return date.toString(Qt.ISODate)
+    return valeur
+
+
+def valeurs_egales(a, b):
+    """
+    Égalité tolérante : NULL, None et chaîne vide sont équivalents, une date
+    enregistrée (QDate) est égale à son texte saisi (« 2024-03-01 », « 01/03/2024 »).
+    """
+    if valeur_vide(a) or valeur_vide(b):
+        return valeur_vide(a) and valeur_vide(b)
+    if a == b:
+        return True
+    a, b = _comparable(a), _comparable(b)
+    return a == b or str(a) == str(b)
+
+
+def lire_enregistrees(layer, fids, champs):
+    """
+    Valeurs enregistrées dans la source (hors tampon d'édition), en une requête :
+    {fid: {champ: valeur}}.
+    """
+    provider = layer.dataProvider()
+    fields = provider.fields()
+    champs = [nom for nom in champs if fields.indexFromName(nom) >= 0]
+    return {
+        feature.id(): {nom: feature[nom] for nom in champs}
+        for feature in provider.getFeatures(requete_attributs(provider, champs, fids=fids))
+    }
+
+
+class SessionEdition(QObject):
+    """
+    Tampon des modifications attributaires : {fid: {champ: valeur}}.
+
+    À la première modification d'un champ, sa valeur enregistrée est mémorisée.
+    À l'enregistrement, un champ dont la valeur enregistrée a changé entre-temps
+    (autre session, autre utilisateur) est un conflit : il n'est pas écrit et il
+    est signalé par `conflits`. Les autres modifications sont appliquées puis
+    validées en un seul commit ; en cas d'échec, elles sont annulées dans la
+    couche et conservées dans le tampon.
+    """
+    enregistree = pyqtSignal(int)   # nombre de parcelles enregistrées
+    echec = pyqtSignal(str)
+    conflits = pyqtSignal(list)     # [(fid, champ, valeur enregistrée, valeur saisie), ...]
+
+    DELAI_MS = 5000
+
+    def __init__(self, delai_ms=DELAI_MS, parent=None):
+        super().__init__(parent)
+        self.layer = None
+        self.modifications = {}
+        self.originales = {}
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delai_ms)
+        self.timer.timeout.connect(self.enregistrer)
+
+    def en_attente(self):
+        return bool(self.modifications)
+
+    def modifier(self, layer, fid, valeurs):
+        """
+        Met en tampon {champ: valeur} pour l'entité `fid` et relance le délai
+        d'enregistrement. Les champs absents de la couche sont ignorés et une
+        valeur identique à la valeur enregistrée n'est pas retenue.
+        """
+        if fid is not None:
+            self.modifier_groupe(layer, {fid: valeurs})
+
+    def modifier_groupe(self, layer, modifications):
+        """Comme modifier(), pour plusieurs entités : {fid: {champ: valeur}}."""
+        if layer is not self.layer:
+            # Changement de couche : la session précédente est enregistrée d'abord
+            self.enregistrer()
+            self.layer = layer
+
+        # Valeurs enregistrées des champs modifiés pour la première fois
+        a_lire = {}
+        for fid, valeurs in modifications.items():
+            originales = self.originales.setdefault(fid, {})
+            a_lire.setdefault(fid, set()).update(nom for nom in valeurs if nom not in originales)
+        fids = [fid for fid, champs in a_lire.items() if champs]
+        if fids:
+            champs = set().union(*(a_lire[fid] for fid in fids))
+            for fid, lues in lire_enregistrees(layer, fids, champs).items():
+                self.originales[fid].update({nom: lues[nom] for nom in a_lire[fid]})
+
+        for fid, valeurs in modifications.items():
+            originales = self.originales[fid]
+            tampon = self.modifications.setdefault(fid, {})
+            for nom, valeur in valeurs.items():
+                if nom not in originales:
+                    continue
+                if valeurs_egales(valeur, originales[nom]):
+                    tampon.pop(nom, None)
+                else:
+                    tampon[nom] = valeur
+            if not tampon:
+                del self.modifications[fid]
+
+        if self.modifications:
+            self.timer.start()
+
+    def annuler(self):
+        """Abandonne les modifications en tampon, sans rien écrire."""
+        self.timer.stop()
+        self.modifications = {}
+        self.originales = {}
+
+    def _conflits(self):
+        """Retire du tampon les champs modifiés entre-temps dans la source et les retourne."""
+        conflits = []
+        champs = set().union(*self.modifications.values())
+        toutes = lire_enregistrees(self.layer, list(self.modifications), champs)
+        for fid in list(self.modifications):
+            modifications = self.modifications[fid]
+            enregistrees = toutes.get(fid, {})
+            for nom in list(modifications):
+                if nom in enregistrees and not valeurs_egales(enregistrees[nom], self.originales[fid][nom]):
+                    conflits.append((fid, nom, enregistrees[nom], modifications.pop(nom)))
+            if not modifications:
+                del self.modifications[fid]
+        return conflits
+
+    def enregistrer(self):
+        """
+        Écrit le tampon en une transaction. Retourne True si tout est enregistré
+        sans conflit (ou s'il n'y avait rien à écrire).
+        """
+        self.timer.stop()
+        layer = self.layer
+        if not self.modifications or layer is None:
+            return True
+
+        conflits = self._conflits()
+        if conflits:
+            self.conflits.emit(conflits)
+        if not self.modifications:
+            self.originales = {}
+            return not conflits
+
+        deja_en_edition = layer.isEditable()
+        if not deja_en_edition and not layer.startEditing():
+            self.echec.emit("Impossible de démarrer l'édition sur la couche.")
+            return False
+
+        # Valeurs du tampon d'édition avant application, pour annuler sans perdre
+        # les modifications faites hors de la session
+        champs = set().union(*self.modifications.values())
+        avant = {
+            feature.id(): {nom: feature[nom] for nom in self.modifications[feature.id()]}
+            for feature in layer.getFeatures(requete_attributs(layer, champs, fids=list(self.modifications)))
+        }
+        # Un lot changeAttributeValues par entité, validés ensemble par un seul commit
+        ok = len(avant) == len(self.modifications)
+        if ok:
+            for fid, modifications in self.modifications.items():
+                if not modifier_parcelle(layer, fid, modifications):
+                    ok = False
+                    break
+
+        if ok and layer.commitChanges():
+            nombre = len(self.modifications)
+            self.modifications = {}
+            self.originales = {}
+            if deja_en_edition:
+                layer.startEditing()
+            self.enregistree.emit(nombre)
+            return not conflits
+
+        erreurs = "\n".join(layer.commitErrors()) if ok else "Parcelle introuvable ou modification refusée."
+        if deja_en_edition:
+            for fid, valeurs in avant.items():
+                modifier_parcelle(layer, fid, valeurs)
+        else:
+            layer.rollBack()
+        self.echec.emit(erreurs)
+        return False
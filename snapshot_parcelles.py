@@ -0,0 +1,230 @@
+# snapshot_parcelles.py
+# Photographie en colonnes (tableaux NumPy) des attributs utilisés par les analyses,
+# chargée en une seule requête sans géométrie, et versions vectorisées des analyses
+# de Analyse.py calculées sur cette photographie.
+
+from qgis.core import QgsFeatureRequest
+
+try:
+    import numpy as np
+except ImportError:  # NumPy est livré avec QGIS, mais on garde un repli possible
+    np = None
+
+from .acces_parcelles import parcourir
+from .Analyse import (
+    convertir_surface_ha,
+    formater_repartition_types,
+    formater_repartition_essences,
+    calcul_regroupement_parcelles,
+)
+
+NB_ESSENCES = 4
+
+CHAMPS_SNAPSHOT = (
+    ["SURFACE", "typeParc", "Possession", "indice_parc", "contenance", "totalplants"]
+    + [f"plant{i}" for i in range(1, NB_ESSENCES + 1)]
+    + [f"Tx{i}" for i in range(1, NB_ESSENCES + 1)]
+)
+
+
+def numpy_disponible():
+    return np is not None
+
+
+def _float_ou_nan(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _colonne_float(valeurs):
+    """Colonne numérique en float64 : les NULL et valeurs invalides deviennent NaN."""
+    return np.fromiter((_float_ou_nan(v) for v in valeurs), dtype=np.float64, count=len(valeurs))
+
+
+class SnapshotParcelles:
+    """
+    Attributs des parcelles rangés en colonnes typées.
+
+    fids : identifiants des entités (int64)
+    surface, contenance, total_plants : float64, NaN si NULL (masques *_nul)
+    type_parc : int64 (0 si NULL), masque type_parc_nul
+    possession : bool (NULL = False)
+    parcelle_mere : bool, True si indice_parc n'est pas défini
+    essences : liste des noms d'essences (dictionnaire d'encodage)
+    codes_essences : int32 (NB_ESSENCES, n), -1 si plantX vide
+    taux : float64 (NB_ESSENCES, n), NaN si TxX NULL
+    """
+
+    def __init__(self, fids, colonnes):
+        n = len(fids)
+        self.fids = np.asarray(fids, dtype=np.int64)
+
+        self.surface = _colonne_float(colonnes["SURFACE"])
+        self.surface_nul = np.isnan(self.surface)
+        self.contenance = _colonne_float(colonnes["contenance"])
+        self.contenance_nul = np.isnan(self.contenance)
+        self.total_plants = _colonne_float(colonnes["totalplants"])
+        self.total_plants_nul = np.isnan(self.total_plants)
+
+        type_parc = _colonne_float(colonnes["typeParc"])
+        self.type_parc_nul = np.isnan(type_parc)
+        self.type_parc = np.where(self.type_parc_nul, 0, type_parc).astype(np.int64)
+
+        self.possession = np.fromiter((bool(v) for v in colonnes["Possession"]), dtype=bool, count=n)
+        self.parcelle_mere = np.fromiter(
+            (v in (None, "", 0) or _est_nul(v) for v in colonnes["indice_parc"]), dtype=bool, count=n
+        )
+
+        # Encodage des essences dans l'ordre de première apparition (ligne par ligne)
+        noms = np.empty((NB_ESSENCES, n), dtype=object)
+        for i in range(NB_ESSENCES):
+            noms[i] = [None if v == "" or _est_nul(v) else v for v in colonnes[f"plant{i + 1}"]]
+        presents = np.not_equal(noms, None)
+        self.codes_essences = np.full((NB_ESSENCES, n), -1, dtype=np.int32)
+        self.essences = []
+        if presents.any():
+            # Transposées : parcours ligne par ligne, puis plant1..plantN
+            valeurs, premiers, inverse = np.unique(noms.T[presents.T], return_index=True, return_inverse=True)
+            ordre = np.argsort(premiers, kind="stable")
+            rangs = np.empty(len(ordre), dtype=np.int32)
+            rangs[ordre] = np.arange(len(ordre), dtype=np.int32)
+            self.essences = [valeurs[k] for k in ordre]
+            self.codes_essences.T[presents.T] = rangs[inverse.ravel()]
+
+        self.taux = np.vstack([
+            _colonne_float(colonnes[f"Tx{i}"]) for i in range(1, NB_ESSENCES + 1)
+        ]) if n else np.zeros((NB_ESSENCES, 0))
+
+    def __len__(self):
+        return len(self.fids)
+
+    @classmethod
+    def depuis_couche(cls, layer, feedback=None):
+        """
+        Charge la photographie en une requête : attributs utiles uniquement, sans géométrie.
+        feedback : QgsFeedback optionnel (progression, annulation)
+        """
+        fields = layer.fields()
+        champs = [nom for nom in CHAMPS_SNAPSHOT if fields.indexFromName(nom) >= 0]
+        indices = [fields.indexFromName(nom) for nom in champs]
+
+        request = QgsFeatureRequest()
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(indices)
+
+        fids = []
+        lignes = []
+        for feature in parcourir(layer, request, feedback):
+            fids.append(feature.id())
+            attributs = feature.attributes()
+            lignes.append([attributs[i] for i in indices])
+
+        n = len(fids)
+        valeurs = list(zip(*lignes)) if lignes else [() for _ in champs]
+        colonnes = {nom: [None] * n for nom in CHAMPS_SNAPSHOT}
+        for nom, colonne in zip(champs, valeurs):
+            colonnes[nom] = colonne
+        return cls(fids, colonnes)
+
+
+def _est_nul(value):
+    """True pour le NULL de QGIS (QVariant nul)."""
+    return hasattr(value, "isNull") and value.isNull()
+
+
+def _surface_m2(snapshot, masque):
+    return float(np.nansum(snapshot.surface[masque])) * 100
+
+
+def calcul_surface_forestiere_vect(snapshot):
+    masque = snapshot.possession & snapshot.parcelle_mere & (snapshot.type_parc_nul | (snapshot.type_parc != 1))
+    return convertir_surface_ha(_surface_m2(snapshot, masque))
+
+
+def calcul_surface_friche_vect(snapshot, types_friche=(8, 9, 14)):
+    masque = (
+        snapshot.possession & snapshot.parcelle_mere & ~snapshot.type_parc_nul
+        & np.isin(snapshot.type_parc, types_friche)
+    )
+    return convertir_surface_ha(_surface_m2(snapshot, masque))
+
+
+def compter_parcelles_possedees_vect(snapshot):
+    return int(np.count_nonzero(snapshot.possession))
+
+
+def surfaces_par_type_vect(snapshot, type_parc_min=2, type_parc_max=14):
+    """Histogramme {typeParc: surface}, dans l'ordre de première apparition."""
+    masque = ~snapshot.type_parc_nul & (snapshot.type_parc >= type_parc_min) & (snapshot.type_parc <= type_parc_max)
+    types = snapshot.type_parc[masque]
+    surfaces = np.nan_to_num(snapshot.surface[masque])
+    if not len(types):
+        return {}, 0.0
+
+    valeurs, premiers, inverse = np.unique(types, return_index=True, return_inverse=True)
+    sommes = np.bincount(inverse, weights=surfaces, minlength=len(valeurs))
+    ordre = np.argsort(premiers, kind="stable")
+    surfaces_par_type = {int(valeurs[k]): float(sommes[k]) for k in ordre}
+    return surfaces_par_type, float(surfaces.sum())
+
+
+def analyse_types_parcelles_vect(snapshot, type_parc_min=2, type_parc_max=14, top_n=5):
+    surfaces_par_type, total = surfaces_par_type_vect(snapshot, type_parc_min, type_parc_max)
+    return formater_repartition_types(surfaces_par_type, total, top_n)
+
+
+def surfaces_par_essence_vect(snapshot):
+    """Histogramme {essence: surface pondérée par TxX}."""
+    nb = len(snapshot.essences)
+    sommes = np.zeros(nb, dtype=np.float64)
+    surface = np.nan_to_num(snapshot.surface)
+    for i in range(NB_ESSENCES):
+        codes = snapshot.codes_essences[i]
+        present = codes >= 0
+        poids = np.nan_to_num(snapshot.taux[i][present] / 100.0 * surface[present])
+        sommes += np.bincount(codes[present], weights=poids, minlength=nb)
+    surfaces_par_essence = {nom: float(sommes[k]) for k, nom in enumerate(snapshot.essences)}
+    return surfaces_par_essence, float(sommes.sum())
+
+
+def analyse_types_essences_vect(snapshot, top_n=5):
+    surfaces_par_essence, total = surfaces_par_essence_vect(snapshot)
+    return formater_repartition_essences(surfaces_par_essence, total, top_n)
+
+
+def total_plantation_vect(snapshot):
+    return int(np.nansum(np.trunc(snapshot.total_plants)))
+
+
+def calcul_regroupement_vect(layer, snapshot, nb_groupes=3, graphe=None, feedback=None):
+    """
+    Regroupement des parcelles contiguës : la photographie fournit les parcelles
+    possédées, seules leurs géométries sont ensuite lues.
+    """
+    return calcul_regroupement_parcelles(layer, snapshot.fids[snapshot.possession].tolist(), nb_groupes,
+                                         graphe=graphe, feedback=feedback)
+
+
+def analyser_snapshot(layer, snapshot=None, type_parc_min=2, type_parc_max=14, top_n=5, graphe=None,
+                      feedback=None):
+    """
+    Toutes les analyses de l'onglet Analyses à partir d'une photographie (créée si absente).
+    feedback : QgsFeedback optionnel du regroupement (progression, annulation).
+    """
+    if snapshot is None:
+        snapshot = SnapshotParcelles.depuis_couche(layer)
+    surfaces_par_type, total_types = surfaces_par_type_vect(snapshot, type_parc_min, type_parc_max)
+
+    return {
+        "surface_forestiere": calcul_surface_forestiere_vect(snapshot),
+        "surface_friche": calcul_surface_friche_vect(snapshot),
+        "nb_parcelles": compter_parcelles_possedees_vect(snapshot),
+        "types_parcelles": formater_repartition_types(surfaces_par_type, total_types, top_n),
+        "surfaces_par_type": surfaces_par_type,
+        "total_types": total_types,
+        "types_essences": analyse_types_essences_vect(snapshot, top_n),
+        "total_plants": total_plantation_vect(snapshot),
+        "regroupement": calcul_regroupement_vect(layer, snapshot, graphe=graphe, feedback=feedback),
+    }
@@ -0,0 +1,483 @@
+# statistiques_incrementales.py
+# Statistiques de l'onglet Analyses maintenues au fil des modifications de la couche :
+# chaque entité garde sa contribution, une modification retire l'ancienne et ajoute
+# la nouvelle (coût constant), sans relire toute la couche.
+
+from copy import copy
+
+from qgis.PyQt.QtCore import QObject, QTimer, pyqtSignal
+from qgis.core import QgsApplication, QgsFeedback, QgsTask
+
+from .Analyse import (
+    convertir_surface_ha,
+    formater_repartition_types,
+    formater_repartition_essences,
+    calcul_regroupement,
+    calcul_regroupement_parcelles,
+)
+from .acces_parcelles import SourceParcelles, parcourir, requete_attributs
+from .graphe_adjacence import charger_graphe, preparer_graphe
+
+CHAMPS_STATISTIQUES = (
+    ["Possession", "indice_parc", "typeParc", "SURFACE", "totalplants"]
+    + [f"plant{i}" for i in range(1, 5)]
+    + [f"Tx{i}" for i in range(1, 5)]
+)
+
+TYPES_FRICHE = (8, 9, 14)
+
+# Agrégats du stock (voir StockStatistiques.agregats et depuis_agregats)
+CLES_AGREGATS = (
+    "surface_forestiere_m2", "surface_friche_m2", "nb_parcelles",
+    "surfaces_par_type", "nb_par_type", "total_types",
+    "surfaces_par_essence", "nb_par_essence", "total_essences",
+    "total_plants",
+)
+
+# Champs dont la modification sur une parcelle possédée change le regroupement
+CHAMPS_REGROUPEMENT = ("contenance", "section", "numero")
+
+
+def _float(value, defaut=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return defaut
+
+
+def _est_vide(value):
+    return value is None or value == "" or (hasattr(value, "isNull") and value.isNull())
+
+
+def contribution_feature(feature):
+    """
+    Extrait d'une entité les valeurs utilisées par les statistiques :
+    (possession, parcelle_mere, typeParc, surface, ((essence, poids), ...), plants)
+    """
+    surface = _float(feature["SURFACE"])
+
+    type_parc = feature["typeParc"]
+    type_parc = None if _est_vide(type_parc) else int(type_parc)
+
+    essences = []
+    for i in range(1, 5):
+        nom = feature[f"plant{i}"]
+        if _est_vide(nom):
+            continue
+        essences.append((nom, _float(feature[f"Tx{i}"]) / 100.0 * surface))
+
+    plants = feature["totalplants"]
+    plants = 0 if _est_vide(plants) else int(_float(plants))
+
+    return (
+        bool(feature["Possession"]),
+        feature["indice_parc"] in (None, "", 0) or _est_vide(feature["indice_parc"]),
+        type_parc,
+        surface,
+        tuple(essences),
+        plants,
+    )
+
+
+class StockStatistiques:
+    """
+    Agrégats des analyses + contribution de chaque entité (clé : fid).
+    Objet Python simple : peut être construit dans un thread de calcul.
+    """
+
+    def __init__(self, type_parc_min=2, type_parc_max=14, top_n=5):
+        self.type_parc_min = type_parc_min
+        self.type_parc_max = type_parc_max
+        self.top_n = top_n
+
+        self.contributions = {}
+        # Stock construit à partir d'agrégats (SQL) : la contribution enregistrée
+        # d'une entité est lue dans le fournisseur avant sa première modification
+        # (voir capturer), une seule fois par fid
+        self.lecteur = None
+        self.fids_connus = set()
+        self.surface_forestiere_m2 = 0.0
+        self.surface_friche_m2 = 0.0
+        self.nb_parcelles = 0
+        self.surfaces_par_type = {}
+        self.nb_par_type = {}
+        self.total_types = 0.0
+        self.surfaces_par_essence = {}
+        self.nb_par_essence = {}
+        self.total_essences = 0.0
+        self.total_plants = 0
+
+    @classmethod
+    def depuis_couche(cls, layer, feedback=None, **parametres):
+        """Construit le stock en une lecture attributaire (sans géométrie) de la couche."""
+        stock = cls(**parametres)
+        for feature in parcourir(layer, requete_statistiques(layer), feedback):
+            stock.ajouter(feature.id(), contribution_feature(feature))
+        return stock
+
+    @classmethod
+    def depuis_snapshot(cls, snapshot, **parametres):
+        """Construit le stock à partir d'une photographie SnapshotParcelles déjà chargée."""
+        stock = cls(**parametres)
+        surfaces = [0.0 if s != s else s for s in snapshot.surface.tolist()]  # NaN -> 0
+        types = snapshot.type_parc.tolist()
+        types_nuls = snapshot.type_parc_nul.tolist()
+        plants = snapshot.total_plants.tolist()
+        codes = [ligne.tolist() for ligne in snapshot.codes_essences]
+        taux = [ligne.tolist() for ligne in snapshot.taux]
+
+        for k, fid in enumerate(snapshot.fids.tolist()):
+            essences = tuple(
+                (snapshot.essences[codes[i][k]], (0.0 if taux[i][k] != taux[i][k] else taux[i][k]) / 100.0 * surfaces[k])
+                for i in range(len(codes)) if codes[i][k] >= 0
+            )
+            stock.ajouter(fid, (
+                bool(snapshot.possession[k]),
+                bool(snapshot.parcelle_mere[k]),
+                None if types_nuls[k] else types[k],
+                surfaces[k],
+                essences,
+                0 if plants[k] != plants[k] else int(plants[k]),
+            ))
+        return stock
+
+    @classmethod
+    def depuis_agregats(cls, agregats, lecteur, **parametres):
+        """
+        Construit le stock à partir d'agrégats déjà calculés (voir agregats_sql).
+
+        lecteur : fonction [fids] -> {fid: contribution enregistrée}, appelée par
+        capturer() avant la première modification des entités pour pouvoir retirer
+        leur contribution d'origine.
+        """
+        stock = cls(**parametres)
+        for cle in CLES_AGREGATS:
+            setattr(stock, cle, agregats[cle])
+        stock.lecteur = lecteur
+        return stock
+
+    def agregats(self):
+        """Agrégats seuls (sans les contributions par entité), pour depuis_agregats."""
+        return {cle: copy(getattr(self, cle)) for cle in CLES_AGREGATS}
+
+    def _appliquer(self, contribution, signe):
+        possession, parcelle_mere, type_parc, surface, essences, plants = contribution
+
+        if possession:
+            self.nb_parcelles += signe
+            if parcelle_mere and type_parc != 1:
+                self.surface_forestiere_m2 += signe * surface * 100
+            if parcelle_mere and type_parc in TYPES_FRICHE:
+                self.surface_friche_m2 += signe * surface * 100
+
+        if type_parc is not None and self.type_parc_min <= type_parc <= self.type_parc_max:
+            self.total_types += signe * surface
+            self.surfaces_par_type[type_parc] = self.surfaces_par_type.get(type_parc, 0.0) + signe * surface
+            self.nb_par_type[type_parc] = self.nb_par_type.get(type_parc, 0) + signe
+            if self.nb_par_type[type_parc] == 0:
+                del self.nb_par_type[type_parc]
+                del self.surfaces_par_type[type_parc]
+
+        for nom, poids in essences:
+            self.total_essences += signe * poids
+            self.surfaces_par_essence[nom] = self.surfaces_par_essence.get(nom, 0.0) + signe * poids
+            self.nb_par_essence[nom] = self.nb_par_essence.get(nom, 0) + signe
+            if self.nb_par_essence[nom] == 0:
+                # Plus aucune parcelle avec cette essence : elle disparaît de la répartition
+                del self.nb_par_essence[nom]
+                del self.surfaces_par_essence[nom]
+
+        self.total_plants += signe * plants
+
+    def ajouter(self, fid, contribution):
+        self.retirer(fid)
+        self.contributions[fid] = contribution
+        self._appliquer(contribution, +1)
+
+    def retirer(self, fid):
+        """Retire la contribution connue de `fid` (ajoutée ou capturée), et la retourne."""
+        contribution = self.contributions.pop(fid, None)
+        if contribution is not None:
+            self._appliquer(contribution, -1)
+        return contribution
+
+    def a_capturer(self, fid):
+        """Vrai si la contribution enregistrée de `fid` n'a pas encore été lue dans le fournisseur."""
+        return (self.lecteur is not None and fid >= 0
+                and fid not in self.fids_connus and fid not in self.contributions)
+
+    def capturer(self, fids):
+        """
+        Lit en une requête les contributions enregistrées des `fids` encore
+        inconnus. À appeler avant l'enregistrement de leurs modifications : le
+        fournisseur doit encore porter les anciennes valeurs.
+        """
+        fids = [fid for fid in fids if self.a_capturer(fid)]
+        if not fids:
+            return
+        self.contributions.update(self.lecteur(fids))
+        self.fids_connus.update(fids)
+
+    def marquer_connus(self, fids):
+        """Entités absentes des agrégats d'origine (ajoutées depuis) : rien à relire pour elles."""
+        if self.lecteur is not None:
+            self.fids_connus.update(fids)
+
+    def fids_possedes(self):
+        """Parcelles possédées, ou None si le stock ne connaît pas toutes les contributions."""
+        if self.lecteur is not None:
+            return None
+        return [fid for fid, contribution in self.contributions.items() if contribution[0]]
+
+    def resultats(self):
+        """Résultats au format de l'onglet Analyses (hors regroupement)."""
+        return {
+            "surface_forestiere": convertir_surface_ha(max(self.surface_forestiere_m2, 0)),
+            "surface_friche": convertir_surface_ha(max(self.surface_friche_m2, 0)),
+            "nb_parcelles": self.nb_parcelles,
+            "types_parcelles": formater_repartition_types(
+                self.surfaces_par_type, max(self.total_types, 0.0), self.top_n),
+            "surfaces_par_type": dict(self.surfaces_par_type),
+            "total_types": max(self.total_types, 0.0),
+            "types_essences": formater_repartition_essences(
+                self.surfaces_par_essence, max(self.total_essences, 0.0), self.top_n),
+            "total_plants": self.total_plants,
+        }
+
+
+def requete_statistiques(layer, fids=None):
+    """Requête attributaire (sans géométrie) des champs utilisés par les statistiques."""
+    return requete_attributs(layer, CHAMPS_STATISTIQUES, fids)
+
+
+def lecteur_fournisseur(layer):
+    """Lecteur de contributions enregistrées (une requête par lot de fids), pour StockStatistiques.depuis_agregats."""
+    provider = layer.dataProvider()
+
+    def lire(fids):
+        return {feature.id(): contribution_feature(feature)
+                for feature in provider.getFeatures(requete_statistiques(provider, fids))}
+
+    return lire
+
+
+class RegroupementTask(QgsTask):
+    """
+    Regroupement par contiguïté recalculé en tâche de fond. La couche (tampon
+    d'édition compris) et son graphe enregistré sont figés dans le constructeur
+    (thread principal).
+
+    fids_possedes : parcelles possédées, ou None pour les relire dans la couche
+    """
+    termine = pyqtSignal(str)
+
+    def __init__(self, layer, fids_possedes):
+        super().__init__(f"Regroupement des parcelles : {layer.name()}", QgsTask.CanCancel)
+        self.source = SourceParcelles(layer)
+        self.graphe_persistant = preparer_graphe(layer)
+        self.fids_possedes = fids_possedes
+        self.feedback = QgsFeedback()
+        self.feedback.progressChanged.connect(self.setProgress)
+        self.regroupement = None
+
+    def cancel(self):
+        self.feedback.cancel()
+        super().cancel()
+
+    def run(self):
+        graphe = charger_graphe(self.graphe_persistant, self.feedback)
+        if self.fids_possedes is None:
+            regroupement = calcul_regroupement(self.source, graphe, self.feedback)
+        else:
+            regroupement = calcul_regroupement_parcelles(
+                self.source, self.fids_possedes, graphe=graphe, feedback=self.feedback)
+        if self.isCanceled():
+            return False
+        self.regroupement = regroupement
+        return True
+
+    def finished(self, result):
+        # Appelé dans le thread principal une fois run() terminé
+        if result:
+            self.termine.emit(self.regroupement)
+
+
+class SuiviStatistiques(QObject):
+    """
+    Branche un StockStatistiques sur les signaux d'édition de la couche.
+
+    Les modifications sont regroupées (quelques ms) avant l'émission de `modifie`
+    avec le dictionnaire de résultats complet. La contribution enregistrée d'une
+    entité encore inconnue du stock est notée dès sa première modification et lue
+    en un lot au plus tard juste avant l'enregistrement (beforeCommitChanges),
+    tant que le fournisseur porte les anciennes valeurs. Le regroupement par
+    contiguïté n'est recalculé que si une géométrie ou une possession a changé, à
+    partir des seules parcelles possédées connues du stock, dans une tâche de fond
+    (RegroupementTask) : le dernier regroupement reste affiché jusqu'à sa fin.
+    """
+    modifie = pyqtSignal(dict)
+
+    DELAI_MS = 50
+
+    def __init__(self, layer, stock, regroupement="", parent=None):
+        super().__init__(parent)
+        self.layer = layer
+        self.stock = stock
+        self.regroupement = regroupement
+        self.fids_modifies = set()
+        self.fids_regroupement = set()
+        self.fids_a_capturer = set()
+        self.en_enregistrement = False
+        self.regroupement_perime = False
+        self.regroupement_task = None
+        self.regroupement_a_relancer = False
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.DELAI_MS)
+        self.timer.timeout.connect(self.appliquer_modifications)
+
+        self.layer.attributeValueChanged.connect(self.on_attribute_changed)
+        self.layer.featureAdded.connect(self.on_feature_changed)
+        self.layer.featureDeleted.connect(self.on_feature_deleted)
+        self.layer.geometryChanged.connect(self.on_geometry_changed)
+        self.layer.committedFeaturesAdded.connect(self.on_committed_features_added)
+        self.layer.beforeCommitChanges.connect(self.on_before_commit_changes)
+        self.layer.afterCommitChanges.connect(self.on_after_commit_changes)
+        self.layer.afterRollBack.connect(self.on_after_commit_changes)
+
+    def deconnecter(self):
+        """Déconnecte les signaux de la couche et annule le regroupement en cours."""
+        self.timer.stop()
+        self.regroupement_a_relancer = False
+        if self.regroupement_task is not None:
+            try:
+                self.regroupement_task.termine.disconnect(self.on_regroupement_termine)
+                self.regroupement_task.cancel()
+            except (TypeError, RuntimeError):
+                pass
+            self.regroupement_task = None
+        for signal, slot in (
+            (self.layer.attributeValueChanged, self.on_attribute_changed),
+            (self.layer.featureAdded, self.on_feature_changed),
+            (self.layer.featureDeleted, self.on_feature_deleted),
+            (self.layer.geometryChanged, self.on_geometry_changed),
+            (self.layer.committedFeaturesAdded, self.on_committed_features_added),
+            (self.layer.beforeCommitChanges, self.on_before_commit_changes),
+            (self.layer.afterCommitChanges, self.on_after_commit_changes),
+            (self.layer.afterRollBack, self.on_after_commit_changes),
+        ):
+            try:
+                signal.disconnect(slot)
+            except (TypeError, RuntimeError):
+                pass
+
+    def _noter(self, fid):
+        """Première modification d'une entité inconnue : sa contribution enregistrée est à capturer."""
+        if self.stock.a_capturer(fid):
+            self.fids_a_capturer.add(fid)
+            if self.en_enregistrement:
+                # Modifiée pendant beforeCommitChanges : lue tout de suite, avant l'écriture
+                self.capturer()
+
+    def capturer(self):
+        fids, self.fids_a_capturer = self.fids_a_capturer, set()
+        self.stock.capturer(fids)
+
+    def on_before_commit_changes(self, *args):
+        self.en_enregistrement = True
+        self.capturer()
+
+    def on_after_commit_changes(self):
+        self.en_enregistrement = False
+
+    def on_attribute_changed(self, fid, idx, value):
+        self._noter(fid)
+        if self.layer.fields().at(idx).name() in CHAMPS_REGROUPEMENT:
+            self.fids_regroupement.add(fid)
+        self.on_feature_changed(fid)
+
+    def on_feature_changed(self, fid):
+        self.fids_modifies.add(fid)
+        self.timer.start()
+
+    def on_feature_deleted(self, fid):
+        # Contribution retirée par appliquer_modifications (entité disparue)
+        self._noter(fid)
+        self.on_feature_changed(fid)
+
+    def on_geometry_changed(self, fid, geometry):
+        self._noter(fid)
+        self.regroupement_perime = True
+        self.timer.start()
+
+    def on_committed_features_added(self, layer_id, features):
+        # Après enregistrement, les entités ajoutées (fid provisoires négatifs) reçoivent leur fid définitif
+        for fid in [fid for fid in self.stock.contributions if fid < 0]:
+            self.stock.retirer(fid)
+            self.fids_modifies.discard(fid)
+        self.stock.marquer_connus(feature.id() for feature in features)
+        for feature in features:
+            self.fids_modifies.add(feature.id())
+        self.timer.start()
+
+    def appliquer_modifications(self):
+        fids = self.fids_modifies
+        fids_regroupement = self.fids_regroupement
+        self.fids_modifies = set()
+        self.fids_regroupement = set()
+
+        # Modifications pas encore enregistrées : le fournisseur porte encore les anciennes valeurs
+        self.capturer()
+
+        if fids:
+            lus = set()
+            for feature in self.layer.getFeatures(requete_statistiques(self.layer, fids)):
+                fid = feature.id()
+                ancienne = self.stock.retirer(fid)
+                nouvelle = contribution_feature(feature)
+                possedee_avant = ancienne is not None and ancienne[0]
+                if possedee_avant != nouvelle[0] or (nouvelle[0] and fid in fids_regroupement):
+                    self.regroupement_perime = True
+                self.stock.ajouter(fid, nouvelle)
+                lus.add(fid)
+
+            # Entités disparues entre-temps
+            for fid in fids - lus:
+                contribution = self.stock.retirer(fid)
+                if contribution is not None and contribution[0]:
+                    self.regroupement_perime = True
+
+        if self.regroupement_perime:
+            self.regroupement_perime = False
+            self.lancer_regroupement()
+
+        self.modifie.emit(self.resultats())
+
+    def lancer_regroupement(self):
+        # Un regroupement est déjà en cours : il sera relancé une seule fois à sa fin
+        if self.regroupement_task is not None:
+            self.regroupement_a_relancer = True
+            return
+        self.regroupement_a_relancer = False
+        self.regroupement_task = RegroupementTask(self.layer, self.stock.fids_possedes())
+        self.regroupement_task.termine.connect(self.on_regroupement_termine)
+        self.regroupement_task.taskCompleted.connect(self.on_regroupement_task_ended)
+        self.regroupement_task.taskTerminated.connect(self.on_regroupement_task_ended)
+        QgsApplication.taskManager().addTask(self.regroupement_task)
+
+    def on_regroupement_termine(self, regroupement):
+        if self.regroupement_a_relancer:
+            return  # résultat déjà périmé, le calcul relancé le remplacera
+        self.regroupement = regroupement
+        self.modifie.emit(self.resultats())
+
+    def on_regroupement_task_ended(self):
+        self.regroupement_task = None
+        if self.regroupement_a_relancer:
+            self.lancer_regroupement()
+
+    def resultats(self):
+        resultats = self.stock.resultats()
+        resultats["regroupement"] = self.regroupement
+        return resultats
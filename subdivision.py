@@ -0,0 +1,228 @@
+# subdivision.py
+# Subdivision des parcelles par une couche de découpe (lignes ou polygones) : chaque
+# parcelle mère est découpée en une passe, ses morceaux reçoivent les indices libres
+# a, b, c… de leur numéro, l'identifiant (champ id) est reconstruit comme à la
+# création d'une sous-parcelle, contenance et SURFACE sont recalculées, et le tout
+# est enregistré en un seul commit. La parcelle mère garde le plus grand morceau
+# (et son fid) ; les autres morceaux sont de nouvelles entités reprenant ses attributs.
+
+from itertools import product
+
+from qgis.core import (
+    QgsCoordinateTransform,
+    QgsCsException,
+    QgsExpression,
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsProject,
+    QgsSpatialIndex,
+    QgsVectorLayerUtils,
+    QgsWkbTypes,
+)
+
+from .acces_parcelles import libelle_parcelle, modifier_parcelle, requete_attributs, texte_attribut
+from .surfaces import COUCHE_EN_EDITION, MesureSurface, polygones, valeurs_surface
+
+# Champs qui identifient un numéro de parcelle (les sous-parcelles ne diffèrent que par l'indice)
+CHAMPS_NUMERO = ["commune", "prefixe", "section", "numero"]
+
+LETTRES = "abcdefghijklmnopqrstuvwxyz"
+
+# Part de la surface de la mère en dessous de laquelle un morceau est un éclat de découpe, ignoré
+PART_MINIMALE = 1e-6
+
+
+def _valeur(feature, nom):
+    """Attribut `nom` de l'entité, None si la couche n'a pas ce champ."""
+    return feature[nom] if feature.fields().indexFromName(nom) >= 0 else None
+
+
+def identifiant_parcelle(commune, prefixe, section, numero, indice):
+    """
+    Identifiant de la parcelle (champ id) : commune + préfixe + section (précédée
+    de "0" si elle n'a qu'une lettre) + numéro sur 4 chiffres + indice.
+    """
+    section = texte_attribut(section)
+    zero = "0" if len(section) == 1 else ""
+    return f"{texte_attribut(commune)}{texte_attribut(prefixe)}{zero}{section}{texte_attribut(numero).zfill(4)}{texte_attribut(indice)}"
+
+
+def indices_libres(utilises):
+    """Indices a, b, c… z, puis aa, ab… qui ne sont pas dans `utilises`."""
+    longueur = 1
+    while True:
+        for lettres in product(LETTRES, repeat=longueur):
+            indice = "".join(lettres)
+            if indice not in utilises:
+                yield indice
+        longueur += 1
+
+
+def decouper_par_lignes(geometry, lignes):
+    """
+    Faces de `geometry` délimitées par son contour et les `lignes` : le réseau est
+    noeudé par une union, polygonisé, puis seules les faces intérieures à la
+    parcelle sont gardées (les trous et l'extérieur sont écartés).
+    """
+    contour = QgsGeometry(geometry.constGet().boundary())
+    reseau = QgsGeometry.unaryUnion([contour] + lignes)
+    moteur = QgsGeometry.createGeometryEngine(geometry.constGet())
+    moteur.prepareGeometry()
+    return [face for face in polygones(QgsGeometry.polygonize([reseau]))
+            if moteur.contains(face.pointOnSurface().constGet())]
+
+
+def decouper_par_polygones(geometry, decoupes):
+    """
+    Morceaux de `geometry` : sa part dans chaque polygone de `decoupes` (dans l'ordre,
+    un chevauchement revient au premier), puis le reste hors des polygones.
+    """
+    morceaux = []
+    reste = geometry
+    for polygone in decoupes:
+        if not reste.intersects(polygone):
+            continue
+        morceaux.extend(polygones(reste.intersection(polygone)))
+        reste = QgsGeometry.unaryUnion(polygones(reste.difference(polygone)))
+        if reste.isNull() or reste.isEmpty():
+            return morceaux
+    return morceaux + polygones(reste)
+
+
+class Coupes:
+    """Géométries de la couche de découpe, transformées dans le SCR des parcelles et indexées."""
+
+    def __init__(self, couche, crs):
+        self.lignes = couche.geometryType() == QgsWkbTypes.LineGeometry
+        transform = None
+        if couche.crs() != crs:
+            transform = QgsCoordinateTransform(couche.crs(), crs, QgsProject.instance())
+        self.geometries = {}
+        self.index = QgsSpatialIndex()
+        for feature in couche.getFeatures(QgsFeatureRequest().setSubsetOfAttributes([])):
+            geometry = feature.geometry()
+            if geometry.isNull() or geometry.isEmpty():
+                continue
+            if transform is not None:
+                geometry = QgsGeometry(geometry)
+                geometry.transform(transform)
+            self.geometries[feature.id()] = geometry
+            self.index.addFeature(feature.id(), geometry.boundingBox())
+
+    def morceaux(self, geometry):
+        """Morceaux de la parcelle `geometry` ; un seul (elle-même) si rien ne la découpe."""
+        coupes = [self.geometries[fid] for fid in sorted(self.index.intersects(geometry.boundingBox()))
+                  if self.geometries[fid].intersects(geometry)]
+        if not coupes:
+            return [geometry]
+        if self.lignes:
+            morceaux = decouper_par_lignes(geometry, coupes)
+        else:
+            morceaux = decouper_par_polygones(geometry, coupes)
+        minimum = geometry.area() * PART_MINIMALE
+        return [morceau for morceau in morceaux if morceau.area() > minimum] or [geometry]
+
+
+def _ordre_lecture(geometry):
+    # Du nord au sud, puis d'ouest en est
+    point = geometry.pointOnSurface().asPoint()
+    return (-point.y(), point.x())
+
+
+def _indices_utilises(layer, parent):
+    """Indices déjà portés par les parcelles du même numéro que `parent`."""
+    fields = layer.fields()
+    champs = [nom for nom in CHAMPS_NUMERO if fields.indexFromName(nom) >= 0]
+    expression = " AND ".join(
+        QgsExpression.createFieldEqualityExpression(nom, parent[nom]) for nom in champs)
+    return {texte_attribut(feature["indice_parc"])
+            for feature in layer.getFeatures(requete_attributs(layer, ["indice_parc"], expression=expression))}
+
+
+def subdiviser(layer, fids, couche_coupe):
+    """
+    Découpe les parcelles `fids` de `layer` par `couche_coupe` et enregistre le
+    résultat en un commit, sur une couche qui n'est pas en édition.
+
+    Retourne (resultats, erreur) : resultats = [(libellé de la mère, [indices des
+    morceaux])] pour les parcelles découpées ; erreur = None, ou le message
+    d'erreur (rien n'est alors enregistré).
+    """
+    if layer.isEditable():
+        return [], COUCHE_EN_EDITION
+    try:
+        coupes = Coupes(couche_coupe, layer.crs())
+    except QgsCsException as e:
+        return [], f"Couche de découpe non transformable dans le SCR des parcelles : {e}"
+
+    # Parcelles effectivement découpées, avec leurs morceaux
+    decoupes = []
+    request = QgsFeatureRequest().setFilterFids(list(fids))
+    for parent in layer.getFeatures(request):
+        geometry = parent.geometry()
+        if geometry.isNull() or geometry.isEmpty():
+            continue
+        morceaux = coupes.morceaux(geometry)
+        if len(morceaux) > 1:
+            decoupes.append((parent, morceaux))
+    if not decoupes:
+        return [], None
+
+    mesure = MesureSurface(layer.crs())
+    multi = QgsWkbTypes.isMultiType(layer.wkbType())
+    cles = layer.primaryKeyAttributes()
+    fields = layer.fields()
+    # Indices pris par numéro de parcelle, y compris ceux attribués dans ce lot
+    utilises = {}
+
+    if not layer.startEditing():
+        return [], "Impossible de démarrer l'édition sur la couche."
+
+    resultats = []
+    ok = True
+    for parent, morceaux in decoupes:
+        cle = tuple(texte_attribut(parent[nom]) for nom in CHAMPS_NUMERO if fields.indexFromName(nom) >= 0)
+        if cle not in utilises:
+            utilises[cle] = _indices_utilises(layer, parent)
+        pris = utilises[cle]
+
+        # La mère garde le plus grand morceau et son indice s'il en a un
+        morceaux = sorted(morceaux, key=lambda morceau: -morceau.area())
+        indice_mere = texte_attribut(_valeur(parent, "indice_parc"))
+        indices = {0: indice_mere} if indice_mere else {}
+        libres = indices_libres(pris)
+        for i in sorted(range(len(morceaux)), key=lambda i: _ordre_lecture(morceaux[i])):
+            if i not in indices:
+                indices[i] = next(libres)
+                pris.add(indices[i])
+
+        nouvelles = []
+        for i, morceau in enumerate(morceaux):
+            if multi:
+                morceau.convertToMultiType()
+            surface = mesure.surface_m2(morceau)
+            valeurs = {
+                "indice_parc": indices[i],
+                "id": identifiant_parcelle(*(_valeur(parent, nom) for nom in CHAMPS_NUMERO), indices[i]),
+                **(valeurs_surface(surface) if surface is not None else {}),
+            }
+            if i == 0:
+                ok = layer.changeGeometry(parent.id(), morceau) and modifier_parcelle(layer, parent.id(), valeurs)
+            else:
+                attributs = {idx: parent.attribute(idx) for idx in range(fields.count()) if idx not in cles}
+                attributs.update({fields.indexFromName(nom): valeur for nom, valeur in valeurs.items()
+                                  if fields.indexFromName(nom) >= 0})
+                nouvelles.append(QgsVectorLayerUtils.createFeature(layer, morceau, attributs))
+            if not ok:
+                break
+        if not ok or not layer.addFeatures(nouvelles):
+            ok = False
+            break
+        resultats.append((libelle_parcelle(parent), [indices[i] for i in sorted(indices, key=indices.get)]))
+
+    if ok and layer.commitChanges():
+        return resultats, None
+
+    erreurs = "\n".join(layer.commitErrors()) if ok else "Parcelle introuvable ou modification refusée."
+    layer.rollBack()
+    return [], erreurs
@@ -0,0 +1,343 @@
+# surfaces.py
+# Surfaces des parcelles calculées depuis leur géométrie : transformation vers le
+# CRS métrique gardée en cache par CRS source (ou mesure ellipsoïdale), calcul par
+# lots sur toute la couche (ou une liste de fids) en tâche de fond, réparti sur
+# plusieurs threads pour les grosses couches, puis écriture de contenance (m²) et
+# SURFACE (ares) en une seule transaction. Pendant une session d'édition, les
+# parcelles dont la géométrie change sont notées et leurs surfaces recalculées
+# juste avant l'enregistrement, dans le même commit.
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from qgis.PyQt.QtCore import QObject, pyqtSignal
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsCsException,
+    QgsDistanceArea,
+    QgsFeatureRequest,
+    QgsFeedback,
+    QgsGeometry,
+    QgsProject,
+    QgsTask,
+    QgsWkbTypes,
+)
+
+from .acces_parcelles import SourceParcelles, modifier_parcelle, parcourir, requete_attributs
+from .session_edition import valeurs_egales
+
+# CRS dans lequel les surfaces planimétriques sont mesurées (Lambert 93)
+CRS_METRIQUE = "EPSG:2154"
+
+CHAMPS_SURFACE = ["contenance", "SURFACE"]
+
+# Écritures en un commit refusées sur une couche déjà en édition (le commit emporterait les autres modifications)
+COUCHE_EN_EDITION = ("La couche est en cours d'édition : enregistrez ou annulez les modifications "
+                     "en cours, puis relancez.")
+
+# Entités par lot de calcul, et nombre d'entités à partir duquel les lots sont répartis sur plusieurs threads
+TAILLE_LOT = 2000
+SEUIL_PARALLELE = 20000
+
+# Lots soumis et pas encore consommés, par thread de calcul
+LOTS_EN_ATTENTE = 2
+
+# Transformations vers CRS_METRIQUE par CRS source (None : déjà métrique)
+_transformations = {}
+_verrou = threading.Lock()
+
+
+def transformation(crs):
+    """
+    Transformation de `crs` vers CRS_METRIQUE, construite une fois par CRS
+    (appel depuis le thread principal : contexte de transformation du projet).
+    Retourne None si `crs` est déjà le CRS métrique.
+    """
+    cle = crs.authid() or crs.toWkt()
+    with _verrou:
+        if cle not in _transformations:
+            cible = QgsCoordinateReferenceSystem(CRS_METRIQUE)
+            _transformations[cle] = None if crs == cible else QgsCoordinateTransform(
+                crs, cible, QgsProject.instance().transformContext())
+        return _transformations[cle]
+
+
+def valeurs_surface(surface_m2):
+    """{contenance (m², entier), SURFACE (ares, 2 décimales)} pour une surface en m²."""
+    return {"contenance": int(round(surface_m2)), "SURFACE": round(surface_m2 / 100, 2)}
+
+
+class MesureSurface:
+    """
+    Mesure des surfaces (m²) des géométries d'un CRS donné : planimétrique dans
+    CRS_METRIQUE, ou ellipsoïdale (ellipsoïde du projet). À construire dans le
+    thread principal ; copie() en fournit une instance par thread de calcul.
+    """
+
+    def __init__(self, crs, ellipsoidal=False):
+        self.transform = None
+        self.distance_area = None
+        if ellipsoidal:
+            projet = QgsProject.instance()
+            self.distance_area = QgsDistanceArea()
+            self.distance_area.setSourceCrs(crs, projet.transformContext())
+            self.distance_area.setEllipsoid(projet.ellipsoid() or "EPSG:7019")
+        else:
+            self.transform = transformation(crs)
+
+    def copie(self):
+        copie = MesureSurface.__new__(MesureSurface)
+        copie.transform = QgsCoordinateTransform(self.transform) if self.transform is not None else None
+        copie.distance_area = QgsDistanceArea(self.distance_area) if self.distance_area is not None else None
+        return copie
+
+    def surface_m2(self, geometry):
+        """Surface de `geometry` en m², None si elle est vide ou ne peut être projetée."""
+        if geometry is None or geometry.isNull():
+            return None
+        if self.distance_area is not None:
+            return self.distance_area.measureArea(geometry)
+        if self.transform is None:
+            return geometry.area()
+        projetee = QgsGeometry(geometry)
+        try:
+            projetee.transform(self.transform)
+        except QgsCsException:
+            return None
+        return projetee.area()
+
+
+def polygones(geometry):
+    """Polygones simples de `geometry` (résultat GEOS, éventuellement collection)."""
+    if geometry is None or geometry.isNull() or geometry.isEmpty():
+        return []
+    return [partie for partie in geometry.asGeometryCollection()
+            if partie.type() == QgsWkbTypes.PolygonGeometry and not partie.isEmpty()]
+
+
+def calculer_par_lots(calculer, mesure, lots, paralleles=False, feedback=None):
+    """
+    Résultats de calculer(mesure, lot) pour chaque lot de `lots`, dans l'ordre,
+    au fil du calcul. Arrêt dès que `feedback` est annulé.
+
+    Si `paralleles`, les lots sont répartis sur plusieurs threads (les appels
+    GEOS / PROJ libèrent le GIL), chacun avec sa copie de la mesure. Au plus
+    LOTS_EN_ATTENTE lots par thread sont soumis d'avance : `lots` n'est lu qu'à
+    mesure que les résultats sont consommés.
+    """
+    def annule():
+        return feedback is not None and feedback.isCanceled()
+
+    if not paralleles:
+        for lot in lots:
+            if annule():
+                return
+            yield calculer(mesure, lot)
+        return
+
+    local = threading.local()
+
+    def calculer_thread(lot):
+        if annule():
+            return None
+        if not hasattr(local, "mesure"):
+            local.mesure = mesure.copie()
+        return calculer(local.mesure, lot)
+
+    threads = os.cpu_count() or 2
+    en_attente = deque()
+    with ThreadPoolExecutor(max_workers=threads) as executeur:
+        for lot in lots:
+            if annule():
+                break
+            en_attente.append(executeur.submit(calculer_thread, lot))
+            if len(en_attente) < LOTS_EN_ATTENTE * threads:
+                continue
+            resultat = en_attente.popleft().result()
+            if resultat is not None:
+                yield resultat
+        while en_attente and not annule():
+            resultat = en_attente.popleft().result()
+            if resultat is not None:
+                yield resultat
+        # Annulation : les lots pas encore commencés ne le seront pas
+        for futur in en_attente:
+            futur.cancel()
+
+
+def _calculer_lot(mesure, lot):
+    """[(fid, valeurs)] des entités du lot dont contenance / SURFACE changent."""
+    modifications = []
+    for fid, geometry, actuelles in lot:
+        surface = mesure.surface_m2(geometry)
+        if surface is None:
+            continue
+        valeurs = {nom: valeur for nom, valeur in valeurs_surface(surface).items()
+                   if nom in actuelles and not valeurs_egales(actuelles[nom], valeur)}
+        if valeurs:
+            modifications.append((fid, valeurs))
+    return modifications
+
+
+def _lots(source, fids, feedback):
+    """Lots de (fid, géométrie, {champ: valeur actuelle}) lus en une requête."""
+    fields = source.fields()
+    champs = [nom for nom in CHAMPS_SURFACE if fields.indexFromName(nom) >= 0]
+    request = requete_attributs(source, champs, fids=fids)
+    request.setFlags(QgsFeatureRequest.NoFlags)  # géométrie nécessaire
+    lot = []
+    for feature in parcourir(source, request, feedback):
+        lot.append((feature.id(), feature.geometry(), {nom: feature[nom] for nom in champs}))
+        if len(lot) == TAILLE_LOT:
+            yield lot
+            lot = []
+    if lot:
+        yield lot
+
+
+def surfaces_a_ecrire(source, mesure, fids=None, feedback=None):
+    """
+    {fid: {champ: valeur}} des parcelles (toutes, ou `fids`) dont contenance /
+    SURFACE diffèrent de la surface de leur géométrie. None si annulé.
+
+    Au-delà de SEUIL_PARALLELE entités, les lots sont calculés sur plusieurs
+    threads (voir calculer_par_lots).
+    """
+    nombre = len(fids) if fids is not None else source.featureCount()
+    modifications = {}
+    for resultat in calculer_par_lots(_calculer_lot, mesure, _lots(source, fids, feedback),
+                                      nombre >= SEUIL_PARALLELE, feedback):
+        modifications.update(resultat)
+
+    if feedback is not None and feedback.isCanceled():
+        return None
+    return modifications
+
+
+def ecrire_surfaces(layer, modifications):
+    """
+    Écrit {fid: {champ: valeur}} en une transaction (un seul commit), sur une
+    couche qui n'est pas en édition. Retourne None si tout est enregistré, sinon
+    le message d'erreur (rien n'est alors enregistré).
+    """
+    if not modifications:
+        return None
+    if layer.isEditable():
+        return COUCHE_EN_EDITION
+    if not layer.startEditing():
+        return "Impossible de démarrer l'édition sur la couche."
+
+    ok = all(modifier_parcelle(layer, fid, valeurs) for fid, valeurs in modifications.items())
+    if ok and layer.commitChanges():
+        return None
+
+    erreurs = "\n".join(layer.commitErrors()) if ok else "Parcelle introuvable ou modification refusée."
+    layer.rollBack()
+    return erreurs
+
+
+class SurfaceTask(QgsTask):
+    """
+    Recalcul des surfaces en tâche de fond. La couche est figée dans le
+    constructeur (thread principal) ; l'écriture a lieu dans finished(), dans
+    le thread principal.
+    """
+    termine = pyqtSignal(int)   # nombre de parcelles mises à jour
+    echec = pyqtSignal(str)
+
+    def __init__(self, layer, fids=None, ellipsoidal=False):
+        super().__init__(f"Surfaces des parcelles : {layer.name()}", QgsTask.CanCancel)
+        self.layer = layer
+        self.source = SourceParcelles(layer)
+        self.mesure = MesureSurface(layer.crs(), ellipsoidal)
+        self.fids = list(fids) if fids is not None else None
+        self.feedback = QgsFeedback()
+        self.feedback.progressChanged.connect(self.setProgress)
+        self.modifications = None
+        self.erreur = None
+
+    def cancel(self):
+        self.feedback.cancel()
+        super().cancel()
+
+    def run(self):
+        try:
+            self.modifications = surfaces_a_ecrire(self.source, self.mesure, self.fids, self.feedback)
+        except Exception as e:
+            self.erreur = str(e)
+            return False
+        return self.modifications is not None and not self.isCanceled()
+
+    def finished(self, result):
+        # Appelé dans le thread principal une fois run() terminé
+        if not result:
+            if self.erreur is not None:
+                self.echec.emit(self.erreur)
+            return
+        erreur = ecrire_surfaces(self.layer, self.modifications)
+        if erreur is not None:
+            self.echec.emit(erreur)
+        else:
+            self.termine.emit(len(self.modifications))
+
+
+class SuiviSurfaces(QObject):
+    """
+    Mise à jour automatique de contenance / SURFACE : les fids dont la
+    géométrie est modifiée ou ajoutée dans le tampon d'édition sont collectés,
+    puis leurs surfaces sont recalculées en un lot à beforeCommitChanges et
+    écrites dans le tampon, donc enregistrées par le même commit.
+    """
+
+    def __init__(self, layer, parent=None):
+        super().__init__(parent)
+        self.layer = layer
+        self.fids = set()
+
+        self.layer.geometryChanged.connect(self.on_geometry_changed)
+        self.layer.featureAdded.connect(self.on_feature_added)
+        self.layer.featureDeleted.connect(self.on_feature_deleted)
+        self.layer.beforeCommitChanges.connect(self.appliquer)
+        self.layer.afterCommitChanges.connect(self.vider)
+        self.layer.afterRollBack.connect(self.vider)
+
+    def deconnecter(self):
+        """Déconnecte les signaux de la couche."""
+        for signal, slot in (
+            (self.layer.geometryChanged, self.on_geometry_changed),
+            (self.layer.featureAdded, self.on_feature_added),
+            (self.layer.featureDeleted, self.on_feature_deleted),
+            (self.layer.beforeCommitChanges, self.appliquer),
+            (self.layer.afterCommitChanges, self.vider),
+            (self.layer.afterRollBack, self.vider),
+        ):
+            try:
+                signal.disconnect(slot)
+            except (TypeError, RuntimeError):
+                pass
+        self.vider()
+
+    def on_geometry_changed(self, fid, geometry):
+        self.fids.add(fid)
+
+    def on_feature_added(self, fid):
+        self.fids.add(fid)
+
+    def on_feature_deleted(self, fid):
+        self.fids.discard(fid)
+
+    def vider(self):
+        self.fids.clear()
+
+    def appliquer(self, *args):
+        """Surfaces des parcelles touchées écrites dans le tampon d'édition (avant le commit)."""
+        if not self.fids:
+            return
+        fids, self.fids = list(self.fids), set()
+        mesure = MesureSurface(self.layer.crs())
+        for lot in _lots(self.layer, fids, None):
+            for fid, valeurs in _calculer_lot(mesure, lot):
+                modifier_parcelle(self.layer, fid, valeurs)
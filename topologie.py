@@ -0,0 +1,296 @@
+# topologie.py
+# Contrôle topologique des parcelles en tâche de fond : géométries invalides,
+# chevauchements entre parcelles, trous entre parcelles et éclats (parties de
+# parcelle) plus petits qu'une surface tolérée. Les paires de parcelles à tester
+# viennent d'un index spatial chargé en bloc (arbre STR) ; les tests GEOS sont
+# répartis sur plusieurs threads pour les grosses couches. Les erreurs sont rendues
+# dans une couche mémoire : sélectionner une erreur zoome dessus et sélectionne les
+# parcelles en cause.
+
+from qgis.PyQt.QtCore import QObject, QVariant, pyqtSignal
+from qgis.core import (
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsFeedback,
+    QgsField,
+    QgsGeometry,
+    QgsSpatialIndex,
+    QgsTask,
+    QgsVectorLayer,
+)
+
+from .acces_parcelles import SourceParcelles
+from .contiguite import tolerance_pour_couche
+from .surfaces import SEUIL_PARALLELE, TAILLE_LOT, MesureSurface, calculer_par_lots, polygones
+
+# Surface (m²) en dessous de laquelle un trou ou une partie de parcelle est signalé
+SURFACE_TOLEREE_M2 = 10.0
+
+INVALIDE = "Géométrie invalide"
+CHEVAUCHEMENT = "Chevauchement"
+TROU = "Trou"
+ECLAT = "Éclat"
+
+NOM_COUCHE_ERREURS = "Erreurs topologiques"
+
+
+class Erreur:
+    """Erreur topologique : type, fids des parcelles en cause, description, zone et surface (m²)."""
+
+    def __init__(self, type_erreur, fids, description, geometry, surface_m2=None):
+        self.type = type_erreur
+        self.fids = fids
+        self.description = description
+        self.geometry = geometry
+        self.surface_m2 = surface_m2
+
+
+def controler_parcelles(geometries, fids, mesure, surface_toleree):
+    """
+    Géométries invalides et éclats des parcelles `fids` : parties d'une parcelle
+    multiple, autres que la plus grande, plus petites que `surface_toleree` m².
+    Une petite parcelle d'un seul tenant n'est pas un éclat.
+    """
+    erreurs = []
+    for fid in fids:
+        geometry = geometries[fid]
+        invalidites = geometry.validateGeometry(QgsGeometry.ValidatorGeos)
+        if invalidites:
+            erreurs.append(Erreur(INVALIDE, [fid], "; ".join(e.what() for e in invalidites), geometry))
+            continue
+        parties = polygones(geometry)
+        if len(parties) < 2:
+            continue
+        for partie in sorted(parties, key=lambda partie: -partie.area())[1:]:
+            surface = mesure.surface_m2(partie)
+            if surface is not None and surface < surface_toleree:
+                erreurs.append(Erreur(ECLAT, [fid], f"Partie de {surface:.2f} m² de la parcelle {fid}",
+                                      partie, surface))
+    return erreurs
+
+
+def chevauchements(geometries, paires, minimum):
+    """
+    Zones communes des paires (a, b) de parcelles dont les intérieurs se recoupent,
+    plus grandes que `minimum` (unités de la couche au carré). Les paires sont
+    groupées par a : un moteur préparé par parcelle a.
+    """
+    erreurs = []
+    moteurs = {}
+    for a, b in paires:
+        moteur = moteurs.get(a)
+        if moteur is None:
+            moteur = QgsGeometry.createGeometryEngine(geometries[a].constGet())
+            moteur.prepareGeometry()
+            moteurs[a] = moteur
+        autre = geometries[b].constGet()
+        if not (moteur.overlaps(autre) or moteur.contains(autre) or moteur.within(autre)):
+            continue
+        zone = QgsGeometry.unaryUnion(polygones(geometries[a].intersection(geometries[b])))
+        if zone.isNull() or zone.isEmpty() or zone.area() <= minimum:
+            continue
+        erreurs.append(Erreur(CHEVAUCHEMENT, [a, b], f"Les parcelles {a} et {b} se chevauchent", zone))
+    return erreurs
+
+
+def trous(geometries):
+    """Trous de l'union des `geometries` (espaces entièrement entourés de parcelles)."""
+    union = QgsGeometry.unaryUnion(list(geometries))
+    for partie in polygones(union):
+        for anneau in partie.asPolygon()[1:]:
+            yield QgsGeometry.fromPolygonXY([anneau])
+
+
+def _lots(elements, taille=TAILLE_LOT):
+    for debut in range(0, len(elements), taille):
+        yield elements[debut:debut + taille]
+
+
+def _nombre_lots(elements, taille=TAILLE_LOT):
+    return (len(elements) + taille - 1) // taille
+
+
+class TopologieTask(QgsTask):
+    """
+    Contrôle topologique de la couche en tâche de fond. La couche est figée
+    dans le constructeur (thread principal) ; la couche d'erreurs est construite
+    dans finished(), dans le thread principal.
+
+    Les parcelles invalides sont signalées puis écartées des chevauchements ;
+    leur version réparée (makeValid) sert à la recherche des trous. Un espace
+    vide entre parcelles qui s'ouvre sur l'extérieur n'est pas un trou.
+    """
+    termine = pyqtSignal(object)   # couche mémoire des erreurs
+    echec = pyqtSignal(str)
+
+    def __init__(self, layer, surface_toleree=SURFACE_TOLEREE_M2):
+        super().__init__(f"Topologie des parcelles : {layer.name()}", QgsTask.CanCancel)
+        self.source = SourceParcelles(layer)
+        self.crs = layer.crs()
+        self.mesure = MesureSurface(layer.crs())
+        self.surface_toleree = surface_toleree
+        # Chevauchement minimal : en dessous, bruit numérique entre parcelles voisines
+        self.minimum = tolerance_pour_couche(layer) ** 2
+        self.feedback = QgsFeedback()
+        self.erreurs = None
+        self.erreur = None
+
+    def cancel(self):
+        self.feedback.cancel()
+        super().cancel()
+
+    def _executer(self, calculer, lots, nombre, paralleles, debut, fin):
+        """Erreurs de calculer(mesure, lot) sur les `nombre` lots (voir calculer_par_lots), None si annulé."""
+        resultats = []
+        lots_calcules = calculer_par_lots(calculer, self.mesure, lots, paralleles, self.feedback)
+        for n, resultat in enumerate(lots_calcules, start=1):
+            resultats.extend(resultat)
+            self.setProgress(debut + (fin - debut) * n / max(nombre, 1))
+        return None if self.isCanceled() else resultats
+
+    def run(self):
+        try:
+            self.erreurs = self.controler()
+        except Exception as e:
+            self.erreur = str(e)
+            return False
+        return self.erreurs is not None and not self.isCanceled()
+
+    def controler(self):
+        """Liste des erreurs topologiques de la couche, None si annulé."""
+        # Index chargé en bloc (STR), géométries conservées
+        request = QgsFeatureRequest().setSubsetOfAttributes([])
+        index = QgsSpatialIndex(self.source.getFeatures(request), self.feedback,
+                                QgsSpatialIndex.FlagStoreFeatureGeometries)
+        if self.isCanceled():
+            return None
+        self.setProgress(20)
+
+        request = QgsFeatureRequest().setSubsetOfAttributes([]).setFlags(QgsFeatureRequest.NoGeometry)
+        geometries = {}
+        for feature in self.source.getFeatures(request):
+            geometry = index.geometry(feature.id())
+            if geometry is not None and not geometry.isNull() and not geometry.isEmpty():
+                geometries[feature.id()] = geometry
+        fids = sorted(geometries)
+        paralleles = len(fids) >= SEUIL_PARALLELE
+
+        # Géométries invalides et éclats
+        erreurs = self._executer(
+            lambda mesure, lot: controler_parcelles(geometries, lot, mesure, self.surface_toleree),
+            _lots(fids), _nombre_lots(fids), paralleles, 20, 40)
+        if erreurs is None:
+            return None
+        # Les parcelles invalides sont écartées des chevauchements, mais leur version
+        # réparée reste dans l'union : sinon leur emplacement passerait pour un trou
+        reparees = {}
+        for erreur in erreurs:
+            if erreur.type == INVALIDE:
+                fid = erreur.fids[0]
+                reparees[fid] = QgsGeometry.unaryUnion(polygones(geometries.pop(fid).makeValid()))
+        fids = sorted(geometries)
+
+        # Chevauchements : paires candidates de l'index, testées par lots
+        def paires(lot):
+            return [(a, b) for a in lot for b in sorted(index.intersects(geometries[a].boundingBox()))
+                    if b > a and b in geometries]
+
+        resultats = self._executer(
+            lambda mesure, lot: chevauchements(geometries, lot, self.minimum),
+            (paires(lot) for lot in _lots(fids)), _nombre_lots(fids), paralleles, 40, 85)
+        if resultats is None:
+            return None
+        for erreur in resultats:
+            erreur.surface_m2 = self.mesure.surface_m2(erreur.geometry)
+        erreurs.extend(resultats)
+
+        # Trous plus petits que la surface tolérée, avec les parcelles qui les bordent
+        contours = {**geometries, **reparees}
+        for trou in trous(geometry for geometry in contours.values() if not geometry.isEmpty()):
+            if self.isCanceled():
+                return None
+            surface = self.mesure.surface_m2(trou)
+            if surface is None or surface >= self.surface_toleree:
+                continue
+            bordure = [fid for fid in sorted(index.intersects(trou.boundingBox()))
+                       if fid in contours and contours[fid].intersects(trou)]
+            erreurs.append(Erreur(TROU, bordure, f"Trou de {surface:.2f} m² entre parcelles", trou, surface))
+        self.setProgress(100)
+        return erreurs
+
+    def finished(self, result):
+        # Appelé dans le thread principal une fois run() terminé
+        if not result:
+            if self.erreur is not None:
+                self.echec.emit(self.erreur)
+            return
+        self.termine.emit(couche_erreurs(self.erreurs, self.crs))
+
+
+def couche_erreurs(erreurs, crs, nom=NOM_COUCHE_ERREURS):
+    """Couche mémoire (multipolygones) des erreurs : type, parcelles (fids), description, surface_m2."""
+    couche = QgsVectorLayer("MultiPolygon", nom, "memory")
+    couche.setCrs(crs)
+    provider = couche.dataProvider()
+    provider.addAttributes([
+        QgsField("type", QVariant.String),
+        QgsField("parcelles", QVariant.String),
+        QgsField("description", QVariant.String),
+        QgsField("surface_m2", QVariant.Double),
+    ])
+    couche.updateFields()
+
+    features = []
+    for erreur in erreurs:
+        geometry = QgsGeometry(erreur.geometry)
+        geometry.convertToMultiType()
+        feature = QgsFeature(couche.fields())
+        feature.setGeometry(geometry)
+        feature.setAttributes([
+            erreur.type,
+            ",".join(str(fid) for fid in erreur.fids),
+            erreur.description,
+            round(erreur.surface_m2, 2) if erreur.surface_m2 is not None else None,
+        ])
+        features.append(feature)
+    provider.addFeatures(features)
+    couche.updateExtents()
+    return couche
+
+
+class NavigationErreurs(QObject):
+    """
+    Rend la couche d'erreurs cliquable : la sélection d'une erreur (table
+    attributaire, outil de sélection) zoome sur sa zone et sélectionne les
+    parcelles en cause dans la couche des parcelles.
+    """
+
+    def __init__(self, couche, layer, canvas, parent=None):
+        super().__init__(parent)
+        self.couche = couche
+        self.layer = layer
+        self.canvas = canvas
+
+        self.couche.selectionChanged.connect(self.on_selection_changed)
+
+    def deconnecter(self):
+        """Déconnecte le signal de la couche d'erreurs (déjà supprimée, le cas échéant)."""
+        try:
+            self.couche.selectionChanged.disconnect(self.on_selection_changed)
+        except (TypeError, RuntimeError):
+            pass
+
+    def on_selection_changed(self, selection, *args):
+        if not selection:
+            return
+        feature = self.couche.getFeature(selection[0])
+        if not feature.isValid():
+            return
+        fids = [int(fid) for fid in str(feature["parcelles"]).split(",") if fid.strip().lstrip("-").isdigit()]
+        self.layer.selectByIds(fids)
+
+        rectangle = self.canvas.mapSettings().layerExtentToOutputExtent(self.couche, feature.geometry().boundingBox())
+        # Marge autour de la zone (les trous et éclats sont petits)
+        rectangle.grow(max(rectangle.width(), rectangle.height(), self.canvas.mapUnitsPerPixel() * 20))
+        self.canvas.setExtent(rectangle)
+        self.canvas.refresh()
@@ -4,6 +4,7 @@ from qgis.PyQt.QtWidgets import QComboBox
 
 from qgis.core import (
     Qgis,
+    QgsApplication,
     QgsMessageLog,
     QgsProject,
     QgsLinePatternFillSymbolLayer,
@@ -26,6 +27,8 @@ from qgis.utils import iface
 import csv
 import os
 
+from .couleurs_parcelles import couleurs_de_couche
+
 #-------------Fonctions utilitaires
 
 # Fonction gèrant la sélection de la coucha active ainsi que le controle d'existance des champs
@@ -203,26 +206,19 @@ def safe_str(value):
 
 def get_fill_color_from_layer(layer, field_value):
     """
-    Retourne la couleur de remplissage principale pour un symbole dans une couche QGIS.
+    Retourne la couleur de remplissage principale pour un symbole dans une couche QGIS
+    (table des couleurs de la couche, construite une fois par style).
     """
     if not layer or not isinstance(layer, QgsVectorLayer):
         return None
+    return couleurs_de_couche(layer).couleur(field_value)
+
 
-    renderer = layer.renderer()
-    if renderer and renderer.type() == "categorizedSymbol":
-        for cat in renderer.categories():
-            if str(cat.value()) == str(field_value):
-                symbol = cat.symbol()
-                # Essaie de récupérer la couleur du premier symbole de remplissage
-                for i in range(symbol.symbolLayerCount()):
-                    sym_layer = symbol.symbolLayer(i)
-                    if hasattr(sym_layer, "fillColor"):
-                        return sym_layer.fillColor().name()
-                    elif hasattr(sym_layer, "color"):
-                        return sym_layer.color().name()
-                # Fallback
-                return symbol.color().name()
-    return None
+def get_plugin_profile_dir():
+    """Dossier du plugin dans le profil utilisateur QGIS (créé si besoin)."""
+    dossier = os.path.join(QgsApplication.qgisSettingsDirPath(), "gestion_forestiere")
+    os.makedirs(dossier, exist_ok=True)
+    return dossier
 
 
 
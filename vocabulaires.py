@@ -0,0 +1,282 @@
+# vocabulaires.py
+# Vocabulaires des listes déroulantes (essences, travaux, traitements, prévisions,
+# accès, terrain) : un QStringListModel partagé par vocabulaire. Chaque vocabulaire
+# réunit la colonne de tableWidgetData (table_data.csv) et les valeurs distinctes
+# déjà saisies dans les champs correspondants de la couche (Terrain, Acces, plant*,
+# Tvx*, Trait*, Prev*). Les valeurs distinctes de la couche sont gardées par champ
+# dans un fichier annexe du profil QGIS, valable tant que la source n'a pas changé,
+# et complétées au fil des saisies.
+
+import hashlib
+import json
+import os
+from bisect import insort
+
+from qgis.PyQt.QtCore import QObject, QStringListModel
+
+from .cache_analyses import empreinte_analyses
+from .constantes import SAISIE_COMBO_COUNTS, SAISIE_COMBO_SETTINGS, VOCABULAIRES_TERRAIN_ACCES
+from .utils import get_plugin_profile_dir, log_warning
+
+DOSSIER_VOCABULAIRES = "vocabulaires"
+VERSION_VOCABULAIRES = 1
+
+
+def valeurs_colonne(table, colonne):
+    """Valeurs non vides et sans doublon d'une colonne du QTableWidget."""
+    valeurs = set()
+    for row in range(table.rowCount()):
+        item = table.item(row, colonne)
+        if item is not None:
+            valeur = item.text().strip()
+            if valeur:
+                valeurs.add(valeur)
+    return valeurs
+
+
+def _texte(valeur):
+    """Valeur d'attribut en texte de vocabulaire, None si vide."""
+    if valeur is None:
+        return None
+    texte = str(valeur).strip()
+    return None if not texte or texte.upper() == "NULL" else texte
+
+
+def champs_vocabulaire(nom):
+    """Champs de la couche alimentant le vocabulaire `nom` (plant -> plant1..plant4, Terrain -> Terrain)."""
+    if nom in SAISIE_COMBO_COUNTS:
+        return [f"{nom}{i}" for i in range(1, SAISIE_COMBO_COUNTS[nom] + 1)]
+    return [nom]
+
+
+def chemin_annexe(layer):
+    """Fichier annexe des valeurs distinctes de la couche (un par source de données)."""
+    dossier = os.path.join(get_plugin_profile_dir(), DOSSIER_VOCABULAIRES)
+    os.makedirs(dossier, exist_ok=True)
+    cle = hashlib.sha1(layer.source().encode("utf-8")).hexdigest()
+    return os.path.join(dossier, f"vocabulaires_{cle}.json")
+
+
+def empreinte_vocabulaires(layer):
+    """Empreinte de la source (fichier, date, last_change...) ; None si la couche a des modifications en cours."""
+    return empreinte_analyses(layer, {"vocabulaires": VERSION_VOCABULAIRES})
+
+
+def lire_annexe(chemin, empreinte):
+    """{champ: [valeurs]} enregistré pour cette empreinte de source, sinon None."""
+    if empreinte is None:
+        return None
+    try:
+        with open(chemin, "r", encoding="utf-8") as fichier:
+            annexe = json.load(fichier)
+    except (OSError, ValueError):
+        return None
+    if annexe.get("empreinte") != empreinte:
+        return None
+    return annexe.get("champs")
+
+
+def ecrire_annexe(chemin, empreinte, valeurs_champs):
+    # Écriture dans un fichier temporaire puis remplacement : jamais d'annexe tronquée
+    temporaire = f"{chemin}.tmp"
+    annexe = {
+        "empreinte": empreinte,
+        "champs": {champ: sorted(valeurs) for champ, valeurs in valeurs_champs.items()},
+    }
+    try:
+        with open(temporaire, "w", encoding="utf-8") as fichier:
+            json.dump(annexe, fichier, ensure_ascii=False)
+        os.replace(temporaire, chemin)
+    except OSError as e:
+        log_warning(f"⚠️ Vocabulaires de la couche non enregistrés : {e}")
+
+
+def valeurs_distinctes(layer, champs):
+    """
+    {champ: set de valeurs} par SELECT DISTINCT côté fournisseur
+    (uniqueValues), sans parcourir les entités.
+    """
+    provider = layer.dataProvider()
+    fields = provider.fields()
+    resultat = {}
+    for champ in champs:
+        idx = fields.indexFromName(champ)
+        if idx < 0:
+            continue
+        resultat[champ] = {texte for texte in map(_texte, provider.uniqueValues(idx)) if texte}
+    return resultat
+
+
+class Vocabulaires(QObject):
+    """
+    Modèles partagés des vocabulaires, par nom ('plant', 'Tvx', 'Trait', 'Prev',
+    'Acces', 'Terrain'). Chaque liste commence par une entrée vide, puis les
+    valeurs de la table et de la couche, triées ; la liste triée est tenue à
+    jour et servie telle quelle.
+
+    Quand un modèle change, la valeur affichée par chaque combo lié est
+    conservée, sans émettre currentIndexChanged (pas d'écriture parasite dans
+    la couche). Une valeur qui n'est plus utilisée dans la couche reste
+    proposée jusqu'à la prochaine relecture complète (source modifiée hors
+    du plugin).
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.colonnes = {nom: colonne for nom, _, colonne in SAISIE_COMBO_SETTINGS}
+        self.colonnes.update({nom: colonne for nom, _, colonne in VOCABULAIRES_TERRAIN_ACCES})
+        self.modeles = {nom: QStringListModel([""], self) for nom in self.colonnes}
+        self.combos = {nom: [] for nom in self.colonnes}
+        self.table = None
+
+        # Valeurs par origine, et liste servie (triée, entrée vide en tête)
+        self.valeurs_table = {nom: set() for nom in self.colonnes}
+        self.valeurs_champs = {}
+        self.listes = {nom: [""] for nom in self.colonnes}
+
+        # Champ de la couche -> vocabulaire
+        self.vocabulaire_champ = {champ: nom for nom in self.colonnes for champ in champs_vocabulaire(nom)}
+        self.layer = None
+        self.annexe = None
+
+    def modele(self, nom):
+        return self.modeles[nom]
+
+    def valeurs(self, nom):
+        """Liste triée affichée par les combos du vocabulaire (entrée vide comprise)."""
+        return self.listes[nom]
+
+    def lier(self, nom, combo):
+        """Le combo affiche désormais le modèle partagé du vocabulaire `nom`."""
+        combo.setModel(self.modeles[nom])
+        self.combos[nom].append(combo)
+
+    def _publier(self, nom, liste):
+        """Remplace la liste servie et le modèle, en conservant la sélection des combos liés."""
+        if liste == self.listes[nom]:
+            return False
+        self.listes[nom] = liste
+        combos = self.combos[nom]
+        textes = [combo.currentText() for combo in combos]
+        for combo in combos:
+            combo.blockSignals(True)
+        try:
+            self.modeles[nom].setStringList(liste)
+            for combo, texte in zip(combos, textes):
+                index = combo.findText(texte)
+                combo.setCurrentIndex(index if index >= 0 else 0)
+        finally:
+            for combo in combos:
+                combo.blockSignals(False)
+        return True
+
+    def _reconstruire(self, nom):
+        valeurs = set(self.valeurs_table[nom])
+        for champ in champs_vocabulaire(nom):
+            valeurs |= self.valeurs_champs.get(champ, set())
+        self._publier(nom, [""] + sorted(valeurs))
+
+    def _ajouter(self, nom, valeur):
+        """Insère `valeur` à sa place dans la liste triée du vocabulaire, si elle y manque."""
+        liste = self.listes[nom]
+        if valeur in liste:
+            return
+        liste = liste[:]
+        insort(liste, valeur, lo=1)
+        self._publier(nom, liste)
+
+    # --- Table des données (table_data.csv) ---
+
+    def charger(self, table):
+        """(Re)construit tous les vocabulaires depuis le QTableWidget."""
+        self.table = table
+        for nom, colonne in self.colonnes.items():
+            self.valeurs_table[nom] = valeurs_colonne(table, colonne)
+            self._reconstruire(nom)
+
+    def on_item_changed(self, item):
+        """Cellule modifiée : seuls les vocabulaires de sa colonne sont reconstruits."""
+        if self.table is None:
+            return
+        for nom, colonne in self.colonnes.items():
+            if colonne == item.column():
+                valeurs = valeurs_colonne(self.table, colonne)
+                if valeurs != self.valeurs_table[nom]:
+                    self.valeurs_table[nom] = valeurs
+                    self._reconstruire(nom)
+
+    # --- Valeurs de la couche ---
+
+    def charger_couche(self, layer):
+        """
+        Valeurs distinctes des champs de vocabulaire de la couche : lues dans
+        l'annexe si la source n'a pas changé depuis, sinon par le fournisseur.
+        """
+        if layer is self.layer:
+            return
+        self.deconnecter()
+        self.layer = layer
+        self.annexe = chemin_annexe(layer)
+
+        empreinte = empreinte_vocabulaires(layer)
+        enregistrees = lire_annexe(self.annexe, empreinte)
+        if enregistrees is not None:
+            self.valeurs_champs = {champ: set(valeurs) for champ, valeurs in enregistrees.items()}
+        else:
+            self.valeurs_champs = valeurs_distinctes(layer, self.vocabulaire_champ)
+            if empreinte is not None:
+                ecrire_annexe(self.annexe, empreinte, self.valeurs_champs)
+
+        # Modifications non enregistrées de la couche (tampon d'édition)
+        if layer.isModified():
+            fields = layer.fields()
+            for attributs in layer.editBuffer().changedAttributeValues().values():
+                for idx, valeur in attributs.items():
+                    self._valeur_saisie(fields.at(idx).name(), valeur, publier=False)
+
+        for nom in self.colonnes:
+            self._reconstruire(nom)
+
+        layer.attributeValueChanged.connect(self.on_attribute_value_changed)
+        layer.afterCommitChanges.connect(self.on_after_commit_changes)
+
+    def deconnecter(self):
+        """Déconnecte les signaux de la couche suivie."""
+        if self.layer is None:
+            return
+        for signal, slot in (
+            (self.layer.attributeValueChanged, self.on_attribute_value_changed),
+            (self.layer.afterCommitChanges, self.on_after_commit_changes),
+        ):
+            try:
+                signal.disconnect(slot)
+            except (TypeError, RuntimeError):
+                pass
+        self.layer = None
+
+    def _valeur_saisie(self, champ, valeur, publier=True):
+        nom = self.vocabulaire_champ.get(champ)
+        texte = _texte(valeur)
+        if nom is None or texte is None:
+            return
+        valeurs = self.valeurs_champs.setdefault(champ, set())
+        if texte in valeurs:
+            return
+        valeurs.add(texte)
+        if publier:
+            self._ajouter(nom, texte)
+
+    def on_attribute_value_changed(self, fid, idx, valeur):
+        self._valeur_saisie(self.layer.fields().at(idx).name(), valeur)
+
+    def on_after_commit_changes(self):
+        # Source modifiée par le plugin : l'annexe reprend la nouvelle empreinte
+        empreinte = empreinte_vocabulaires(self.layer)
+        if empreinte is not None:
+            ecrire_annexe(self.annexe, empreinte, self.valeurs_champs)
+
+    def ajouter(self, nom, valeur):
+        """Ajoute au vocabulaire une valeur rencontrée dans la couche, si elle y manque."""
+        texte = _texte(valeur)
+        if texte is not None:
+            self._ajouter(nom, texte)
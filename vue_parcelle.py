@@ -0,0 +1,137 @@
+# vue_parcelle.py
+# Vue d'une parcelle pour la fenêtre principale : tous les textes affichés (essences,
+# taux, listes de travaux, traitements et prévisions), le libellé et la couleur du
+# type de parcellaire, calculés une fois puis gardés dans un cache LRU par fid.
+# Une vue est invalidée dès qu'un attribut de sa parcelle change dans la couche.
+
+from collections import OrderedDict
+
+from qgis.PyQt.QtCore import QObject
+
+from .acces_parcelles import libelle_parcelle, lire_parcelle
+from .constantes import SAISIE_COMBO_COUNTS, TYPE_PARC_LIBELLES
+from .utils import format_date
+
+# Nombre de vues conservées (les moins récemment affichées sortent)
+TAILLE_CACHE_VUES = 500
+
+CHAMPS_PLANTS = [f"plant{i}" for i in range(1, 5)]
+CHAMPS_TAUX = [f"Tx{i}" for i in range(1, 5)]
+
+
+def _paires(prefix, champ_texte):
+    """Couples (champ date, champ texte) d'un onglet : (dateTvx1, Tvx1), ..."""
+    return [(f"date{prefix}{i}", champ_texte.format(prefix=prefix, i=i))
+            for i in range(1, SAISIE_COMBO_COUNTS[prefix] + 1)]
+
+
+# Listes de champs construites une fois pour toutes
+PAIRES_TRAVAUX = _paires("Tvx", "{prefix}{i}")
+PAIRES_TRAVAUX_RQ = _paires("Tvx", "rem{prefix}{i}")
+PAIRES_TRAIT = _paires("Trait", "{prefix}{i}")
+PAIRES_TRAIT_RQ = _paires("Trait", "rem{prefix}{i}")
+PAIRES_PREV = _paires("Prev", "{prefix}{i}")
+PAIRES_PREV_RQ = _paires("Prev", "rem{prefix}{i}")
+
+
+def _liste(feature, paires, vide, dates=True):
+    """'date : texte' par ligne pour chaque texte renseigné, `vide` s'il n'y en a aucun."""
+    texte = "\n".join(
+        f"{format_date(feature[date]) if dates else feature[date]} : {feature[champ]}"
+        for date, champ in paires if feature[champ]
+    )
+    return texte if texte else vide
+
+
+def liste_arbres(feature):
+    """Essences (plant1..plant4) et taux (Tx1..Tx4), une valeur par ligne."""
+    plants = [str(feature[f]) for f in CHAMPS_PLANTS if feature[f]]
+    taux = [str(feature[f]) for f in CHAMPS_TAUX if feature[f]]
+    return ("\n".join(plants) if plants else "Aucune essence définie ici...",
+            "\n".join(taux) if taux else "Aucun")
+
+
+def construire_vue(feature, couleurs):
+    """Textes, libellé et couleur (table `couleurs` du style) affichés pour `feature`, dans un dict."""
+    plantation, taux = liste_arbres(feature)
+    type_parc = feature["typeParc"]
+    return {
+        "feature": feature,
+        "libelle": libelle_parcelle(feature),
+        "surface": f"{feature['SURFACE']} ares",
+        "plantation": plantation,
+        "taux": taux,
+        "travaux_liste": _liste(feature, PAIRES_TRAVAUX, "Aucun travaux effectués ici..."),
+        "travaux_rq": _liste(feature, PAIRES_TRAVAUX_RQ, "..."),
+        "trait_liste": _liste(feature, PAIRES_TRAIT, "Aucun traitement effectués ici..."),
+        "trait_rq": _liste(feature, PAIRES_TRAIT_RQ, "..."),
+        # Les dates de prévision sont affichées telles quelles
+        "prev_liste": _liste(feature, PAIRES_PREV, "Aucun travaux prévus ici...", dates=False),
+        "prev_rq": _liste(feature, PAIRES_PREV_RQ, "...", dates=False),
+        "type_parc": type_parc,
+        "libelle_type": TYPE_PARC_LIBELLES.get(type_parc, "Inconnu"),
+        "couleur": couleurs.couleur(type_parc),
+    }
+
+
+class CacheVues(QObject):
+    """
+    Vues des parcelles d'une couche, gardées dans un LRU borné par fid.
+
+    La vue d'une parcelle est retirée quand un de ses attributs change (tampon
+    d'édition, session de saisie) ou quand elle est supprimée ; tout le cache
+    est vidé à l'annulation des modifications et au changement de style (les
+    couleurs en dépendent).
+
+    couleurs : CouleursCouche de la même couche
+    """
+
+    def __init__(self, layer, couleurs, taille=TAILLE_CACHE_VUES, parent=None):
+        super().__init__(parent)
+        self.layer = layer
+        self.couleurs = couleurs
+        self.taille = taille
+        self.vues = OrderedDict()
+
+        self.layer.attributeValueChanged.connect(self.on_attribute_value_changed)
+        self.layer.featureDeleted.connect(self.invalider)
+        self.layer.afterRollBack.connect(self.vider)
+        self.couleurs.changees.connect(self.vider)
+
+    def deconnecter(self):
+        """Déconnecte les signaux de la couche."""
+        for signal, slot in (
+            (self.layer.attributeValueChanged, self.on_attribute_value_changed),
+            (self.layer.featureDeleted, self.invalider),
+            (self.layer.afterRollBack, self.vider),
+            (self.couleurs.changees, self.vider),
+        ):
+            try:
+                signal.disconnect(slot)
+            except (TypeError, RuntimeError):
+                pass
+        self.vider()
+
+    def on_attribute_value_changed(self, fid, idx, valeur):
+        self.invalider(fid)
+
+    def invalider(self, fid):
+        self.vues.pop(fid, None)
+
+    def vider(self):
+        self.vues.clear()
+
+    def vue(self, fid):
+        """Vue de la parcelle `fid` (lue et construite si absente du cache), ou None."""
+        vue = self.vues.get(fid)
+        if vue is not None:
+            self.vues.move_to_end(fid)
+            return vue
+        feature = lire_parcelle(self.layer, fid)
+        if not feature.isValid():
+            return None
+        vue = construire_vue(feature, self.couleurs)
+        self.vues[fid] = vue
+        if len(self.vues) > self.taille:
+            self.vues.popitem(last=False)
+        return vue